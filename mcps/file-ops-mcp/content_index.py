@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+持久化内容索引
+
+为 search_files 提供按目录根建立的三元组（trigram）倒排索引：
+- 索引存放在 SQLite 文件中，按根目录路径哈希命名
+- 文件以 (mtime_ns, size) 作为指纹，变化的文件在查询时增量重建
+- 内容查询只打开候选文件，最终结果仍由逐行匹配确认
+- 启用文件系统监视时，监视器报告的变化路径先记录下来，在下一次查询前只重新核对这些目录
+"""
+
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from mcp_common.executor import check_cancelled
+from mcp_common.gitignore import IgnoreChain
+from mcp_common.walker import IGNORED_DIRS, scan_dir, walk_files
+
+# 索引文件默认存放目录（可通过 FILE_OPS_INDEX_DIR 配置）
+INDEX_DIR = Path(os.environ.get(
+    'FILE_OPS_INDEX_DIR',
+    Path.home() / '.cache' / 'file-ops-mcp' / 'index',
+))
+
+# 超过该大小的文件不建立三元组，查询时总是作为候选文件
+MAX_INDEXED_SIZE = 1024 * 1024
+
+# 待核对的变化目录数上限，超出后改为完整同步
+MAX_PENDING_CHANGES = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    indexed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    tri BLOB NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (tri, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id);
+"""
+
+
+def index_path_for(root: Path) -> Path:
+    """返回根目录对应的索引文件路径"""
+    digest = hashlib.sha1(str(root).encode('utf-8')).hexdigest()[:16]
+    return INDEX_DIR / f'{digest}.sqlite'
+
+
+def trigrams(data: bytes) -> set:
+    """提取字节串中的所有三元组"""
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+
+def normalize(text: str) -> bytes:
+    """与 search_files 的大小写不敏感匹配保持一致的规范化"""
+    return text.lower().encode('utf-8')
+
+
+def is_excluded(root: str, directory: str) -> bool:
+    """directory（root 的后代）是否会在遍历 root 时被剪枝：隐藏目录、忽略目录或被 .gitignore 忽略"""
+    path = root
+    for name in directory[len(root.rstrip(os.sep)) + 1:].split(os.sep):
+        if not name:
+            continue
+        path = os.path.join(path, name)
+        if name.startswith('.') or name in IGNORED_DIRS:
+            return True
+        if IgnoreChain.for_root(path).is_ignored(path, True):
+            return True
+    return False
+
+
+def synchronized(method):
+    """数据库读写在 db_lock 下进行：同一索引可能被多个工作线程中的工具调用同时使用"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.db_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ContentIndex:
+    """单个根目录的三元组倒排索引"""
+
+    def __init__(self, root: Path, db_path: Optional[Path] = None):
+        self.root = root
+        self.db_path = db_path or index_path_for(root)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('root', ?)", (str(root),)
+        )
+        self.conn.commit()
+        # 监视器报告的待核对目录；resync 表示变化范围未知，需要完整同步
+        self.changed: set[str] = set()
+        self.resync = False
+        self.lock = threading.Lock()
+        self.db_lock = threading.RLock()
+
+    @classmethod
+    def open_existing(cls, root: Path) -> Optional['ContentIndex']:
+        """仅当磁盘上已存在索引时打开"""
+        db_path = index_path_for(root)
+        if not db_path.exists():
+            return None
+        return cls(root, db_path)
+
+    @synchronized
+    def close(self):
+        self.conn.close()
+
+    @synchronized
+    def fingerprints(self) -> dict:
+        """返回 {相对路径: (mtime_ns, size)}"""
+        return {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.conn.execute(
+                'SELECT path, mtime_ns, size FROM files'
+            )
+        }
+
+    @synchronized
+    def _index_file(self, rel_path: str, st: os.stat_result, data: Optional[bytes]):
+        """写入（或替换）单个文件的索引记录，data 为 None 时标记为未建索引"""
+        row = self.conn.execute('SELECT id FROM files WHERE path = ?', (rel_path,)).fetchone()
+        if row:
+            self.conn.execute('DELETE FROM postings WHERE file_id = ?', (row[0],))
+            self.conn.execute(
+                'UPDATE files SET mtime_ns = ?, size = ?, indexed = ? WHERE id = ?',
+                (st.st_mtime_ns, st.st_size, data is not None, row[0]),
+            )
+            file_id = row[0]
+        else:
+            file_id = self.conn.execute(
+                'INSERT INTO files (path, mtime_ns, size, indexed) VALUES (?, ?, ?, ?)',
+                (rel_path, st.st_mtime_ns, st.st_size, data is not None),
+            ).lastrowid
+        if data is not None:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO postings (tri, file_id) VALUES (?, ?)',
+                ((tri, file_id) for tri in trigrams(data)),
+            )
+
+    @synchronized
+    def refresh_file(self, file_path: Path, st: os.stat_result):
+        """读取文件并重建其索引记录"""
+        rel_path = str(file_path.relative_to(self.root))
+        data = None
+        if st.st_size <= MAX_INDEXED_SIZE:
+            try:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    data = normalize(f.read())
+            except OSError:
+                data = None
+        self._index_file(rel_path, st, data)
+
+    @synchronized
+    def remove(self, rel_paths: Iterable[str]):
+        for rel_path in rel_paths:
+            row = self.conn.execute('SELECT id FROM files WHERE path = ?', (rel_path,)).fetchone()
+            if row:
+                self.conn.execute('DELETE FROM postings WHERE file_id = ?', (row[0],))
+                self.conn.execute('DELETE FROM files WHERE id = ?', (row[0],))
+
+    @synchronized
+    def commit(self):
+        self.conn.commit()
+
+    def mark_changed(self, path: Optional[str]):
+        """
+        记录监视器报告的变化（在监视线程中调用，只记录不写库）
+
+        Args:
+            path: 变化的文件或目录，None 表示变化范围未知
+        """
+        with self.lock:
+            if path is None or len(self.changed) >= MAX_PENDING_CHANGES:
+                self.resync = True
+                self.changed.clear()
+            elif not self.resync:
+                self.changed.add(path)
+
+    @synchronized
+    def apply_changes(self, resync: bool = False) -> dict:
+        """
+        把记录的变化写入索引：完整同步，或只重新核对发生变化的目录
+
+        Args:
+            resync: 是否强制完整同步
+
+        Returns:
+            更新统计
+        """
+        with self.lock:
+            resync = resync or self.resync
+            changed, self.changed = self.changed, set()
+            self.resync = False
+        try:
+            if resync:
+                return self.update(walk_files(str(self.root), IGNORED_DIRS, gitignore=True))
+            directories = {path if os.path.isdir(path) else os.path.dirname(path) for path in changed}
+            stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+            if directories:
+                known = self.fingerprints()
+                # {目录前缀: 直接包含的文件} 和所有包含文件的目录前缀
+                by_dir: dict[str, list[str]] = {}
+                populated = set()
+                for path in known:
+                    parent = os.path.dirname(path)
+                    by_dir.setdefault(parent, []).append(path)
+                    while parent and parent not in populated:
+                        populated.add(parent)
+                        parent = os.path.dirname(parent)
+                for directory in sorted(directories):
+                    check_cancelled()
+                    self._reconcile_dir(directory, known, by_dir, populated, stats)
+                self.commit()
+            return stats
+        except BaseException:
+            # 被取消或失败时把变化放回，下一次查询前重新应用
+            with self.lock:
+                self.resync = self.resync or resync
+                self.changed |= changed
+            raise
+
+    def _remove_tree(self, prefix: str, known: dict, stats: dict):
+        """删除相对路径前缀下的所有文件记录"""
+        stale = [path for path in known if path.startswith(prefix + os.sep)]
+        self.remove(stale)
+        for path in stale:
+            del known[path]
+        stats['removed'] += len(stale)
+
+    def _reconcile_dir(self, directory: str, known: dict, by_dir: dict, populated: set, stats: dict):
+        """按目录的当前内容更新其中直接包含的文件，并处理新增和消失的子目录"""
+        root = str(self.root).rstrip(os.sep)
+        if directory != root and not directory.startswith(root + os.sep):
+            return
+        rel_dir = directory[len(root) + 1:]
+        try:
+            if is_excluded(root, directory):
+                raise FileNotFoundError(directory)
+            dirs, files, _ = scan_dir(directory, IGNORED_DIRS, ignore=IgnoreChain.for_root(directory))
+        except OSError:
+            # 目录已被删除或不再参与遍历
+            if rel_dir:
+                self._remove_tree(rel_dir, known, stats)
+            return
+
+        listed = {os.path.join(rel_dir, entry.name): entry for entry in files}
+        stale = [path for path in by_dir.get(rel_dir, []) if path in known and path not in listed]
+        self.remove(stale)
+        for path in stale:
+            del known[path]
+        stats['removed'] += len(stale)
+        for rel_path, entry in listed.items():
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            fingerprint = known.get(rel_path)
+            if fingerprint == (st.st_mtime_ns, st.st_size):
+                stats['unchanged'] += 1
+                continue
+            self.refresh_file(Path(entry.path), st)
+            known[rel_path] = (st.st_mtime_ns, st.st_size)
+            stats['added' if fingerprint is None else 'updated'] += 1
+
+        subdirs = {os.path.join(rel_dir, entry.name): entry for entry in dirs}
+        # 消失的子目录
+        for sub in [p for p in populated if os.path.dirname(p) == rel_dir and p not in subdirs]:
+            self._remove_tree(sub, known, stats)
+        # 索引中没有任何文件的子目录可能是新建或移入的目录树
+        for sub, entry in subdirs.items():
+            if sub in populated:
+                continue
+            for file_entry in walk_files(entry.path, IGNORED_DIRS, gitignore=True):
+                try:
+                    st = file_entry.stat()
+                except OSError:
+                    continue
+                rel_path = file_entry.path[len(root) + 1:]
+                self.refresh_file(Path(file_entry.path), st)
+                stats['added' if rel_path not in known else 'updated'] += 1
+                known[rel_path] = (st.st_mtime_ns, st.st_size)
+
+    @synchronized
+    def update(self, files: Iterable[os.DirEntry]) -> dict:
+        """
+        根据文件指纹增量更新索引
+
+        Args:
+            files: 根目录下需要纳入索引的文件（DirEntry，复用其缓存的 stat）
+
+        Returns:
+            更新统计
+        """
+        start = time.monotonic()
+        known = self.fingerprints()
+        seen = set()
+        added = updated = unchanged = 0
+
+        root = str(self.root)
+        for entry in files:
+            check_cancelled()
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            rel_path = entry.path[len(root.rstrip(os.sep)) + 1:]
+            seen.add(rel_path)
+            fingerprint = known.get(rel_path)
+            if fingerprint == (st.st_mtime_ns, st.st_size):
+                unchanged += 1
+                continue
+            self.refresh_file(Path(entry.path), st)
+            if fingerprint is None:
+                added += 1
+            else:
+                updated += 1
+
+        removed = [path for path in known if path not in seen]
+        self.remove(removed)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('updated_at', ?)",
+            (str(time.time()),),
+        )
+        self.commit()
+
+        return {
+            'added': added,
+            'updated': updated,
+            'removed': len(removed),
+            'unchanged': unchanged,
+            'elapsed_ms': round((time.monotonic() - start) * 1000, 1),
+        }
+
+    @synchronized
+    def candidates(self, content_pattern: str) -> Optional[set]:
+        """
+        返回可能包含 content_pattern 的文件相对路径集合
+
+        模式不足三个字节时无法利用索引，返回 None 表示需要全量扫描。
+        """
+        needle = normalize(content_pattern)
+        if len(needle) < 3:
+            return None
+        # 每个三元组单独取交集，先处理最稀有的三元组以尽早缩小集合
+        tris = sorted(
+            trigrams(needle),
+            key=lambda tri: self.conn.execute(
+                'SELECT COUNT(*) FROM postings WHERE tri = ?', (tri,)
+            ).fetchone()[0],
+        )
+        ids = None
+        for tri in tris:
+            rows = {r[0] for r in self.conn.execute(
+                'SELECT file_id FROM postings WHERE tri = ?', (tri,)
+            )}
+            ids = rows if ids is None else ids & rows
+            if not ids:
+                break
+        ids = ids or set()
+        ids.update(r[0] for r in self.conn.execute('SELECT id FROM files WHERE indexed = 0'))
+        if not ids:
+            return set()
+        paths = set()
+        id_list = list(ids)
+        for i in range(0, len(id_list), 500):
+            chunk = id_list[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            paths.update(r[0] for r in self.conn.execute(
+                f'SELECT path FROM files WHERE id IN ({placeholders})', chunk
+            ))
+        return paths
+
+    @synchronized
+    def status(self) -> dict:
+        """返回索引状态"""
+        files, unindexed = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(indexed = 0), 0) FROM files'
+        ).fetchone()
+        postings = self.conn.execute('SELECT COUNT(*) FROM postings').fetchone()[0]
+        updated_at = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'updated_at'"
+        ).fetchone()
+        return {
+            'root': str(self.root),
+            'index_path': str(self.db_path),
+            'files': files,
+            'unindexed_files': unindexed,
+            'postings': postings,
+            'index_bytes': self.db_path.stat().st_size if self.db_path.exists() else 0,
+            'updated_at': float(updated_at[0]) if updated_at else None,
+            'pending_changes': len(self.changed),
+        }
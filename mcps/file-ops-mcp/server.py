@@ -6,11 +6,19 @@ File Operations MCP Server
 - 读取文件
 - 写入文件
 - 搜索文件
+- 内容索引（加速内容搜索）
 """
 
 import fnmatch
-import json
+import itertools
+import mmap
 import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 
@@ -18,12 +26,61 @@ from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 
+# 共享模块位于 mcps/mcp_common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from content_index import ContentIndex
+from mcp_common.binary import (
+    SKIP_BINARY, SKIP_EXTENSION, SKIP_SIZE, SNIFF_SIZE, looks_binary, skip_by_stat,
+)
+from mcp_common.encoding import OUTPUT_FORMAT_PROPERTY, encode_result
+from mcp_common.executor import ToolExecutor, check_cancelled
+from mcp_common.progress import current_progress, deadline_after, expired, start_progress
+from mcp_common.walker import IGNORED_DIRS, relative_path, walk_files
+from mcp_common.watcher import TreeWatcher, under, watcher_from_env
+
 # 服务器配置
 server = Server("file-ops-mcp")
 
 # 默认允许访问的根目录（可配置）
 ALLOWED_ROOTS = os.environ.get('FILE_OPS_ROOT', os.getcwd()).split(os.pathsep)
 
+# 并行内容搜索时每个任务处理的文件数（进程池按批提交以摊薄进程间通信开销）
+SCAN_BATCH_SIZE = {'thread': 1, 'process': 64}
+
+# 行偏移索引的稀疏步长：每隔多少行记录一次字节偏移
+LINE_INDEX_STRIDE = 1000
+
+# 缓存的行偏移索引数量上限
+LINE_INDEX_CACHE_SIZE = 64
+
+# 按范围读取时单次返回的最大字节数
+READ_CHUNK_LIMIT = 1024 * 1024
+
+# 行偏移索引缓存：(路径, mtime_ns, size) -> (稀疏偏移列表, 总行数)
+_line_indexes: OrderedDict[tuple, tuple[list[int], int]] = OrderedDict()
+
+# 正则元字符（用于提取字面量前缀）
+REGEX_META = set('.^$*+?{}[]\\|()')
+
+# 计算行号时每次复制的最大字节数
+LINE_COUNT_BLOCK = 1024 * 1024
+
+# 各工具的最大并发数（工具在有界线程池中执行，同时在执行的内容索引操作会串行化）
+TOOL_LIMITS = {'read_file': 8, 'write_file': 4, 'search_files': 2, 'manage_index': 1}
+
+# 不超过该大小的读写直接在事件循环中执行
+INLINE_IO_SIZE = 64 * 1024
+
+# 执行工具调用的线程池
+executor = ToolExecutor(TOOL_LIMITS)
+
+# 已打开的内容索引（按根目录缓存）
+_indexes: dict[Path, ContentIndex] = {}
+
+# 可选的文件系统监视器（FILE_OPS_WATCH=auto|inotify|poll，默认关闭），在 main 中启动
+_watcher: TreeWatcher | None = None
+
 
 def is_path_allowed(path: str) -> bool:
     """
@@ -45,13 +102,129 @@ def is_path_allowed(path: str) -> bool:
         return False
 
 
-def read_file(path: str, encoding: str = 'utf-8') -> dict:
+def line_index(file_path: Path, st: os.stat_result) -> tuple[list[int], int]:
+    """
+    获取文件的稀疏行偏移索引
+
+    offsets[k] 是第 k * LINE_INDEX_STRIDE + 1 行起始处的字节偏移。
+    索引通过 mmap 扫描一次建立，按 (路径, mtime_ns, size) 缓存，文件变化后自动失效。
+
+    Args:
+        file_path: 文件路径
+        st: 文件的 stat 结果
+
+    Returns:
+        (稀疏偏移列表, 总行数)
+    """
+    key = (str(file_path), st.st_mtime_ns, st.st_size)
+    cached = _line_indexes.get(key)
+    if cached is not None:
+        _line_indexes.move_to_end(key)
+        return cached
+
+    offsets = [0]
+    lines = 0
+    pos = 0
+    if st.st_size:
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            find = mm.find
+            while True:
+                nl = find(b'\n', pos)
+                if nl == -1:
+                    break
+                lines += 1
+                pos = nl + 1
+                if lines % LINE_INDEX_STRIDE == 0:
+                    offsets.append(pos)
+    # 末尾没有换行符的最后一行同样计数
+    total = lines + (1 if pos < st.st_size else 0)
+
+    _line_indexes[key] = (offsets, total)
+    if len(_line_indexes) > LINE_INDEX_CACHE_SIZE:
+        _line_indexes.popitem(last=False)
+    return offsets, total
+
+
+def read_byte_range(file_path: Path, st: os.stat_result, encoding: str, offset: int, length: int | None) -> dict:
+    """按字节范围读取文件（seek 后只读取所需部分）"""
+    length = READ_CHUNK_LIMIT if length is None else min(length, READ_CHUNK_LIMIT)
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(length)
+    return {
+        'offset': offset,
+        'length': len(data),
+        'eof': offset + len(data) >= st.st_size,
+        'content': data.decode(encoding, errors='replace'),
+    }
+
+
+def read_line_range(
+    file_path: Path,
+    st: os.stat_result,
+    encoding: str,
+    start_line: int,
+    end_line: int | None
+) -> dict:
+    """按行范围读取文件（通过稀疏行偏移索引定位，无需从头扫描）"""
+    offsets, total = line_index(file_path, st)
+    end_line = total if end_line is None else min(end_line, total)
+    chunks = []
+    read_bytes = 0
+    last_line = start_line - 1
+    truncated = False
+
+    if start_line <= end_line:
+        checkpoint = (start_line - 1) // LINE_INDEX_STRIDE
+        with open(file_path, 'rb') as f:
+            f.seek(offsets[checkpoint])
+            for _ in range(checkpoint * LINE_INDEX_STRIDE + 1, start_line):
+                f.readline()
+            for line_no in range(start_line, end_line + 1):
+                # 最多多读一个字节，用于判断该行是否超出剩余额度
+                line = f.readline(READ_CHUNK_LIMIT - read_bytes + 1)
+                if read_bytes + len(line) > READ_CHUNK_LIMIT:
+                    truncated = True
+                    if not chunks:
+                        # 单行超过上限：只返回该行的前 READ_CHUNK_LIMIT 字节
+                        chunks.append(line[:READ_CHUNK_LIMIT])
+                        last_line = line_no
+                    break
+                chunks.append(line)
+                read_bytes += len(line)
+                last_line = line_no
+
+    return {
+        'start_line': start_line,
+        'end_line': last_line,
+        'total_lines': total,
+        'truncated': truncated,
+        'content': b''.join(chunks).decode(encoding, errors='replace'),
+    }
+
+
+def read_file(
+    path: str,
+    encoding: str = 'utf-8',
+    offset: int | None = None,
+    length: int | None = None,
+    start_line: int | None = None,
+    end_line: int | None = None
+) -> dict:
     """
     读取文件内容
 
+    不指定范围时读取整个文件；指定 offset/length 时按字节范围读取，
+    指定 start_line/end_line 时按行范围读取（行号从 1 开始，包含 end_line）。
+    范围读取不会加载整个文件，单次最多返回 READ_CHUNK_LIMIT 字节。
+
     Args:
         path: 文件路径
         encoding: 文件编码
+        offset: 起始字节偏移
+        length: 读取的字节数
+        start_line: 起始行号
+        end_line: 结束行号
 
     Returns:
         包含文件内容和元数据的字典
@@ -67,13 +240,31 @@ def read_file(path: str, encoding: str = 'utf-8') -> dict:
     if not file_path.is_file():
         return {'error': f'不是文件: {path}'}
 
+    byte_range = offset is not None or length is not None
+    line_range = start_line is not None or end_line is not None
+    if byte_range and line_range:
+        return {'error': '不能同时指定字节范围和行范围'}
+    if any(v is not None and v < 0 for v in (offset, length)):
+        return {'error': 'offset 和 length 不能为负数'}
+    if any(v is not None and v < 1 for v in (start_line, end_line)):
+        return {'error': '行号从 1 开始'}
+
     try:
-        content = file_path.read_text(encoding=encoding, errors='replace')
-        return {
+        st = file_path.stat()
+        meta = {
             'path': str(file_path),
             'name': file_path.name,
-            'size': file_path.stat().st_size,
+            'size': st.st_size,
             'encoding': encoding,
+        }
+        if byte_range:
+            return {**meta, **read_byte_range(file_path, st, encoding, offset or 0, length)}
+        if line_range:
+            return {**meta, **read_line_range(file_path, st, encoding, start_line or 1, end_line)}
+
+        content = file_path.read_text(encoding=encoding, errors='replace')
+        return {
+            **meta,
             'content': content,
             'line_count': len(content.splitlines()),
         }
@@ -81,6 +272,8 @@ def read_file(path: str, encoding: str = 'utf-8') -> dict:
         return {'error': f'权限不足: {path}'}
     except UnicodeDecodeError:
         return {'error': f'编码错误: 无法用 {encoding} 解码文件'}
+    except LookupError:
+        return {'error': f'未知编码: {encoding}'}
 
 
 def write_file(path: str, content: str, encoding: str = 'utf-8', create_dirs: bool = False) -> dict:
@@ -124,20 +317,482 @@ def write_file(path: str, content: str, encoding: str = 'utf-8', create_dirs: bo
         return {'error': f'写入失败: {e}'}
 
 
+def iter_files(root_path: Path, respect_gitignore: bool = True):
+    """
+    遍历目录下需要搜索的文件，跳过隐藏文件，并剪枝常见忽略目录
+
+    Args:
+        root_path: 已解析的目录路径
+        respect_gitignore: 是否同时剪枝 .gitignore 中忽略的文件和目录
+
+    Yields:
+        文件的 DirEntry
+    """
+    return walk_files(str(root_path), IGNORED_DIRS, gitignore=respect_gitignore)
+
+
+def match_content(file_path: Path, content_pattern: str, max_matches: int = 1, whole_word: bool = False) -> list:
+    """
+    逐行搜索文件内容（大小写不敏感）
+
+    Args:
+        file_path: 文件路径
+        content_pattern: 要搜索的字符串
+        max_matches: 最多返回的匹配行数
+        whole_word: 是否只匹配完整单词
+
+    Returns:
+        匹配行列表，无匹配或无法读取时为空列表
+    """
+    needle = content_pattern.lower()
+    # str 正则的大小写转换和单词边界都支持 Unicode
+    word = re.compile(rf'\b{re.escape(content_pattern)}\b', re.IGNORECASE) if whole_word else None
+    matches = []
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for i, line in enumerate(f, 1):
+                if needle in line.lower() and (word is None or word.search(line)):
+                    matches.append({
+                        'line': i,
+                        'text': line.strip()[:100],
+                    })
+                    if len(matches) >= max_matches:
+                        break
+    except (PermissionError, UnicodeDecodeError):
+        return []
+    return matches
+
+
+def literal_prefix(source: str) -> str:
+    """
+    提取正则表达式中每个匹配都必须以之开头的字面量前缀
+
+    含有分支（|）的表达式无法保证公共前缀，返回空字符串。
+    """
+    if '|' in source:
+        return ''
+    prefix = []
+    for i, c in enumerate(source):
+        if c in REGEX_META:
+            # 量词作用于前一个字符，该字符不再是必需的
+            if c in '*?{' and prefix:
+                prefix.pop()
+            break
+        prefix.append(c)
+    return ''.join(prefix)
+
+
+def count_newlines(mm: mmap.mmap, start: int, end: int) -> int:
+    """统计 mm[start:end] 中的换行符数量（分块复制，避免一次复制大段内容）"""
+    total = 0
+    for pos in range(start, end, LINE_COUNT_BLOCK):
+        total += mm[pos:min(pos + LINE_COUNT_BLOCK, end)].count(b'\n')
+    return total
+
+
+def find_ignorecase(mm: mmap.mmap, needle: bytes, start: int) -> int:
+    """
+    大小写不敏感地查找 ASCII 字面量
+
+    分块执行 bytes.lower() 后用 find 查找，比 IGNORECASE 正则快得多。
+    相邻块重叠 len(needle) - 1 字节，保证跨块的匹配不会遗漏。
+    """
+    size = len(mm)
+    step = LINE_COUNT_BLOCK
+    overlap = len(needle) - 1
+    pos = start
+    while pos < size:
+        end = min(pos + step + overlap, size)
+        found = mm[pos:end].lower().find(needle)
+        if found != -1:
+            return pos + found
+        pos += step
+    return -1
+
+
+class ContentMatcher:
+    """
+    编译后的内容匹配器
+
+    将模式编译为 bytes 正则，对 mmap 映射的整个文件执行搜索，
+    不需要逐行解码和转换大小写。字面量先用 find 定位（大小写不敏感时分块转小写后查找），
+    只有整词匹配和正则才需要在候选位置运行正则。匹配器可被 pickle，供进程池使用。
+    """
+
+    def __init__(
+        self,
+        content_pattern: str,
+        regex: bool = False,
+        case_sensitive: bool = False,
+        whole_word: bool = False,
+        max_matches: int = 1,
+        skip_binary: bool = True
+    ):
+        """
+        Args:
+            content_pattern: 要搜索的字符串或正则表达式
+            regex: content_pattern 是否为正则表达式
+            case_sensitive: 是否区分大小写
+            whole_word: 是否只匹配完整单词
+            max_matches: 每个文件最多返回的匹配行数
+            skip_binary: 是否跳过首个数据块中含 NUL 字节的文件
+
+        Raises:
+            re.error: 正则表达式无效
+        """
+        self.content_pattern = content_pattern
+        self.max_matches = max_matches
+        self.skip_binary = skip_binary
+        self.pattern = None
+        self.literal = b''
+        self.case_sensitive = case_sensitive
+        self.whole_word = whole_word
+        # 字面量定位到的位置即为匹配位置时，无需再运行正则
+        self.literal_is_match = not (regex or whole_word)
+
+        # bytes 的大小写转换只处理 ASCII，非 ASCII 的大小写不敏感子串搜索沿用逐行匹配
+        if not (regex or case_sensitive or content_pattern.isascii()):
+            return
+
+        source = content_pattern if regex else re.escape(content_pattern)
+        if whole_word:
+            source = rf'\b(?:{source})\b'
+        flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+        self.pattern = re.compile(source.encode('utf-8'), flags)
+
+        # 前缀过滤：每个匹配都必须以该字面量开头，先用 find 定位候选位置
+        literal = literal_prefix(content_pattern) if regex else content_pattern
+        if case_sensitive:
+            self.literal = literal.encode('utf-8')
+        elif literal.isascii():
+            self.literal = literal.lower().encode('utf-8')
+
+    def find_literal(self, mm: mmap.mmap, pos: int) -> int:
+        """从 pos 开始查找字面量前缀"""
+        if self.case_sensitive:
+            return mm.find(self.literal, pos)
+        return find_ignorecase(mm, self.literal, pos)
+
+    def match(self, file_path) -> list:
+        """
+        在文件中搜索内容
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            匹配行列表（每行最多报告一次），无匹配或无法读取时为空列表；
+            文件被识别为二进制文件而跳过时为 None
+        """
+        if self.pattern is None:
+            if self.skip_binary:
+                try:
+                    with open(file_path, 'rb') as f:
+                        if looks_binary(f.read(SNIFF_SIZE)):
+                            return None
+                except OSError:
+                    return []
+            return match_content(file_path, self.content_pattern, self.max_matches, self.whole_word)
+
+        matches = []
+        try:
+            with open(file_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return []
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if self.skip_binary and looks_binary(mm[:SNIFF_SIZE]):
+                        return None
+                    size = len(mm)
+                    pos = 0
+                    line_no = 1
+                    counted = 0
+                    while len(matches) < self.max_matches and pos <= size:
+                        if self.literal:
+                            found = self.find_literal(mm, pos)
+                            if found == -1:
+                                break
+                            if self.literal_is_match:
+                                start = found
+                            else:
+                                # 字面量出现的位置之前不可能有匹配
+                                m = self.pattern.search(mm, found)
+                                if m is None:
+                                    break
+                                start = m.start()
+                        else:
+                            m = self.pattern.search(mm, pos)
+                            if m is None:
+                                break
+                            start = m.start()
+
+                        line_start = mm.rfind(b'\n', 0, start) + 1
+                        line_end = mm.find(b'\n', start)
+                        if line_end == -1:
+                            line_end = size
+                        line_no += count_newlines(mm, counted, line_start)
+                        counted = line_start
+                        matches.append({
+                            'line': line_no,
+                            'text': mm[line_start:min(line_end, line_start + 4096)]
+                                .decode('utf-8', errors='ignore').strip()[:100],
+                        })
+                        # 同一行只报告一次
+                        pos = line_end + 1
+        except (OSError, ValueError):
+            return []
+        return matches
+
+
+def match_batch(file_paths: list, matcher: ContentMatcher) -> list:
+    """对一批文件执行内容匹配（供进程池调用）"""
+    return [matcher.match(file_path) for file_path in file_paths]
+
+
+def parallel_match(
+    entries,
+    matcher: ContentMatcher,
+    max_results: int,
+    workers: int,
+    mode: str,
+    skipped: dict
+) -> list:
+    """
+    并行执行内容匹配
+
+    主线程负责遍历和筛选文件，匹配任务按批提交到线程池或进程池。
+    在途任务数量有上限，结果按提交顺序收集，因此返回顺序与顺序扫描一致，
+    达到 max_results 后取消剩余任务。
+
+    Args:
+        entries: (文件路径, 结果字典) 的迭代器
+        matcher: 内容匹配器
+        max_results: 最大结果数量
+        workers: 工作线程/进程数
+        mode: thread（I/O 密集）或 process（CPU 密集）
+        skipped: 跳过统计，识别为二进制的文件会累加到其中
+
+    Returns:
+        带匹配信息的结果列表
+    """
+    pool_cls = ProcessPoolExecutor if mode == 'process' else ThreadPoolExecutor
+    progress = current_progress()
+    batch_size = SCAN_BATCH_SIZE[mode]
+    max_pending = workers * 4
+    batches = iter(lambda: list(itertools.islice(entries, batch_size)), [])
+    pending = deque()
+    results = []
+
+    pool = pool_cls(max_workers=workers)
+    try:
+        def submit_next() -> bool:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            paths = [file_path for file_path, _ in batch]
+            pending.append((batch, pool.submit(match_batch, paths, matcher)))
+            return True
+
+        while len(pending) < max_pending and submit_next():
+            pass
+
+        while pending and len(results) < max_results:
+            check_cancelled()
+            batch, future = pending.popleft()
+            for (_, result), matches in zip(batch, future.result()):
+                if matches is None:
+                    skipped[SKIP_BINARY] += 1
+                elif matches and len(results) < max_results:
+                    result['matches'] = matches
+                    results.append(result)
+                    progress.partial([result])
+            submit_next()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return results
+
+
+def on_change(path: str | None):
+    """
+    监视器回调：失效变化文件的行偏移索引，并把变化记录到覆盖它的内容索引
+
+    Args:
+        path: 变化的文件或目录，None 表示变化范围未知
+    """
+    for key in list(_line_indexes):
+        if path is None or key[0] == path:
+            _line_indexes.pop(key, None)
+    for root, index in list(_indexes.items()):
+        if path is None or under(path, str(root)):
+            index.mark_changed(path)
+
+
+def start_watcher():
+    """按 FILE_OPS_WATCH 启动监视器，在后台线程中为 ALLOWED_ROOTS 添加监视"""
+    global _watcher
+    _watcher = watcher_from_env('FILE_OPS_WATCH', on_change)
+    if _watcher is not None:
+        roots = [os.path.realpath(root) for root in ALLOWED_ROOTS]
+        threading.Thread(target=lambda: [_watcher.watch(root) for root in roots], daemon=True).start()
+
+
+def is_watched(index: ContentIndex) -> bool:
+    """内容索引的根目录是否被监视器完整覆盖（索引可以由监视事件保持新鲜）"""
+    return _watcher is not None and _watcher.covers(str(index.root))
+
+
+def track_index(root_path: Path, index: ContentIndex) -> ContentIndex:
+    """缓存已打开的索引；启用监视时，打开前的变化未被记录，首次使用前需要完整同步"""
+    index.resync = _watcher is not None
+    _indexes[root_path] = index
+    return index
+
+
+def index_files(index: ContentIndex, root_path: Path, paths):
+    """
+    按遍历顺序（每个目录先文件后子目录，按名称排序）列出索引中位于 root_path 下的文件
+
+    Args:
+        index: 内容索引
+        root_path: 搜索目录（索引根目录或其子目录）
+        paths: 索引中的相对路径
+
+    Yields:
+        IndexedFile
+    """
+    prefix = str(root_path)[len(str(index.root).rstrip(os.sep)) + 1:]
+    prefix = prefix + os.sep if prefix else ''
+
+    def walk_order(rel_path: str) -> list:
+        parts = rel_path.split(os.sep)
+        return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+    for rel_path in sorted((p for p in paths if p.startswith(prefix)), key=walk_order):
+        try:
+            yield IndexedFile(os.path.join(str(index.root), rel_path))
+        except OSError:
+            continue
+
+
+class IndexedFile:
+    """内容索引中的文件，提供 search_files 用到的 DirEntry 接口（name、path、stat）"""
+
+    __slots__ = ('name', 'path', '_stat')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat = os.stat(path)
+
+    def stat(self) -> os.stat_result:
+        return self._stat
+
+
+def find_index(directory: Path) -> ContentIndex | None:
+    """
+    查找覆盖 directory 的内容索引（目录本身或其祖先目录上建立的索引）
+
+    Args:
+        directory: 已解析的目录路径
+
+    Returns:
+        内容索引，不存在时为 None
+    """
+    for candidate in (directory, *directory.parents):
+        if not is_path_allowed(str(candidate)):
+            break
+        index = _indexes.get(candidate)
+        if index is None:
+            index = ContentIndex.open_existing(candidate)
+            if index is None:
+                continue
+            track_index(candidate, index)
+        return index
+    return None
+
+
+def manage_index(directory: str, action: str = 'status') -> dict:
+    """
+    管理目录的内容索引
+
+    Args:
+        directory: 索引根目录
+        action: build（建立或增量更新）、status（查看状态）、drop（删除索引）
+
+    Returns:
+        操作结果
+    """
+    if not is_path_allowed(directory):
+        return {'error': f'访问被拒绝: 路径不在允许的范围内: {directory}'}
+
+    root_path = Path(directory).resolve()
+
+    if not root_path.is_dir():
+        return {'error': f'不是目录: {directory}'}
+
+    if action == 'build':
+        index = _indexes.get(root_path) or track_index(root_path, ContentIndex(root_path))
+        try:
+            stats = index.apply_changes(resync=True)
+        except OSError as e:
+            return {'error': f'建立索引失败: {e}'}
+        return {'action': action, **stats, **index.status()}
+
+    if action == 'status':
+        index = find_index(root_path)
+        if index is None:
+            return {'action': action, 'directory': str(root_path), 'indexed': False}
+        return {'action': action, 'indexed': True, **index.status()}
+
+    if action == 'drop':
+        index = _indexes.pop(root_path, None) or ContentIndex.open_existing(root_path)
+        if index is None:
+            return {'action': action, 'directory': str(root_path), 'dropped': False}
+        index.close()
+        index.db_path.unlink(missing_ok=True)
+        return {'action': action, 'directory': str(root_path), 'dropped': True}
+
+    return {'error': f'未知操作: {action}'}
+
+
 def search_files(
     directory: str,
     pattern: str = '*',
     content_pattern: str = None,
-    max_results: int = 100
+    max_results: int = 100,
+    use_index: bool = True,
+    workers: int = 1,
+    mode: str = 'thread',
+    respect_gitignore: bool = True,
+    regex: bool = False,
+    case_sensitive: bool = False,
+    whole_word: bool = False,
+    max_matches_per_file: int = 1,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    time_budget: float | None = None
 ) -> dict:
     """
     搜索文件
 
+    搜索过程中报告进度（已扫描的文件数和已找到的结果数），新找到的结果可流式返回。
+
     Args:
         directory: 搜索目录
         pattern: 文件名模式（支持通配符）
         content_pattern: 文件内容模式（可选，在文件中搜索）
         max_results: 最大结果数量
+        use_index: 存在内容索引时是否使用索引筛选候选文件
+        workers: 内容匹配的并行度（1 表示顺序扫描）
+        mode: 并行方式，thread（I/O 密集）或 process（CPU 密集）
+        respect_gitignore: 是否跳过 .gitignore 中忽略的文件和目录
+        regex: content_pattern 是否为正则表达式
+        case_sensitive: 内容搜索是否区分大小写
+        whole_word: 内容搜索是否只匹配完整单词
+        max_matches_per_file: 每个文件最多返回的匹配行数
+        skip_binary: 内容搜索时是否跳过二进制文件（扩展名黑名单和 NUL 字节嗅探）
+        max_file_size: 内容搜索的文件大小上限（字节），None 表示不限制
+        time_budget: 时间预算（秒），超出后停止遍历，返回已找到的结果并标记 truncated_by_deadline
 
     Returns:
         搜索结果列表
@@ -153,60 +808,130 @@ def search_files(
     if not root_path.is_dir():
         return {'error': f'不是目录: {directory}'}
 
-    results = []
-
-    try:
-        for file_path in root_path.rglob('*'):
-            if len(results) >= max_results:
-                break
+    if mode not in SCAN_BATCH_SIZE:
+        return {'error': f'未知的并行方式: {mode}'}
 
-            if not file_path.is_file():
-                continue
+    matcher = None
+    if content_pattern:
+        try:
+            matcher = ContentMatcher(
+                content_pattern, regex, case_sensitive, whole_word, max_matches_per_file, skip_binary,
+            )
+        except re.error as e:
+            return {'error': f'无效的正则表达式: {e}'}
 
-            # 跳过隐藏文件和常见忽略目录
-            if any(part.startswith('.') for part in file_path.parts):
-                continue
-            if any(part in {'node_modules', '__pycache__', 'venv', '.venv', 'target', 'build', 'dist', '.git'}
-                   for part in file_path.parts):
-                continue
+    results = []
+    skipped = {SKIP_EXTENSION: 0, SKIP_SIZE: 0, SKIP_BINARY: 0}
+    # 三元组索引只能筛选字面量模式
+    index = find_index(root_path) if content_pattern and use_index and not regex else None
+    # 监视器覆盖索引根目录时，先写入记录的变化，再直接从索引中列出文件，不再遍历目录
+    watched = index is not None and respect_gitignore and is_watched(index)
+    try:
+        if watched:
+            index.apply_changes()
+        candidates = index.candidates(content_pattern) if index else None
+        fingerprints = index.fingerprints() if index is not None and (candidates is not None or watched) else {}
+    except sqlite3.ProgrammingError:
+        # 索引已被并发的 manage_index drop 关闭：退回到遍历目录的普通扫描
+        index, watched, candidates, fingerprints = None, False, None, {}
+    progress = current_progress()
+    deadline = deadline_after(time_budget)
+    truncated_by_deadline = False
 
+    def entries():
+        """按遍历顺序产出通过文件名和索引筛选的 (文件路径, 结果字典)"""
+        nonlocal truncated_by_deadline
+        root = str(root_path)
+        index_root = str(index.root) if index else None
+        # 从索引中列出文件时总数已知
+        total = None
+        if watched:
+            listed = candidates if candidates is not None else fingerprints
+            total = len(listed)
+            files = index_files(index, root_path, listed)
+        else:
+            files = iter_files(root_path, respect_gitignore)
+        scanned = 0
+        for entry in files:
+            check_cancelled()
+            if expired(deadline):
+                truncated_by_deadline = True
+                return
+            scanned += 1
+            progress.update(scanned, total, f'已扫描 {scanned} 个文件，找到 {progress.items} 个结果')
             # 文件名匹配
-            if not fnmatch.fnmatch(file_path.name, pattern):
+            if not fnmatch.fnmatch(entry.name, pattern):
                 continue
 
+            st = entry.stat()
+            file_path = Path(entry.path)
             result = {
-                'path': str(file_path.relative_to(root_path)),
-                'name': file_path.name,
-                'size': file_path.stat().st_size,
+                'path': relative_path(entry, root),
+                'name': entry.name,
+                'size': st.st_size,
             }
 
-            # 内容搜索
             if content_pattern:
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        for i, line in enumerate(f, 1):
-                            if content_pattern.lower() in line.lower():
-                                result['matches'] = result.get('matches', [])
-                                if len(result['matches']) < 5:  # 限制每个文件的匹配数
-                                    result['matches'].append({
-                                        'line': i,
-                                        'text': line.strip()[:100],
-                                    })
-                                break
-                        if 'matches' not in result:
-                            continue
-                except (PermissionError, UnicodeDecodeError):
+                # 解码前的快速跳过：扩展名黑名单和大小上限都不需要读取文件
+                reason = skip_by_stat(entry.name, st.st_size, max_file_size, skip_binary)
+                if reason:
+                    skipped[reason] += 1
                     continue
 
-            results.append(result)
+            if content_pattern and candidates is not None:
+                rel_path = relative_path(entry, index_root)
+                if fingerprints.get(rel_path) != (st.st_mtime_ns, st.st_size):
+                    # 文件在建索引后发生变化：刷新索引记录，并直接扫描
+                    try:
+                        index.refresh_file(file_path, st)
+                    except sqlite3.ProgrammingError:
+                        pass
+                elif rel_path not in candidates:
+                    continue
 
-        return {
+            yield file_path, result
+
+    try:
+        if content_pattern and workers > 1:
+            results = parallel_match(entries(), matcher, max_results, workers, mode, skipped)
+        else:
+            for file_path, result in entries():
+                if len(results) >= max_results:
+                    break
+
+                # 内容搜索
+                if content_pattern:
+                    matches = matcher.match(file_path)
+                    if matches is None:
+                        skipped[SKIP_BINARY] += 1
+                        continue
+                    if not matches:
+                        continue
+                    result['matches'] = matches
+
+                results.append(result)
+                progress.partial([result])
+
+        if index:
+            try:
+                index.commit()
+            except sqlite3.ProgrammingError:
+                # 搜索期间索引被删除，刷新的记录随之丢弃
+                pass
+
+        response = {
             'directory': str(root_path),
             'pattern': pattern,
             'content_pattern': content_pattern,
             'count': len(results),
+            'indexed': candidates is not None,
             'results': results,
         }
+        if content_pattern:
+            response['skipped'] = skipped
+        if time_budget is not None:
+            response['truncated_by_deadline'] = truncated_by_deadline
+        return response
 
     except PermissionError:
         return {'error': f'权限不足: {directory}'}
@@ -220,7 +945,7 @@ async def list_tools() -> list[Tool]:
     return [
         Tool(
             name="read_file",
-            description="读取文件内容。支持指定编码方式。需要文件路径在允许的访问范围内。",
+            description="读取文件内容。支持指定编码方式，以及按字节范围或行范围分段读取大文件。需要文件路径在允许的访问范围内。",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -233,6 +958,27 @@ async def list_tools() -> list[Tool]:
                         "description": "文件编码（默认 utf-8）",
                         "default": "utf-8",
                     },
+                    "offset": {
+                        "type": "number",
+                        "description": "按字节范围读取：起始字节偏移",
+                        "minimum": 0,
+                    },
+                    "length": {
+                        "type": "number",
+                        "description": "按字节范围读取：读取的字节数（最多 1 MiB）",
+                        "minimum": 0,
+                    },
+                    "start_line": {
+                        "type": "number",
+                        "description": "按行范围读取：起始行号（从 1 开始）",
+                        "minimum": 1,
+                    },
+                    "end_line": {
+                        "type": "number",
+                        "description": "按行范围读取：结束行号（包含），默认读到文件末尾或 1 MiB 上限",
+                        "minimum": 1,
+                    },
+                    "output_format": OUTPUT_FORMAT_PROPERTY,
                 },
                 "required": ["path"],
             },
@@ -261,6 +1007,7 @@ async def list_tools() -> list[Tool]:
                         "description": "自动创建父目录（默认 false）",
                         "default": False,
                     },
+                    "output_format": OUTPUT_FORMAT_PROPERTY,
                 },
                 "required": ["path", "content"],
             },
@@ -291,6 +1038,93 @@ async def list_tools() -> list[Tool]:
                         "minimum": 1,
                         "maximum": 1000,
                     },
+                    "use_index": {
+                        "type": "boolean",
+                        "description": "存在内容索引时使用索引筛选候选文件（默认 true）",
+                        "default": True,
+                    },
+                    "workers": {
+                        "type": "number",
+                        "description": "内容搜索的并行度，1 表示顺序扫描（默认 1）",
+                        "default": 1,
+                        "minimum": 1,
+                        "maximum": 64,
+                    },
+                    "mode": {
+                        "type": "string",
+                        "description": "并行方式：thread 适合 I/O 密集，process 适合 CPU 密集（默认 thread）",
+                        "enum": ["thread", "process"],
+                        "default": "thread",
+                    },
+                    "respect_gitignore": {
+                        "type": "boolean",
+                        "description": "跳过 .gitignore 中忽略的文件和目录（默认 true）",
+                        "default": True,
+                    },
+                    "regex": {
+                        "type": "boolean",
+                        "description": "content_pattern 为正则表达式（默认 false）",
+                        "default": False,
+                    },
+                    "case_sensitive": {
+                        "type": "boolean",
+                        "description": "内容搜索区分大小写（默认 false）",
+                        "default": False,
+                    },
+                    "whole_word": {
+                        "type": "boolean",
+                        "description": "内容搜索只匹配完整单词（默认 false）",
+                        "default": False,
+                    },
+                    "max_matches_per_file": {
+                        "type": "number",
+                        "description": "每个文件最多返回的匹配行数（默认 1）",
+                        "default": 1,
+                        "minimum": 1,
+                        "maximum": 100,
+                    },
+                    "skip_binary": {
+                        "type": "boolean",
+                        "description": "内容搜索时跳过二进制文件（默认 true）",
+                        "default": True,
+                    },
+                    "max_file_size": {
+                        "type": "number",
+                        "description": "内容搜索的文件大小上限（字节），超过的文件会被跳过",
+                        "minimum": 1,
+                    },
+                    "time_budget": {
+                        "type": "number",
+                        "description": "时间预算（秒），超出后返回已找到的结果并标记 truncated_by_deadline",
+                        "exclusiveMinimum": 0,
+                    },
+                    "stream": {
+                        "type": "boolean",
+                        "description": "请求带 progressToken 时，把新找到的结果以 notifications/message 增量发送（默认 false）",
+                        "default": False,
+                    },
+                    "output_format": OUTPUT_FORMAT_PROPERTY,
+                },
+                "required": [],
+            },
+        ),
+        Tool(
+            name="manage_index",
+            description="管理目录的持久化内容索引。建立索引后，对该目录及其子目录的内容搜索只会打开候选文件。",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "directory": {
+                        "type": "string",
+                        "description": "索引根目录（默认当前目录）",
+                    },
+                    "action": {
+                        "type": "string",
+                        "description": "build：建立或增量更新索引；status：查看索引状态；drop：删除索引（默认 status）",
+                        "enum": ["build", "status", "drop"],
+                        "default": "status",
+                    },
+                    "output_format": OUTPUT_FORMAT_PROPERTY,
                 },
                 "required": [],
             },
@@ -298,16 +1132,57 @@ async def list_tools() -> list[Tool]:
     ]
 
 
+def runs_inline(name: str, arguments: Any) -> bool:
+    """
+    是否直接在事件循环中执行：只有可预期在亚毫秒内完成的小文件读写走快速路径
+    """
+    if name == 'write_file':
+        return len(arguments.get('content') or '') <= INLINE_IO_SIZE
+    if name == 'read_file':
+        if arguments.get('length') is not None:
+            return int(arguments['length']) <= INLINE_IO_SIZE
+        try:
+            return os.stat(arguments.get('path') or '').st_size <= INLINE_IO_SIZE
+        except (OSError, ValueError):
+            # 读取会立即返回错误
+            return True
+    return False
+
+
 @server.call_tool()
 async def call_tool(name: str, arguments: Any) -> list[TextContent]:
-    """处理工具调用"""
+    """
+    处理工具调用：小文件读写直接执行，其余在线程池中执行，客户端取消时协作式中止
+
+    请求带 progressToken 时，执行期间发送进度通知（和流式的部分结果）。
+    """
+    if runs_inline(name, arguments):
+        return run_tool(name, arguments)
+    try:
+        context = server.request_context
+    except LookupError:
+        context = None
+    progress = start_progress(context, name, arguments.get('stream', False))
+    result = await executor.run(name, run_tool, name, arguments)
+    if progress is not None:
+        await progress.drain()
+    return result
+
+
+def run_tool(name: str, arguments: Any) -> list[TextContent]:
+    """执行工具调用（同步）"""
     if name == "read_file":
         path = arguments.get('path')
         encoding = arguments.get('encoding', 'utf-8')
         if not path:
             raise ValueError("path is required")
-        result = read_file(path, encoding)
-        return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+        ranges = {
+            key: int(arguments[key])
+            for key in ('offset', 'length', 'start_line', 'end_line')
+            if arguments.get(key) is not None
+        }
+        result = read_file(path, encoding, **ranges)
+        return [TextContent(type="text", text=encode_result(result, arguments.get('output_format')))]
 
     elif name == "write_file":
         path = arguments.get('path')
@@ -317,15 +1192,35 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
         if not path or content is None:
             raise ValueError("path and content are required")
         result = write_file(path, content, encoding, create_dirs)
-        return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+        return [TextContent(type="text", text=encode_result(result, arguments.get('output_format')))]
 
     elif name == "search_files":
         directory = arguments.get('directory', os.getcwd())
         pattern = arguments.get('pattern', '*')
         content_pattern = arguments.get('content_pattern')
         max_results = arguments.get('max_results', 100)
-        result = search_files(directory, pattern, content_pattern, max_results)
-        return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+        use_index = arguments.get('use_index', True)
+        workers = int(arguments.get('workers', 1))
+        mode = arguments.get('mode', 'thread')
+        respect_gitignore = arguments.get('respect_gitignore', True)
+        result = search_files(
+            directory, pattern, content_pattern, max_results,
+            use_index, workers, mode, respect_gitignore,
+            regex=arguments.get('regex', False),
+            case_sensitive=arguments.get('case_sensitive', False),
+            whole_word=arguments.get('whole_word', False),
+            max_matches_per_file=int(arguments.get('max_matches_per_file', 1)),
+            skip_binary=arguments.get('skip_binary', True),
+            max_file_size=arguments.get('max_file_size'),
+            time_budget=arguments.get('time_budget'),
+        )
+        return [TextContent(type="text", text=encode_result(result, arguments.get('output_format')))]
+
+    elif name == "manage_index":
+        directory = arguments.get('directory', os.getcwd())
+        action = arguments.get('action', 'status')
+        result = manage_index(directory, action)
+        return [TextContent(type="text", text=encode_result(result, arguments.get('output_format')))]
 
     else:
         raise ValueError(f"Unknown tool: {name}")
@@ -333,6 +1228,7 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
 
 async def main():
     """启动服务器"""
+    start_watcher()
     async with stdio_server() as (read_stream, write_stream):
         await server.run(
             read_stream,
@@ -5,16 +5,32 @@ File Operations MCP Server 测试
 运行方式: python test.py
 """
 
+import asyncio
+import contextvars
 import json
 import os
 import sys
 import tempfile
+import threading
+import time
 from pathlib import Path
 
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from server import read_file, write_file, search_files, is_path_allowed
+# 测试在临时目录中进行，需在导入服务器前配置允许访问的根目录和索引目录
+os.environ.setdefault('FILE_OPS_ROOT', tempfile.gettempdir())
+os.environ.setdefault('FILE_OPS_INDEX_DIR', tempfile.mkdtemp(prefix='file-ops-index-'))
+
+import server
+from mcp_common.encoding import OUTPUT_FORMATS, encode_result, from_columnar
+from mcp_common.executor import ToolCancelled, ToolExecutor, check_cancelled
+from mcp_common.progress import Progress, use_progress
+from mcp_common.watcher import TreeWatcher
+from server import (
+    ContentMatcher, is_path_allowed, manage_index, match_content,
+    read_file, search_files, write_file,
+)
 
 # 颜色输出
 class Colors:
@@ -62,6 +78,79 @@ def run_tests():
                     create_dirs=True
                 ),
             },
+            {
+                'name': '按行范围读取',
+                'fn': lambda: (
+                    write_file(str(Path(tmpdir) / 'big.log'), ''.join(f'line {i}\n' for i in range(1, 2501)) + 'tail'),
+                    read_file(str(Path(tmpdir) / 'big.log'), start_line=1999, end_line=2001),
+                )[1],
+            },
+            {
+                'name': '按字节范围读取',
+                'fn': lambda: read_file(str(test_file), offset=7, length=4),
+            },
+            {
+                'name': '正则内容搜索',
+                'fn': lambda: (
+                    write_file(str(Path(tmpdir) / 'code.py'), 'def foo():\n    return Foo\nfoobar = 1\ndef bar(): pass\n'),
+                    search_files(tmpdir, '*.py', r'^def \w+', regex=True, max_matches_per_file=5),
+                )[1],
+            },
+            {
+                'name': '区分大小写和整词匹配',
+                'fn': lambda: {
+                    'case': search_files(tmpdir, '*.py', 'Foo', case_sensitive=True, max_matches_per_file=5),
+                    'word': search_files(tmpdir, '*.py', 'foo', whole_word=True, max_matches_per_file=5),
+                },
+            },
+            {
+                'name': '非 ASCII 整词匹配',
+                'fn': lambda: (
+                    write_file(str(Path(tmpdir) / 'menu.md'), 'Café au lait\nCAFÉS\nmicafé\nun CAFÉ\n'),
+                    search_files(tmpdir, '*.md', 'café', whole_word=True, max_matches_per_file=5),
+                )[1],
+            },
+            {
+                'name': '跳过二进制文件',
+                'fn': lambda: (
+                    (Path(tmpdir) / 'blob.dat2').write_bytes(b'MCP\x00\x01\x02'),
+                    (Path(tmpdir) / 'logo.png').write_bytes(b'MCP'),
+                    search_files(tmpdir, '*', 'MCP', max_file_size=1000),
+                )[-1],
+            },
+            {
+                'name': '遵循 .gitignore',
+                'fn': lambda: (
+                    write_file(str(Path(tmpdir) / '.gitignore'), 'generated/\n*.log\n!keep.log\n'),
+                    write_file(str(Path(tmpdir) / 'generated' / 'out.txt'), 'MCP', create_dirs=True),
+                    write_file(str(Path(tmpdir) / 'debug.log'), 'MCP'),
+                    write_file(str(Path(tmpdir) / 'keep.log'), 'MCP'),
+                    search_files(tmpdir, '*', 'MCP'),
+                )[-1],
+            },
+            {
+                'name': '并行内容搜索',
+                'fn': lambda: {
+                    'sequential': search_files(tmpdir, '*', 'content', use_index=False),
+                    'thread': search_files(tmpdir, '*', 'content', use_index=False, workers=4),
+                    'process': search_files(tmpdir, '*', 'content', use_index=False, workers=2, mode='process'),
+                },
+            },
+            {
+                'name': '建立内容索引',
+                'fn': lambda: manage_index(tmpdir, 'build'),
+            },
+            {
+                'name': '索引内容搜索',
+                'fn': lambda: search_files(tmpdir, '*', 'nested CONTENT'),
+            },
+            {
+                'name': '索引感知文件变化',
+                'fn': lambda: (
+                    write_file(str(Path(tmpdir) / 'subdir' / 'nested.txt'), 'changed text, longer'),
+                    search_files(tmpdir, '*', 'nested content'),
+                )[1],
+            },
         ]
 
         passed = 0
@@ -69,7 +158,7 @@ def run_tests():
 
         for test in tests:
             try:
-                result = test.fn()
+                result = test['fn']()
 
                 if 'error' in result:
                     raise ValueError(result['error'])
@@ -112,12 +201,252 @@ def run_tests():
                         raise ValueError('嵌套文件未创建')
                     log(test['name'], 'PASS', '成功创建嵌套目录')
 
+                # 验证行范围读取（跨越稀疏索引的检查点，且末行无换行符）
+                elif test['name'] == '按行范围读取':
+                    if result.get('content') != 'line 1999\nline 2000\nline 2001\n':
+                        raise ValueError(f'内容不正确: {result.get("content")!r}')
+                    if result.get('total_lines') != 2501:
+                        raise ValueError(f'总行数不正确: {result.get("total_lines")}')
+                    tail = read_file(str(Path(tmpdir) / 'big.log'), start_line=2501)
+                    if tail.get('content') != 'tail':
+                        raise ValueError(f'末行内容不正确: {tail.get("content")!r}')
+                    # 首行超过单次读取上限时同样截断
+                    long_file = Path(tmpdir) / 'long-line.txt'
+                    long_file.write_bytes(b'x' * (server.READ_CHUNK_LIMIT + 10) + b'\nshort\n')
+                    head = read_file(str(long_file), start_line=1, end_line=2)
+                    long_file.unlink()
+                    if len(head['content']) != server.READ_CHUNK_LIMIT or not head['truncated'] or head['end_line'] != 1:
+                        raise ValueError(f'超长行未截断: {len(head["content"])} 字节, end_line={head["end_line"]}')
+                    log(test['name'], 'PASS', f'共 {result.get("total_lines")} 行')
+
+                # 验证字节范围读取
+                elif test['name'] == '按字节范围读取':
+                    if result.get('content') != 'MCP!' or result.get('eof'):
+                        raise ValueError(f'内容不正确: {result}')
+                    log(test['name'], 'PASS', f'读取 {result.get("length")} 字节')
+
+                # 验证正则搜索及行号
+                elif test['name'] == '正则内容搜索':
+                    matches = result['results'][0]['matches']
+                    if [m['line'] for m in matches] != [1, 4]:
+                        raise ValueError(f'匹配行不正确: {matches}')
+                    log(test['name'], 'PASS', f'匹配 {len(matches)} 行')
+
+                # 验证区分大小写和整词匹配
+                elif test['name'] == '区分大小写和整词匹配':
+                    case_lines = [m['line'] for m in result['case']['results'][0]['matches']]
+                    word_lines = [m['line'] for m in result['word']['results'][0]['matches']]
+                    if case_lines != [2] or word_lines != [1, 2]:
+                        raise ValueError(f'匹配行不正确: {case_lines}, {word_lines}')
+                    log(test['name'], 'PASS', '选项生效')
+
+                # 验证非 ASCII 模式的整词匹配（大小写不敏感，走逐行匹配）
+                elif test['name'] == '非 ASCII 整词匹配':
+                    lines = [m['line'] for m in result['results'][0]['matches']]
+                    if lines != [1, 4]:
+                        raise ValueError(f'匹配行不正确: {lines}')
+                    (Path(tmpdir) / 'menu.md').unlink()
+                    log(test['name'], 'PASS', f'匹配 {len(lines)} 行')
+
+                # 验证二进制文件被跳过并计入统计
+                elif test['name'] == '跳过二进制文件':
+                    paths = [r['path'] for r in result.get('results', [])]
+                    skipped = result.get('skipped', {})
+                    if 'blob.dat2' in paths or 'logo.png' in paths:
+                        raise ValueError(f'二进制文件未被跳过: {paths}')
+                    if skipped.get('binary') != 1 or skipped.get('extension') != 1 or skipped.get('size') != 1:
+                        raise ValueError(f'跳过统计不正确: {skipped}')
+                    (Path(tmpdir) / 'blob.dat2').unlink()
+                    (Path(tmpdir) / 'logo.png').unlink()
+                    log(test['name'], 'PASS', f'跳过统计: {skipped}')
+
+                # 验证 .gitignore 规则
+                elif test['name'] == '遵循 .gitignore':
+                    paths = sorted(r['path'] for r in result.get('results', []))
+                    if paths != ['keep.log', 'test.txt']:
+                        raise ValueError(f'结果不正确: {paths}')
+                    log(test['name'], 'PASS', '忽略目录、通配符和取反规则均生效')
+
+                # 验证并行搜索与顺序搜索结果一致
+                elif test['name'] == '并行内容搜索':
+                    expected = result['sequential']['results']
+                    for mode in ('thread', 'process'):
+                        if result[mode]['results'] != expected:
+                            raise ValueError(f'{mode} 模式结果与顺序扫描不一致')
+                    log(test['name'], 'PASS', f'{len(expected)} 个结果顺序一致')
+
+                # 验证索引建立
+                elif test['name'] == '建立内容索引':
+                    if result.get('files', 0) < 2:
+                        raise ValueError(f'索引文件数不正确: {result.get("files")}')
+                    log(test['name'], 'PASS', f'索引 {result.get("files")} 个文件')
+
+                # 验证索引搜索
+                elif test['name'] == '索引内容搜索':
+                    if not result.get('indexed'):
+                        raise ValueError('未使用索引')
+                    paths = [r['path'] for r in result.get('results', [])]
+                    if paths != [str(Path('subdir') / 'nested.txt')]:
+                        raise ValueError(f'结果不正确: {paths}')
+                    log(test['name'], 'PASS', '索引命中正确文件')
+
+                # 验证索引在文件变化后仍然正确
+                elif test['name'] == '索引感知文件变化':
+                    if result.get('count', 0) != 0:
+                        raise ValueError('返回了已过期的匹配')
+                    log(test['name'], 'PASS', '文件变化后结果正确')
+
                 passed += 1
 
             except Exception as e:
                 log(test['name'], 'FAIL', str(e))
                 failed += 1
 
+        # 监视器把文件变化推送到内容索引，搜索直接从索引列出文件
+        watch_dir = Path(tmpdir) / 'watched'
+        try:
+            (watch_dir / 'sub').mkdir(parents=True)
+            (watch_dir / 'a.txt').write_text('alpha needle\n')
+            (watch_dir / 'sub' / 'b.txt').write_text('beta\n')
+            server._watcher = TreeWatcher(server.on_change, poll_interval=0.1)
+            server._watcher.watch(str(watch_dir.resolve()))
+            manage_index(str(watch_dir), 'build')
+            before = [r['path'] for r in search_files(str(watch_dir), '*', 'needle')['results']]
+            (watch_dir / 'a.txt').unlink()
+            (watch_dir / 'sub' / 'c.txt').write_text('gamma needle\n')
+            (watch_dir / 'new').mkdir()
+            (watch_dir / 'new' / 'd.txt').write_text('delta needle\n')
+            expected = [str(Path('new') / 'd.txt'), str(Path('sub') / 'c.txt')]
+            deadline = time.monotonic() + 5
+            while True:
+                after = [r['path'] for r in search_files(str(watch_dir), '*', 'needle')['results']]
+                # 搜索会应用已收到的变化，迟到的事件在下一轮搜索中应用
+                status = manage_index(str(watch_dir), 'status')
+                if (after == expected and status['pending_changes'] == 0) or time.monotonic() > deadline:
+                    break
+                time.sleep(0.1)
+            if before != ['a.txt'] or after != expected:
+                raise ValueError(f'结果不正确: {before} -> {after}')
+            if status['files'] != 3 or status['pending_changes'] != 0:
+                raise ValueError(f'索引状态不正确: {status}')
+            log('监视器更新索引', 'PASS', f'{server._watcher.backend} 后端，索引 {status["files"]} 个文件')
+            passed += 1
+        except Exception as e:
+            log('监视器更新索引', 'FAIL', str(e))
+            failed += 1
+        finally:
+            if server._watcher is not None:
+                server._watcher.stop()
+                server._watcher = None
+            manage_index(str(watch_dir), 'drop')
+
+        # 搜索拿到索引后索引被 drop 关闭：退回普通扫描，而不是抛出 sqlite3.ProgrammingError
+        dropped_dir = Path(tmpdir) / 'dropped'
+        try:
+            dropped_dir.mkdir()
+            (dropped_dir / 'a.txt').write_text('needle\n')
+            (dropped_dir / 'b.txt').write_text('other\n')
+            manage_index(str(dropped_dir), 'build')
+            server._indexes[dropped_dir.resolve()].close()
+            result = search_files(str(dropped_dir), '*', 'needle')
+            if 'error' in result or result['indexed'] or [r['path'] for r in result['results']] != ['a.txt']:
+                raise ValueError(f'结果不正确: {result}')
+            log('并发删除索引', 'PASS', '索引关闭后改为普通扫描')
+            passed += 1
+        except Exception as e:
+            log('并发删除索引', 'FAIL', str(e))
+            failed += 1
+        finally:
+            manage_index(str(dropped_dir), 'drop')
+
+        # 列式编码：搜索结果的字段名只出现一次，解码后与原始结果一致
+        try:
+            encoded_dir = Path(tmpdir) / 'encoded'
+            encoded_dir.mkdir()
+            for i in range(3):
+                (encoded_dir / f'{i}.txt').write_text(f'line\nneedle {i}\n')
+            result = search_files(str(encoded_dir), '*.txt', 'needle', use_index=False)
+            columnar = json.loads(encode_result(result, 'columnar'))
+            if columnar['results']['columns'][0] != 'path' or len(columnar['results']['rows']) != 3 \
+                    or from_columnar(columnar) != result:
+                raise ValueError(f'列式编码不正确: {columnar["results"]}')
+            pretty, compact = encode_result(result), encode_result(result, 'compact')
+            if json.loads(compact) != result or len(compact) >= len(pretty):
+                raise ValueError('紧凑编码不正确')
+            log('输出编码', 'PASS', f'{result["count"]} 个结果，pretty {len(pretty)} / columnar {len(encode_result(result, "columnar"))} 字节')
+            passed += 1
+        except Exception as e:
+            log('输出编码', 'FAIL', str(e))
+            failed += 1
+
+        # 进度与部分结果：逐个报告扫描进度和新找到的结果，超出时间预算时返回部分结果
+        try:
+            updates, partials = [], []
+
+            def with_progress():
+                progress = Progress(send=lambda *args: updates.append(args), stream=partials.extend, interval=0)
+                use_progress(progress)
+                result = search_files(str(encoded_dir), '*.txt', 'needle', use_index=False, time_budget=60)
+                progress.flush()
+                return result
+
+            result = contextvars.copy_context().run(with_progress)
+            if result['truncated_by_deadline'] or sorted(partials, key=lambda r: r['path']) != result['results']:
+                raise ValueError(f'部分结果不正确: {partials}')
+            if not updates or '找到' not in updates[-1][2]:
+                raise ValueError(f'进度通知不正确: {updates}')
+            expired = search_files(str(encoded_dir), '*.txt', 'needle', use_index=False, time_budget=1e-9)
+            if not expired['truncated_by_deadline'] or expired['count'] != 0:
+                raise ValueError(f'时间预算未生效: {expired}')
+            log('进度与时间预算', 'PASS', f'{len(updates)} 次进度通知，流式返回 {len(partials)} 个结果')
+            passed += 1
+        except Exception as e:
+            log('进度与时间预算', 'FAIL', str(e))
+            failed += 1
+
+        # 工具在线程池中执行：慢调用不阻塞其他调用，客户端取消后协作式中止并释放并发名额
+        try:
+            started = threading.Event()
+            stopped = threading.Event()
+
+            def slow():
+                started.set()
+                try:
+                    while True:
+                        check_cancelled()
+                        time.sleep(0.01)
+                except ToolCancelled:
+                    stopped.set()
+                    raise
+
+            async def scenario():
+                tool_executor = ToolExecutor({'slow': 1}, max_workers=2)
+                task = asyncio.create_task(tool_executor.run('slow', slow))
+                while not started.is_set():
+                    await asyncio.sleep(0.01)
+                concurrent = await tool_executor.run('fast', lambda: 42)
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                released = await asyncio.wait_for(tool_executor.run('slow', lambda: 'next'), 2)
+                tool_executor.shutdown()
+                inline = await server.call_tool('read_file', {'path': str(test_file)})
+                pooled = await server.call_tool('search_files', {'directory': tmpdir, 'pattern': '*.txt'})
+                return concurrent, released, json.loads(inline[0].text), json.loads(pooled[0].text)
+
+            concurrent, released, inline, pooled = asyncio.run(scenario())
+            if concurrent != 42 or released != 'next' or not stopped.wait(1):
+                raise ValueError(f'取消未生效: {concurrent}, {released}, {stopped.is_set()}')
+            if 'content' not in inline or pooled['count'] < 1:
+                raise ValueError(f'call_tool 结果不正确: {inline}, {pooled}')
+            log('线程池执行与取消', 'PASS', '慢调用被取消后释放并发名额')
+            passed += 1
+        except Exception as e:
+            log('线程池执行与取消', 'FAIL', str(e))
+            failed += 1
+
         # 测试错误处理
         error_tests = [
             {
@@ -135,7 +464,7 @@ def run_tests():
         for test in error_tests:
             try:
                 result = test['fn']()
-                has_error = 'error' in result or result is False
+                has_error = result is False or (isinstance(result, dict) and 'error' in result)
 
                 if test['should_error']:
                     if not has_error:
@@ -164,5 +493,54 @@ def run_tests():
     sys.exit(0 if failed == 0 else 1)
 
 
+def run_benchmarks():
+    """对比逐行匹配与 mmap 正则匹配在大文件上的耗时（python test.py --bench）"""
+    print('\n=== 内容匹配基准测试 ===\n')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        big_file = Path(tmpdir) / 'big.log'
+        line = 'INFO 2024-01-01 12:00:00 request handled in 12ms path=/api/v1/items\n'
+        with open(big_file, 'w') as f:
+            for _ in range(20):
+                f.write(line * 50000)
+            f.write('ERROR needle found here\n')
+        size_mb = big_file.stat().st_size / 1024 / 1024
+
+        cases = [
+            ('逐行匹配（原实现）', lambda: match_content(big_file, 'needle')),
+            ('mmap 字面量', lambda: ContentMatcher('needle').match(big_file)),
+            ('mmap 区分大小写', lambda: ContentMatcher('needle', case_sensitive=True).match(big_file)),
+            ('mmap 正则', lambda: ContentMatcher(r'ERROR \w+', regex=True).match(big_file)),
+        ]
+        for name, fn in cases:
+            start = time.perf_counter()
+            matches = fn()
+            elapsed = time.perf_counter() - start
+            print(f'  {name}: {elapsed * 1000:8.1f} ms  ({size_mb:.0f} MB, 第 {matches[0]["line"]} 行)')
+
+    print('\n=== 输出编码基准测试 ===\n')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for i in range(50):
+            package = Path(tmpdir) / f'package_{i}'
+            package.mkdir()
+            for j in range(100):
+                (package / f'module_{j}.py').write_text('def handler(request):\n    return request\n')
+        result = search_files(tmpdir, '*.py', 'handler', max_results=5000, use_index=False)
+        baseline = None
+        for output_format in OUTPUT_FORMATS:
+            start = time.perf_counter()
+            for _ in range(5):
+                text = encode_result(result, output_format)
+            elapsed = (time.perf_counter() - start) / 5
+            size = len(text.encode('utf-8'))
+            baseline = baseline or size
+            print(f'  {output_format:>8}: {size / 1024:8.0f} KiB ({size / baseline:4.0%})  {elapsed * 1000:6.1f} ms'
+                  f'  ({result["count"]} 个结果)')
+
+
 if __name__ == '__main__':
-    run_tests()
+    if '--bench' in sys.argv:
+        run_benchmarks()
+    else:
+        run_tests()
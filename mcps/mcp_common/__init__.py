@@ -0,0 +1,6 @@
+"""
+MCP 服务器共享模块
+
+供 mcps/ 下各 Python MCP 服务器复用的文件系统工具。
+服务器通过将 mcps/ 目录加入 sys.path 导入本包。
+"""
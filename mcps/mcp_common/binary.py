@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+二进制文件识别
+
+在解码文件内容之前快速判断是否应当跳过：
+- 扩展名黑名单（图片、压缩包、编译产物、压缩后的前端资源等），无需任何 I/O
+- 可选的文件大小上限，使用遍历时已缓存的 stat 结果
+- 首个数据块中包含 NUL 字节的文件视为二进制文件
+"""
+
+import os
+from typing import Optional
+
+# 嗅探时读取的字节数
+SNIFF_SIZE = 8192
+
+# 跳过原因
+SKIP_EXTENSION = 'extension'
+SKIP_SIZE = 'size'
+SKIP_BINARY = 'binary'
+
+# 扩展名黑名单
+BINARY_EXTENSIONS = frozenset({
+    # 图片和媒体
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.icns', '.webp', '.tif', '.tiff', '.psd',
+    '.mp3', '.mp4', '.m4a', '.wav', '.flac', '.ogg', '.avi', '.mov', '.mkv', '.webm',
+    # 字体
+    '.ttf', '.otf', '.woff', '.woff2', '.eot',
+    # 压缩包和安装包
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar', '.tar', '.jar', '.war',
+    '.whl', '.egg', '.deb', '.rpm', '.dmg', '.iso', '.apk',
+    # 编译产物和库
+    '.so', '.dylib', '.dll', '.exe', '.o', '.a', '.lib', '.obj', '.class', '.pyc', '.pyo',
+    '.wasm', '.rlib', '.pdb', '.bin', '.dat',
+    # 文档和数据库
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.sqlite', '.db',
+})
+
+# 压缩后的前端资源：单行巨大，解码和匹配都没有意义
+MINIFIED_SUFFIXES = ('.min.js', '.min.css', '.js.map', '.css.map')
+
+
+def skip_by_name(name: str) -> Optional[str]:
+    """根据文件名判断是否跳过，返回跳过原因或 None"""
+    lower = name.lower()
+    if os.path.splitext(lower)[1] in BINARY_EXTENSIONS or lower.endswith(MINIFIED_SUFFIXES):
+        return SKIP_EXTENSION
+    return None
+
+
+def skip_by_stat(
+    name: str,
+    size: int,
+    max_size: Optional[int] = None,
+    check_name: bool = True
+) -> Optional[str]:
+    """
+    根据文件名和大小判断是否跳过（不读取文件内容）
+
+    Args:
+        name: 文件名
+        size: 文件大小
+        max_size: 文件大小上限，None 表示不限制
+        check_name: 是否检查扩展名黑名单
+
+    Returns:
+        跳过原因，不跳过时为 None
+    """
+    reason = skip_by_name(name) if check_name else None
+    if reason is None and max_size is not None and size > max_size:
+        reason = SKIP_SIZE
+    return reason
+
+
+def looks_binary(head: bytes) -> bool:
+    """判断文件开头的数据块是否为二进制内容"""
+    return b'\x00' in head[:SNIFF_SIZE]
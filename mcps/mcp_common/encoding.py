@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+工具结果编码
+
+各服务器的 call_tool 通过 encode_result 序列化结果，支持三种输出格式：
+- pretty：缩进 2 格的 JSON（默认，与原有输出一致）
+- compact：去掉缩进和分隔符后空格的 JSON
+- columnar：在 compact 的基础上，把元素全部为对象的列表（搜索结果、目录条目等）编码为
+  {"columns": [字段名], "rows": [[字段值]]}，字段名只出现一次；缺失的字段以 null 表示
+
+默认格式可通过环境变量 MCP_OUTPUT_FORMAT 配置，单次调用可用 output_format 参数覆盖。
+"""
+
+import json
+import os
+from typing import Any, Optional
+
+OUTPUT_FORMATS = ('pretty', 'compact', 'columnar')
+
+DEFAULT_OUTPUT_FORMAT = os.environ.get('MCP_OUTPUT_FORMAT', 'pretty')
+
+# 各工具 inputSchema 中的 output_format 参数
+OUTPUT_FORMAT_PROPERTY = {
+    "type": "string",
+    "description": "结果编码：pretty 为缩进的 JSON，compact 为紧凑 JSON，columnar 把对象列表编码为 columns/rows 表格（默认 pretty）",
+    "enum": list(OUTPUT_FORMATS),
+}
+
+COMPACT_SEPARATORS = (',', ':')
+
+
+def to_columnar(value: Any) -> Any:
+    """递归地把元素全部为对象的列表（至少 2 个元素）转换为 {'columns': [...], 'rows': [...]}"""
+    if isinstance(value, dict):
+        return {key: to_columnar(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if len(value) >= 2 and all(isinstance(item, dict) for item in value):
+            columns = list(dict.fromkeys(key for item in value for key in item))
+            return {
+                'columns': columns,
+                'rows': [[to_columnar(item.get(column)) for column in columns] for item in value],
+            }
+        return [to_columnar(item) for item in value]
+    return value
+
+
+def from_columnar(value: Any) -> Any:
+    """to_columnar 的逆变换（缺失的字段还原为 None）"""
+    if isinstance(value, dict):
+        if value.keys() == {'columns', 'rows'} and isinstance(value['rows'], list):
+            return [
+                {column: from_columnar(item) for column, item in zip(value['columns'], row)}
+                for row in value['rows']
+            ]
+        return {key: from_columnar(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [from_columnar(item) for item in value]
+    return value
+
+
+def encode_result(result: Any, output_format: Optional[str] = None) -> str:
+    """
+    序列化工具结果
+
+    Args:
+        result: 工具结果
+        output_format: pretty、compact 或 columnar，None 使用默认格式
+
+    Raises:
+        ValueError: 未知的输出格式
+    """
+    output_format = output_format or DEFAULT_OUTPUT_FORMAT
+    if output_format == 'pretty':
+        return json.dumps(result, indent=2, ensure_ascii=False)
+    if output_format == 'compact':
+        return json.dumps(result, separators=COMPACT_SEPARATORS, ensure_ascii=False)
+    if output_format == 'columnar':
+        return json.dumps(to_columnar(result), separators=COMPACT_SEPARATORS, ensure_ascii=False)
+    raise ValueError(f'未知的输出格式: {output_format}')
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+工具执行
+
+把同步的工具函数从 asyncio 事件循环移到有界线程池中执行，慢调用不再阻塞 stdio 服务器：
+- 线程池大小有上限（环境变量 MCP_TOOL_WORKERS，默认 8），每个工具另有并发上限，
+  超出上限的调用在事件循环中排队等待，不占用线程
+- 客户端取消请求时，尚未开始的调用直接放弃；已在执行的调用通过取消标志协作式中止：
+  长时间的遍历和扫描在循环中调用 check_cancelled()，检测到取消后抛出 ToolCancelled
+- 被取消的调用在真正结束前仍计入该工具的并发上限
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+TOOL_WORKERS = int(os.environ.get('MCP_TOOL_WORKERS', 8))
+
+# 当前调用的取消标志（在工作线程的上下文中设置，事件循环中直接执行的调用没有取消标志）
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    'mcp_tool_cancel', default=None
+)
+
+
+class ToolCancelled(Exception):
+    """工具调用已被客户端取消"""
+
+
+def check_cancelled():
+    """当前调用已被取消时抛出 ToolCancelled（不在工具调用中时不做任何事）"""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise ToolCancelled()
+
+
+class ToolExecutor:
+    """有界线程池 + 按工具的并发上限"""
+
+    def __init__(self, limits: dict[str, int], max_workers: int = TOOL_WORKERS):
+        """
+        Args:
+            limits: {工具名: 最大并发数}，未列出的工具以线程池大小为上限
+            max_workers: 线程池大小
+        """
+        self.limits = limits
+        self.max_workers = max_workers
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='mcp-tool')
+        self.semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, tool: str) -> asyncio.Semaphore:
+        semaphore = self.semaphores.get(tool)
+        if semaphore is None:
+            semaphore = self.semaphores[tool] = asyncio.Semaphore(self.limits.get(tool, self.max_workers))
+        return semaphore
+
+    async def run(self, tool: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在线程池中执行 fn(*args, **kwargs)
+
+        等待期间所在的任务被取消时设置取消标志并重新抛出 CancelledError。
+
+        Args:
+            tool: 工具名（决定并发上限）
+            fn: 同步函数
+        """
+        semaphore = self._semaphore(tool)
+        await semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        cancel = threading.Event()
+        context = contextvars.copy_context()
+        context.run(_cancel_event.set, cancel)
+        try:
+            future = self.pool.submit(context.run, fn, *args, **kwargs)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        def release(_):
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        future.add_done_callback(release)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+.gitignore 匹配
+
+将 .gitignore 规则预编译为正则表达式，供目录遍历器剪枝使用：
+- 支持嵌套 .gitignore、取反（!）、锚定模式（含 /）、仅目录模式（结尾 /）和 **
+- 同一文件中相邻且类型相同的规则合并为一个正则，按"最后匹配者生效"的顺序求值
+- 每个 .gitignore 按 (路径, mtime_ns, size) 缓存编译结果，文件修改后自动重新编译
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+GITIGNORE = '.gitignore'
+
+
+def translate(pattern: str) -> str:
+    """
+    将单条 gitignore 模式（已去除 ! 前缀和结尾 /）翻译为正则表达式
+
+    Args:
+        pattern: gitignore 模式
+
+    Returns:
+        匹配相对路径的正则表达式片段
+    """
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern[i:i + 2] == '**' and (i == 0 or pattern[i - 1] == '/'):
+                after = pattern[i + 2:i + 3]
+                if after == '/':
+                    out.append('(?:.*/)?')
+                    i += 3
+                    continue
+                if after == '':
+                    out.append('.*')
+                    i += 2
+                    continue
+            out.append('[^/]*')
+            while i < n and pattern[i] == '*':
+                i += 1
+            continue
+        if c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = pattern.find(']', i + 2 if pattern[i + 1:i + 2] in ('!', '^') else i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ('' if anchored else '(?:.*/)?') + ''.join(out)
+
+
+class IgnoreRules:
+    """单个 .gitignore 文件编译后的规则"""
+
+    def __init__(self, lines: list[str]):
+        # 每组: (negate, dir_only, compiled regex)，相邻且类型相同的规则合并为一组
+        groups: list[tuple[bool, bool, list[str]]] = []
+        for raw in lines:
+            line = raw.rstrip('\n').rstrip('\r')
+            if not line or line.startswith('#'):
+                continue
+            # 去除未转义的结尾空格
+            while line.endswith(' ') and not line.endswith('\\ '):
+                line = line[:-1]
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            elif line.startswith('\\!') or line.startswith('\\#'):
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            regex = translate(line)
+            if groups and groups[-1][0] == negate and groups[-1][1] == dir_only:
+                groups[-1][2].append(regex)
+            else:
+                groups.append((negate, dir_only, [regex]))
+        self.groups = [
+            (negate, dir_only, re.compile('^(?:' + '|'.join(regexes) + ')$', re.DOTALL))
+            for negate, dir_only, regexes in reversed(groups)
+        ]
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """
+        判断相对路径是否被忽略
+
+        Returns:
+            True 表示忽略，False 表示被取反规则重新包含，None 表示没有规则匹配
+        """
+        for negate, dir_only, regex in self.groups:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path):
+                return not negate
+        return None
+
+
+@lru_cache(maxsize=4096)
+def load_rules(path: str, mtime_ns: int, size: int) -> IgnoreRules:
+    """读取并编译 .gitignore（按文件指纹缓存）"""
+    try:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return IgnoreRules(f.readlines())
+    except OSError:
+        return IgnoreRules([])
+
+
+def rules_for(path: str) -> Optional[IgnoreRules]:
+    """返回指定 ignore 文件的编译规则，文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return load_rules(path, st.st_mtime_ns, st.st_size)
+
+
+class IgnoreChain:
+    """从仓库根目录到当前目录的 .gitignore 规则链（不可变）"""
+
+    def __init__(self, chain: tuple = ()):
+        self.chain = chain
+
+    def child(self, dir_path: str, gitignore: Optional[os.DirEntry] = None) -> 'IgnoreChain':
+        """
+        返回进入 dir_path 后的规则链
+
+        Args:
+            dir_path: 目录路径
+            gitignore: 该目录下 .gitignore 的 DirEntry（扫描目录时顺带获得，避免额外查找）
+        """
+        if gitignore is None:
+            return self
+        try:
+            st = gitignore.stat()
+        except OSError:
+            return self
+        rules = load_rules(gitignore.path, st.st_mtime_ns, st.st_size)
+        if not rules.groups:
+            return self
+        return IgnoreChain(self.chain + ((dir_path.rstrip(os.sep), rules),))
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        """判断路径是否被忽略，更深层目录中的规则优先"""
+        for base, rules in reversed(self.chain):
+            result = rules.match(path[len(base) + 1:], is_dir)
+            if result is not None:
+                return result
+        return False
+
+    @classmethod
+    def for_root(cls, root: str) -> 'IgnoreChain':
+        """
+        构造 root 的祖先目录中生效的规则链
+
+        从 root 向上查找包含 .git 的仓库根目录，收集途中（不含 root 本身）的 .gitignore
+        以及 .git/info/exclude。root 不在 git 仓库中时返回空规则链。
+        """
+        root = os.path.abspath(root)
+        ancestors = []
+        current = os.path.dirname(root)
+        top = root if os.path.exists(os.path.join(root, '.git')) else None
+        while top is None:
+            ancestors.append(current)
+            if os.path.exists(os.path.join(current, '.git')):
+                top = current
+                break
+            parent = os.path.dirname(current)
+            if parent == current:
+                return cls()
+            current = parent
+
+        chain = []
+        exclude = rules_for(os.path.join(top, '.git', 'info', 'exclude'))
+        if exclude is not None and exclude.groups:
+            chain.append((top.rstrip(os.sep), exclude))
+        for ancestor in reversed(ancestors):
+            rules = rules_for(os.path.join(ancestor, GITIGNORE))
+            if rules is not None and rules.groups:
+                chain.append((ancestor.rstrip(os.sep), rules))
+        return cls(tuple(chain))
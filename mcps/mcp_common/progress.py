@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+进度通知与部分结果
+
+长时间的遍历和扫描通过当前调用的 Progress 报告进度：
+- 客户端在请求的 _meta 中提供 progressToken 时，进度以 notifications/progress 发送
+  （已处理数、总数和说明，总数已知时说明中附带预计剩余时间），发送间隔不小于 PROGRESS_INTERVAL
+- 同时请求了 stream 时，新产生的结果以 notifications/message 增量发送
+  （logger 为工具名，data 为 {'partial': [结果]}），最终结果仍完整返回
+- 不在工具调用中或客户端没有请求进度时，current_progress() 返回不发送任何通知的 Progress
+
+工具函数在线程池中执行，通知通过 run_coroutine_threadsafe 交给事件循环发送。
+"""
+
+import asyncio
+import contextvars
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+# 两次进度通知之间的最小间隔（秒）
+PROGRESS_INTERVAL = 0.25
+
+
+class Progress:
+    """单次工具调用的进度报告"""
+
+    def __init__(
+        self,
+        send: Optional[Callable[[float, Optional[float], str], None]] = None,
+        stream: Optional[Callable[[list], None]] = None,
+        interval: float = PROGRESS_INTERVAL
+    ):
+        """
+        Args:
+            send: 发送进度通知 (已处理数, 总数, 说明)，None 表示不发送
+            stream: 发送一批部分结果，None 表示不流式返回
+            interval: 两次通知之间的最小间隔（秒）
+        """
+        self.send = send
+        self.stream = stream
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last = 0.0
+        # 已报告的部分结果数和尚未发送的部分结果
+        self.items = 0
+        self.pending: list = []
+
+    def update(self, done: int, total: Optional[int] = None, message: str = '', force: bool = False):
+        """
+        报告进度（距上次通知不足 interval 时忽略，force 时总是发送）
+
+        Args:
+            done: 已处理数
+            total: 总数，未知时为 None
+            message: 说明
+        """
+        if self.send is None and self.stream is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        if self.send is not None:
+            if total and done:
+                eta = (now - self.started) * (total - done) / done
+                message = f'{message}，预计剩余 {eta:.1f} 秒' if message else f'预计剩余 {eta:.1f} 秒'
+            self.send(done, total, message)
+        self.flush()
+
+    def partial(self, items: list):
+        """记录新产生的结果，流式返回时随下一次进度通知发送"""
+        self.items += len(items)
+        if self.stream is not None:
+            self.pending.extend(items)
+
+    def flush(self):
+        """立即发送尚未发送的部分结果"""
+        if self.stream is not None and self.pending:
+            items, self.pending = self.pending, []
+            self.stream(items)
+
+
+_progress: contextvars.ContextVar[Optional[Progress]] = contextvars.ContextVar('mcp_tool_progress', default=None)
+
+
+def current_progress() -> Progress:
+    """当前工具调用的进度报告（不在工具调用中时返回不发送通知的 Progress）"""
+    return _progress.get() or Progress()
+
+
+class RequestProgress(Progress):
+    """把进度和部分结果作为当前 MCP 请求的通知发送"""
+
+    def __init__(self, request_context: Any, tool: str, stream: bool):
+        self.loop = asyncio.get_running_loop()
+        self.session = request_context.session
+        self.request_id = request_context.request_id
+        self.token = request_context.meta.progressToken
+        self.tool = tool
+        self.sent: list[Future] = []
+        super().__init__(self._send, self._stream if stream else None)
+
+    def _submit(self, coro):
+        self.sent.append(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def _send(self, done: float, total: Optional[float], message: str):
+        self._submit(self.session.send_progress_notification(
+            self.token, done, total, message or None, related_request_id=self.request_id,
+        ))
+
+    def _stream(self, items: list):
+        self._submit(self.session.send_log_message(
+            'info', {'partial': items}, logger=self.tool, related_request_id=self.request_id,
+        ))
+
+    async def drain(self):
+        """发送剩余的部分结果，并等待已提交的通知发送完毕（在最终结果之前）"""
+        self.flush()
+        for future in self.sent:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                # 通知发送失败不影响工具结果
+                pass
+
+
+def start_progress(request_context: Any, tool: str, stream: bool = False) -> Optional[RequestProgress]:
+    """
+    为当前请求创建进度报告并设为当前调用的 Progress（在 call_tool 中、进入线程池之前调用）
+
+    Args:
+        request_context: server.request_context
+        tool: 工具名
+        stream: 是否流式发送部分结果
+
+    Returns:
+        请求没有 progressToken 时为 None
+    """
+    meta = getattr(request_context, 'meta', None)
+    if meta is None or getattr(meta, 'progressToken', None) is None:
+        return None
+    progress = RequestProgress(request_context, tool, stream)
+    _progress.set(progress)
+    return progress
+
+
+def use_progress(progress: Optional[Progress]):
+    """把 progress 设为当前上下文中的 Progress（用于测试或自定义的通知方式）"""
+    return _progress.set(progress)
+
+
+def deadline_after(time_budget: Optional[float]) -> Optional[float]:
+    """时间预算（秒）对应的截止时间（time.monotonic），None 表示不限制"""
+    return time.monotonic() + time_budget if time_budget is not None else None
+
+
+def expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+文件系统监视
+
+在后台线程中监视目录树的变化，并把变化的路径推送给回调，供服务器主动失效缓存：
+- Linux 上通过 ctypes 调用 inotify，每个目录一个监视描述符
+- inotify 不可用时退化为轮询：定期遍历目录树，比较目录和文件的 (mtime_ns, size)
+- 与 walker 使用相同的剪枝规则（跳过隐藏目录和 node_modules、.git 等忽略目录）
+- 监视描述符（轮询时为记录的条目数）有上限，超出上限的根目录不再视为被完整监视
+- 事件队列溢出等无法确定变化范围的情况以 None 通知回调，调用方应丢弃全部缓存
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+from typing import Callable, Optional
+
+from .walker import IGNORED_DIRS
+
+# inotify 事件掩码（<sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+    | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+)
+
+# struct inotify_event 的定长部分: wd, mask, cookie, len
+EVENT_HEADER = struct.Struct('iIII')
+
+# 默认的监视上限：inotify 的目录数 / 轮询时记录的条目数
+MAX_WATCHES = 4096
+MAX_POLL_ENTRIES = 50000
+
+# 轮询间隔（秒）
+POLL_INTERVAL = 2.0
+
+# 后台线程检查停止标志的间隔（秒）
+STOP_CHECK_INTERVAL = 0.5
+
+
+def watched_dirs(root: str):
+    """按 walker 的剪枝规则产出 root 下需要监视的目录（含 root 本身）"""
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        yield path
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    name = entry.name
+                    if name.startswith('.') or name in IGNORED_DIRS:
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def under(path: str, root: str) -> bool:
+    """path 是否为 root 或其后代"""
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class Inotify:
+    """inotify 系统调用的 ctypes 封装"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 失败')
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch 失败: {path}')
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """读取当前可用的事件: [(wd, mask, name)]"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class TreeWatcher:
+    """
+    监视若干目录树，把变化的路径推送给回调
+
+    回调在后台线程中调用，参数为发生变化的文件或目录路径；
+    无法确定变化范围（事件溢出、超出监视上限）时参数为 None。
+    """
+
+    def __init__(
+        self,
+        on_change: Callable[[Optional[str]], None],
+        backend: str = 'auto',
+        max_watches: Optional[int] = None,
+        poll_interval: float = POLL_INTERVAL
+    ):
+        """
+        Args:
+            on_change: 变化回调
+            backend: auto（优先 inotify）、inotify 或 poll
+            max_watches: 监视上限（inotify 为目录数，轮询为条目数），None 使用默认值
+            poll_interval: 轮询间隔（秒）
+        """
+        self.on_change = on_change
+        self.inotify = None
+        if backend in ('auto', 'inotify'):
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError):
+                if backend == 'inotify':
+                    raise
+        self.backend = 'inotify' if self.inotify else 'poll'
+        if max_watches is None:
+            max_watches = MAX_WATCHES if self.inotify else MAX_POLL_ENTRIES
+        self.max_watches = max_watches
+        self.poll_interval = poll_interval
+        # {根目录: 是否被完整监视}
+        self.roots: dict[str, bool] = {}
+        # inotify: {wd: 目录路径} 和 {目录路径: wd}
+        self.paths: dict[int, str] = {}
+        self.wds: dict[str, int] = {}
+        # 轮询: {根目录: {路径: (mtime_ns, size)}}
+        self.states: dict[str, dict[str, tuple[int, int]]] = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='tree-watcher', daemon=True)
+        self.thread.start()
+
+    def watch(self, root: str) -> bool:
+        """
+        开始监视目录树（已监视时直接返回）
+
+        Returns:
+            root 是否被完整监视
+        """
+        with self.lock:
+            if root not in self.roots:
+                if self.inotify:
+                    self.roots[root] = all(self._add_dir(path) for path in watched_dirs(root))
+                else:
+                    state = self._poll_state(root)
+                    self.roots[root] = state is not None
+                    self.states[root] = state or {}
+            return self.roots[root]
+
+    def unwatch(self, root: str):
+        """停止监视目录树（仍被其他根目录覆盖的目录保持监视）"""
+        with self.lock:
+            self.roots.pop(root, None)
+            self.states.pop(root, None)
+            if self.inotify:
+                self._remove_tree(root, keep_covered=True)
+
+    def covers(self, path: str) -> bool:
+        """path 是否位于某个被完整监视的目录树中"""
+        with self.lock:
+            return any(complete and under(path, root) for root, complete in self.roots.items())
+
+    def stop(self):
+        """停止后台线程并释放监视描述符"""
+        self.stopped.set()
+        self.thread.join()
+        if self.inotify:
+            self.inotify.close()
+
+    def _add_dir(self, path: str) -> bool:
+        """为目录添加监视，返回是否成功（超出上限或描述符耗尽时为 False）"""
+        if path in self.wds:
+            return True
+        if len(self.wds) >= self.max_watches:
+            return False
+        try:
+            wd = self.inotify.add_watch(path)
+        except OSError:
+            # ENOSPC（超出系统上限）时整棵树不再可信；目录已被删除等情况可以忽略
+            return not os.path.isdir(path)
+        self.wds[path] = wd
+        self.paths[wd] = path
+        return True
+
+    def _remove_tree(self, root: str, keep_covered: bool = False):
+        """移除目录树中的监视（keep_covered 时保留仍被其他根目录覆盖的目录）"""
+        for path in [p for p in self.wds if under(p, root)]:
+            if keep_covered and any(under(path, other) for other in self.roots):
+                continue
+            wd = self.wds.pop(path)
+            self.paths.pop(wd, None)
+            self.inotify.rm_watch(wd)
+
+    def _mark_incomplete(self, path: str):
+        for root in self.roots:
+            if under(path, root):
+                self.roots[root] = False
+
+    def _run(self):
+        if self.inotify:
+            self._run_inotify()
+        else:
+            self._run_polling()
+
+    def _run_inotify(self):
+        while not self.stopped.is_set():
+            ready, _, _ = select.select([self.inotify.fd], [], [], STOP_CHECK_INTERVAL)
+            if not ready:
+                continue
+            changed = []
+            with self.lock:
+                for wd, mask, name in self.inotify.read_events():
+                    if mask & IN_Q_OVERFLOW:
+                        changed.append(None)
+                        continue
+                    directory = self.paths.get(wd)
+                    if directory is None:
+                        continue
+                    if mask & IN_IGNORED:
+                        # 目录被删除或监视被移除
+                        del self.paths[wd]
+                        if self.wds.get(directory) == wd:
+                            del self.wds[directory]
+                        continue
+                    path = os.path.join(directory, name) if name else directory
+                    changed.append(path)
+                    if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                        # 移出的目录树：旧路径上的监视不再有效，移入时按新路径重新添加
+                        self._remove_tree(path)
+                    if (mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO)
+                            and not name.startswith('.') and name not in IGNORED_DIRS):
+                        # 新目录（及移入的整棵子树）需要补充监视
+                        for child in watched_dirs(path):
+                            if not self._add_dir(child):
+                                self._mark_incomplete(child)
+                                changed.append(None)
+                                break
+                            if child != path:
+                                changed.append(child)
+            self._notify(changed)
+
+    def _poll_state(self, root: str) -> Optional[dict]:
+        """记录目录树中目录和文件的 (mtime_ns, size)，超出上限时返回 None"""
+        state = {}
+        for directory in watched_dirs(root):
+            try:
+                st = os.stat(directory)
+                state[directory] = (st.st_mtime_ns, st.st_size)
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.startswith('.') or entry.is_dir(follow_symlinks=False):
+                            continue
+                        st = entry.stat()
+                        state[entry.path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+            if len(state) > self.max_watches:
+                return None
+        return state
+
+    def _run_polling(self):
+        while not self.stopped.wait(self.poll_interval):
+            with self.lock:
+                roots = list(self.roots)
+            for root in roots:
+                state = self._poll_state(root)
+                changed = []
+                with self.lock:
+                    if root not in self.roots:
+                        continue
+                    previous = self.states.get(root, {})
+                    if state is None:
+                        if self.roots[root]:
+                            changed.append(None)
+                        self.roots[root] = False
+                        state = {}
+                    elif self.roots[root]:
+                        changed += [path for path, fp in state.items() if previous.get(path) != fp]
+                        changed += [path for path in previous if path not in state]
+                    else:
+                        # 之前超出上限，期间的变化范围未知
+                        changed.append(None)
+                        self.roots[root] = True
+                    self.states[root] = state
+                self._notify(changed)
+
+    def _notify(self, changed: list):
+        if None in changed:
+            changed = [None]
+        for path in dict.fromkeys(changed):
+            self.on_change(path)
+
+
+def watcher_from_env(variable: str, on_change: Callable[[Optional[str]], None]) -> Optional[TreeWatcher]:
+    """
+    按环境变量创建监视器
+
+    变量取值为 off（默认，不监视）、auto、inotify 或 poll；
+    {variable}_MAX 设置监视上限，{variable}_INTERVAL 设置轮询间隔（秒）。
+    """
+    backend = os.environ.get(variable, 'off').lower()
+    if backend in ('', '0', 'off', 'false', 'no'):
+        return None
+    max_watches = os.environ.get(f'{variable}_MAX')
+    return TreeWatcher(
+        on_change,
+        backend='auto' if backend in ('1', 'on', 'true', 'yes') else backend,
+        max_watches=int(max_watches) if max_watches else None,
+        poll_interval=float(os.environ.get(f'{variable}_INTERVAL', POLL_INTERVAL)),
+    )
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+代码行数缓存
+
+为 count_lines 提供按根目录持久化的逐文件统计缓存：
+- 缓存存放在 SQLite 文件中，按根目录路径哈希命名
+- 文件以 (size, mtime_ns, inode) 作为指纹，只有指纹变化的文件需要重新统计
+- 已删除的文件在下一次完整统计后从缓存中移除
+"""
+
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+# 缓存文件默认存放目录（可通过 PROJECT_ANALYZER_CACHE_DIR 配置）
+CACHE_DIR = Path(os.environ.get(
+    'PROJECT_ANALYZER_CACHE_DIR',
+    Path.home() / '.cache' / 'project-analyzer-mcp',
+))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    binary INTEGER NOT NULL,
+    lines INTEGER
+) WITHOUT ROWID;
+"""
+
+
+def cache_path_for(root: Path) -> Path:
+    """返回根目录对应的缓存文件路径"""
+    digest = hashlib.sha1(str(root).encode('utf-8')).hexdigest()[:16]
+    return CACHE_DIR / f'lines-{digest}.sqlite'
+
+
+def fingerprint(st: os.stat_result) -> tuple[int, int, int]:
+    """文件指纹 (size, mtime_ns, inode)"""
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class LineCountCache:
+    """单个根目录的逐文件行数缓存"""
+
+    def __init__(self, root: Path, db_path: Optional[Path] = None):
+        self.root = root
+        self.db_path = db_path or cache_path_for(root)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript(SCHEMA)
+        # {相对路径: ((size, mtime_ns, inode), binary, lines)}
+        self.entries = {
+            path: ((size, mtime_ns, inode), bool(binary), lines)
+            for path, size, mtime_ns, inode, binary, lines in self.conn.execute(
+                'SELECT path, size, mtime_ns, inode, binary, lines FROM files'
+            )
+        }
+        self.seen = set()
+        self.updates = []
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, rel_path: str, st: os.stat_result) -> Optional[tuple[bool, Optional[int]]]:
+        """
+        查询缓存
+
+        Returns:
+            (是否二进制, 行数)，未命中时为 None；二进制文件的行数可能为 None（未统计）
+        """
+        self.seen.add(rel_path)
+        cached = self.entries.get(rel_path)
+        if cached is None or cached[0] != fingerprint(st):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cached[1], cached[2]
+
+    def keep(self, rel_path: str):
+        """标记文件仍然存在（本次按 stat 跳过、未查询缓存的文件），保存时不删除其记录"""
+        self.seen.add(rel_path)
+
+    def put(self, rel_path: str, st: os.stat_result, binary: bool, lines: Optional[int]):
+        """记录文件的统计结果（在 save 时批量写入）"""
+        self.updates.append((rel_path, *fingerprint(st), binary, lines))
+
+    def save(self, prune: bool = True):
+        """
+        写入更新
+
+        Args:
+            prune: 是否删除本次未访问的文件（仅在完整遍历根目录后使用）
+        """
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, binary, lines) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            self.updates,
+        )
+        if prune:
+            stale = [(path,) for path in self.entries if path not in self.seen]
+            self.conn.executemany('DELETE FROM files WHERE path = ?', stale)
+        self.conn.commit()
+        self.conn.close()
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
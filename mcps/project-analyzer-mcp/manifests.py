@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+依赖清单解析
+
+为 list_dependencies 解析各包管理器的清单文件和锁文件，每个依赖解析为
+{'name': 名称, 'version': 版本约束或锁定版本, 'scope': 所属分组（可选）}：
+- 行格式的文件（requirements.txt、yarn.lock、pnpm-lock.yaml、go.mod、Gemfile 等）逐行流式解析，
+  不把整个文件读入内存
+- pom.xml 使用 iterparse 增量解析，处理完的元素立即释放
+- package-lock.json 使用标准库的 C 加速 JSON 解析（标准库没有增量 JSON 解析器）
+- 解析结果按文件指纹 (size, mtime_ns, inode) 缓存，未变化的锁文件不会被重复解析
+- 大型仓库中的大量清单文件可以在进程池中并行解析
+"""
+
+import json
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, Optional
+
+from mcp_common.executor import check_cancelled
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10
+    tomllib = None
+
+# 解析结果缓存的文件数上限
+MANIFEST_CACHE_SIZE = 1024
+
+# 并行解析时每批提交给进程池的文件数
+PARSE_BATCH_SIZE = 16
+
+# 锁文件（记录解析后的完整依赖树，而不是声明的直接依赖）
+LOCKFILES = frozenset({'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml'})
+
+# {文件路径: ((size, mtime_ns, inode), 依赖列表)}
+_parsed: OrderedDict[str, tuple[tuple[int, int, int], list[dict]]] = OrderedDict()
+_lock = threading.Lock()
+
+REQUIREMENT = re.compile(r'([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*(.*)')
+# 不带包名的直接引用：URL（含 git+https 等 VCS 地址）、本地路径或归档文件
+DIRECT_REFERENCE = re.compile(
+    r'^(?:[A-Za-z][A-Za-z0-9+.-]*://|\.{1,2}(?:[/\\]|$)|[/\\~]|[^\s;@]+\.(?:whl|zip|tar\.gz|tar\.bz2|tgz)\b)'
+)
+EDITABLE = re.compile(r'^(?:-e|--editable)(?:\s+|=)(.+)$')
+EGG_NAME = re.compile(r'[#&]egg=([A-Za-z0-9][A-Za-z0-9._-]*)')
+GRADLE_STRING = re.compile(
+    r'''^\s*(\w+)\s*\(?\s*(?:platform\s*\(\s*)?['"]([^'":\s]+):([^'":\s]+)(?::([^'"\s]+))?['"]'''
+)
+GRADLE_MAP = re.compile(
+    r'''^\s*(\w+)\s*\(?\s*group\s*[:=]\s*['"]([^'"]+)['"]\s*,\s*name\s*[:=]\s*['"]([^'"]+)['"]'''
+    r'''(?:\s*,\s*version\s*[:=]\s*['"]([^'"]+)['"])?'''
+)
+RUBY_DECLARATION = re.compile(r'''^\s*(gem|pod)\s*\(?\s*['"]([^'"]+)['"](.*)''')
+RUBY_STRING = re.compile(r'''['"]([^'"]*)['"]''')
+RUBY_GROUP = re.compile(r'^\s*(?:group|target|platforms?)\b\s*\(?\s*(.*?)\s*\)?\s*do\b')
+RUBY_BLOCK = re.compile(r'\bdo\b\s*(?:\|[^|]*\|)?\s*$')
+VERSION_CONSTRAINT = re.compile(r'^\s*(?:[~<>=!^]|\d)')
+TOML_HEADER = re.compile(r'^\[\s*([^\]]+?)\s*\]$')
+TOML_ENTRY = re.compile(r'''^([A-Za-z0-9_-]+|"[^"]+")\s*=\s*(.+)$''')
+TOML_VERSION = re.compile(r'''\bversion\s*=\s*["']([^"']+)["']''')
+
+
+def dependency(name: str, version: Optional[str] = None, scope: Optional[str] = None) -> dict:
+    entry = {'name': name, 'version': version or None}
+    if scope:
+        entry['scope'] = scope
+    return entry
+
+
+def json_object(data) -> dict:
+    """
+    检查 JSON 清单的顶层是对象
+
+    Raises:
+        ValueError: 顶层是数组、字符串等其他类型
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f'Expected a JSON object at the top level, got {type(data).__name__}')
+    return data
+
+
+def parse_requirements(path: str) -> list[dict]:
+    """
+    requirements.txt：跳过注释和 pip 选项（-r、-c 等），保留版本约束和直接 URL
+
+    不带包名的 URL、VCS 地址和本地路径（包括 -e 可编辑安装）从 #egg= 片段取包名，没有时跳过。
+    """
+    deps = []
+    pending = ''
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = pending + line.rstrip('\n')
+            if line.endswith('\\'):
+                pending = line[:-1]
+                continue
+            pending = ''
+            line = line.split(' #', 1)[0].strip()
+            editable = EDITABLE.match(line)
+            if editable:
+                line = editable.group(1).strip()
+            if not line or line.startswith(('#', '-')):
+                continue
+            if DIRECT_REFERENCE.match(line):
+                egg = EGG_NAME.search(line)
+                if egg:
+                    deps.append(dependency(egg.group(1), line.split('#', 1)[0]))
+                continue
+            match = REQUIREMENT.match(line)
+            if not match:
+                continue
+            spec = match.group(2).split(';', 1)[0].strip()
+            if spec.startswith('@'):
+                spec = spec[1:].strip()
+            deps.append(dependency(match.group(1), spec))
+    return deps
+
+
+def parse_package_json(path: str) -> list[dict]:
+    """package.json 的 dependencies、devDependencies、peerDependencies 和 optionalDependencies"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        data = json_object(json.load(f))
+    deps = []
+    for scope in ('dependencies', 'devDependencies', 'peerDependencies', 'optionalDependencies'):
+        section = data.get(scope)
+        if isinstance(section, dict):
+            deps += [dependency(name, str(version), scope) for name, version in section.items()]
+    return deps
+
+
+def parse_package_lock(path: str) -> list[dict]:
+    """package-lock.json：v2/v3 的 packages 表，或 v1 的嵌套 dependencies 树"""
+    with open(path, 'rb') as f:
+        data = json_object(json.load(f))
+    deps = []
+    packages = data.get('packages')
+    if isinstance(packages, dict):
+        for key, info in packages.items():
+            # 根项目为空键；不在 node_modules 下的是工作区自身
+            index = key.rfind('node_modules/')
+            if index == -1 or not isinstance(info, dict) or info.get('link'):
+                continue
+            deps.append(dependency(key[index + len('node_modules/'):], info.get('version'),
+                                   'dev' if info.get('dev') else None))
+        return deps
+
+    stack = [data['dependencies']] if isinstance(data.get('dependencies'), dict) else []
+    while stack:
+        for name, info in stack.pop().items():
+            if not isinstance(info, dict):
+                continue
+            deps.append(dependency(name, info.get('version'), 'dev' if info.get('dev') else None))
+            if isinstance(info.get('dependencies'), dict):
+                stack.append(info['dependencies'])
+    return deps
+
+
+def package_name(spec: str) -> str:
+    """从 name@range（或 @scope/name@range）中取出包名"""
+    spec = spec.strip().strip('"\'')
+    index = spec.find('@', 1)
+    return spec[:index] if index > 0 else spec
+
+
+def parse_yarn_lock(path: str) -> list[dict]:
+    """yarn.lock（v1 和 Berry）：顶格的描述符行后跟缩进的 version 字段"""
+    deps = []
+    current = None
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if not line.strip() or line.startswith('#'):
+                continue
+            if not line[0].isspace():
+                key = line.rstrip().rstrip(':')
+                current = None if key.strip('"') == '__metadata' else sorted(
+                    {package_name(spec) for spec in key.split(',')}
+                )
+            elif current and line.startswith('  version') and not line.startswith('   '):
+                version = line.strip()[len('version'):].lstrip(':').strip().strip('"')
+                deps += [dependency(name, version) for name in current]
+                current = None
+    return deps
+
+
+def parse_pnpm_lock(path: str) -> list[dict]:
+    """
+    pnpm-lock.yaml 的 packages 表
+
+    v5 的键为 /name/version_peer，v6 为 /name@version(peer)，v9 为 name@version(peer)。
+    """
+    deps = []
+    major = 9
+    in_packages = False
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            if not line[0].isspace():
+                if line.startswith('lockfileVersion:'):
+                    version = line.split(':', 1)[1].strip().strip('\'"')
+                    major = int(float(version)) if version.replace('.', '', 1).isdigit() else major
+                in_packages = line.rstrip() == 'packages:'
+                continue
+            if not in_packages or not line.startswith('  ') or line.startswith('   '):
+                continue
+            key = line.strip().rstrip(':').strip('\'"').lstrip('/')
+            if major < 6:
+                name, _, version = key.rpartition('/')
+                version = version.split('_', 1)[0]
+            else:
+                key = key.split('(', 1)[0]
+                index = key.rfind('@')
+                name, version = (key[:index], key[index + 1:]) if index > 0 else (key, None)
+            if name:
+                deps.append(dependency(name, version))
+    return deps
+
+
+def parse_pom(path: str) -> list[dict]:
+    """pom.xml 的 <dependency> 元素（增量解析，跳过插件的依赖）"""
+    deps = []
+    stack = []
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        tag = elem.tag.rsplit('}', 1)[-1]
+        if event == 'start':
+            stack.append(tag)
+            continue
+        stack.pop()
+        if tag == 'dependency' and 'plugin' not in stack:
+            fields = {child.tag.rsplit('}', 1)[-1]: (child.text or '').strip() for child in elem}
+            if fields.get('artifactId'):
+                name = f"{fields['groupId']}:{fields['artifactId']}" if fields.get('groupId') else fields['artifactId']
+                scope = 'managed' if 'dependencyManagement' in stack else fields.get('scope') or 'compile'
+                deps.append(dependency(name, fields.get('version'), scope))
+            elem.clear()
+        elif tag in ('plugin', 'build', 'reporting'):
+            elem.clear()
+    return deps
+
+
+def parse_gradle(path: str) -> list[dict]:
+    """build.gradle：dependencies 块中 'group:name:version' 和 group/name/version 映射形式的声明"""
+    deps = []
+    depth = 0
+    block_depth = None
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            code = line.split('//', 1)[0]
+            if block_depth is None and re.match(r'^\s*dependencies\s*\{', code):
+                block_depth = depth
+            elif block_depth is not None:
+                match = GRADLE_STRING.match(code) or GRADLE_MAP.match(code)
+                if match:
+                    config, group, name, version = match.groups()
+                    deps.append(dependency(f'{group}:{name}', version, config))
+            depth += code.count('{') - code.count('}')
+            if block_depth is not None and depth <= block_depth:
+                block_depth = None
+    return deps
+
+
+def cargo_entries(section: dict, scope: str) -> list[dict]:
+    deps = []
+    for name, spec in section.items():
+        if isinstance(spec, str):
+            deps.append(dependency(name, spec, scope))
+        elif isinstance(spec, dict):
+            version = spec.get('version') or spec.get('git') or spec.get('path')
+            deps.append(dependency(name, version, scope))
+    return deps
+
+
+def cargo_scope(header: str) -> Optional[tuple[str, Optional[str]]]:
+    """依赖表的表头：返回 (分组, 单独成表的依赖名)，不是依赖表时为 None"""
+    parts = [part.strip().strip('"\'') for part in re.split(r'\.(?=(?:[^"\']*["\'][^"\']*["\'])*[^"\']*$)', header)]
+    for index, part in enumerate(parts):
+        if part in ('dependencies', 'dev-dependencies', 'build-dependencies'):
+            if index + 1 < len(parts) - 1:
+                return None
+            return part, parts[index + 1] if index + 1 < len(parts) else None
+    return None
+
+
+def parse_cargo(path: str) -> list[dict]:
+    """Cargo.toml 的 [dependencies]、[dev-dependencies]、[build-dependencies]（含 target 和 workspace 下的表）"""
+    if tomllib is not None:
+        with open(path, 'rb') as f:
+            data = tomllib.load(f)
+        tables = [data]
+        if isinstance(data.get('workspace'), dict):
+            tables.append(data['workspace'])
+        if isinstance(data.get('target'), dict):
+            tables += [t for t in data['target'].values() if isinstance(t, dict)]
+        deps = []
+        for table in tables:
+            for scope in ('dependencies', 'dev-dependencies', 'build-dependencies'):
+                if isinstance(table.get(scope), dict):
+                    deps += cargo_entries(table[scope], scope)
+        return deps
+
+    # 没有 tomllib 时逐行解析常见写法：name = "1.0"、name = { version = "1.0" } 和 [dependencies.name] 表
+    deps = []
+    scope = None
+    table_dep = None
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            header = TOML_HEADER.match(line)
+            if header:
+                if table_dep is not None:
+                    deps.append(table_dep)
+                parsed = cargo_scope(header.group(1))
+                scope, name = parsed if parsed else (None, None)
+                table_dep = dependency(name, None, scope) if name else None
+                continue
+            entry = TOML_ENTRY.match(line)
+            if not entry or scope is None:
+                continue
+            key, value = entry.group(1).strip('"'), entry.group(2).strip()
+            if table_dep is not None:
+                if key == 'version' or (key in ('git', 'path') and table_dep['version'] is None):
+                    table_dep['version'] = value.strip('"\'')
+            elif value.startswith(('"', "'")):
+                deps.append(dependency(key, value.strip('"\''), scope))
+            elif value.startswith('{'):
+                version = TOML_VERSION.search(value)
+                deps.append(dependency(key, version.group(1) if version else None, scope))
+    if table_dep is not None:
+        deps.append(table_dep)
+    return deps
+
+
+def parse_go_mod(path: str) -> list[dict]:
+    """go.mod 的 require 指令（单行和块形式），以 // indirect 标记的依赖分组为 indirect"""
+    deps = []
+    block = None
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            code, _, comment = line.partition('//')
+            code = code.strip()
+            if block is not None:
+                if code == ')':
+                    block = None
+                    continue
+                fields = code.split()
+            else:
+                keyword, _, rest = code.partition(' ')
+                rest = rest.strip()
+                if rest == '(':
+                    block = keyword
+                    continue
+                if keyword != 'require':
+                    continue
+                fields = rest.split()
+            if (block is None or block == 'require') and len(fields) >= 2:
+                deps.append(dependency(fields[0], fields[1], 'indirect' if 'indirect' in comment else 'require'))
+    return deps
+
+
+def parse_composer(path: str) -> list[dict]:
+    """composer.json 的 require 和 require-dev（跳过 php、ext-* 等平台依赖）"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        data = json_object(json.load(f))
+    deps = []
+    for scope in ('require', 'require-dev'):
+        section = data.get(scope)
+        if not isinstance(section, dict):
+            continue
+        for name, version in section.items():
+            if name == 'php' or name.startswith(('ext-', 'lib-', 'composer-')):
+                continue
+            deps.append(dependency(name, str(version), scope))
+    return deps
+
+
+def parse_ruby_dsl(path: str) -> list[dict]:
+    """Gemfile 的 gem 声明和 Podfile 的 pod 声明，group/target 块的名称作为分组"""
+    deps = []
+    # 块栈：每个 do 块对应一个分组名（非 group/target 块为 None）
+    blocks = []
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            code = line.split('#', 1)[0]
+            if not code.strip():
+                continue
+            declaration = RUBY_DECLARATION.match(code)
+            if declaration:
+                versions = []
+                for value in RUBY_STRING.findall(declaration.group(3).split(':', 1)[0]):
+                    if VERSION_CONSTRAINT.match(value):
+                        versions.append(value)
+                scopes = [block for block in blocks if block]
+                deps.append(dependency(declaration.group(2), ', '.join(versions), scopes[-1] if scopes else None))
+            group = RUBY_GROUP.match(code)
+            if group:
+                blocks.append(', '.join(
+                    name.strip().lstrip(':').strip('\'"') for name in group.group(1).split(',') if name.strip()
+                ))
+            elif RUBY_BLOCK.search(code):
+                blocks.append(None)
+            elif code.strip() == 'end' and blocks:
+                blocks.pop()
+    return deps
+
+
+# {文件名: 解析函数}
+PARSERS: dict[str, Callable[[str], list[dict]]] = {
+    'requirements.txt': parse_requirements,
+    'package.json': parse_package_json,
+    'package-lock.json': parse_package_lock,
+    'yarn.lock': parse_yarn_lock,
+    'pnpm-lock.yaml': parse_pnpm_lock,
+    'pom.xml': parse_pom,
+    'build.gradle': parse_gradle,
+    'Cargo.toml': parse_cargo,
+    'go.mod': parse_go_mod,
+    'composer.json': parse_composer,
+    'Gemfile': parse_ruby_dsl,
+    'Podfile': parse_ruby_dsl,
+}
+
+
+def fingerprint(st: os.stat_result) -> tuple[int, int, int]:
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def parse_uncached(path: str) -> list[dict]:
+    """
+    解析清单文件（不使用缓存），文件名决定解析方式
+
+    Raises:
+        OSError: 文件无法读取
+        ValueError: 文件格式错误（JSON、XML 或 TOML 无法解析）
+    """
+    parser = PARSERS[os.path.basename(path)]
+    try:
+        return parser(path)
+    except ET.ParseError as e:
+        raise ValueError(str(e)) from e
+    except UnicodeDecodeError as e:
+        raise ValueError(str(e)) from e
+    except Exception as e:
+        if tomllib is not None and isinstance(e, tomllib.TOMLDecodeError):
+            raise ValueError(str(e)) from e
+        raise
+
+
+def cached(path: str, st: os.stat_result) -> Optional[list[dict]]:
+    """文件指纹未变化时返回缓存的解析结果"""
+    with _lock:
+        entry = _parsed.get(path)
+        if entry is None or entry[0] != fingerprint(st):
+            return None
+        _parsed.move_to_end(path)
+        return entry[1]
+
+
+def store(path: str, st: os.stat_result, deps: list[dict]):
+    with _lock:
+        _parsed[path] = (fingerprint(st), deps)
+        _parsed.move_to_end(path)
+        while len(_parsed) > MANIFEST_CACHE_SIZE:
+            _parsed.popitem(last=False)
+
+
+def parse_manifest(path: str, st: Optional[os.stat_result] = None) -> list[dict]:
+    """
+    解析清单文件（按文件指纹缓存）
+
+    Args:
+        path: 文件路径，文件名决定解析方式
+        st: 文件的 stat 结果（None 时重新 stat）
+
+    Returns:
+        依赖列表
+
+    Raises:
+        OSError: 文件无法读取
+        ValueError: 文件格式错误（JSON、XML 或 TOML 无法解析）
+    """
+    if st is None:
+        st = os.stat(path)
+    deps = cached(path, st)
+    if deps is None:
+        deps = parse_uncached(path)
+        store(path, st, deps)
+    return deps
+
+
+def parse_batch(paths: list[str]) -> list[tuple[Optional[list[dict]], Optional[str]]]:
+    """
+    解析一批清单文件（供进程池调用）
+
+    Returns:
+        与 paths 一一对应的 (依赖列表, 错误信息)
+    """
+    results = []
+    for path in paths:
+        try:
+            results.append((parse_uncached(path), None))
+        except (OSError, ValueError) as e:
+            results.append((None, str(e)))
+    return results
+
+
+def parse_manifests(
+    paths: list[str],
+    workers: int = 1,
+    batch_size: int = PARSE_BATCH_SIZE
+) -> Iterator[tuple[str, Optional[list[dict]], Optional[str]]]:
+    """
+    解析多个清单文件：命中缓存的直接返回，其余在进程池中分批解析（workers 为 1 时在当前进程中解析）
+
+    Args:
+        paths: 文件路径
+        workers: 解析进程数
+        batch_size: 每批提交的文件数
+
+    Yields:
+        (文件路径, 依赖列表, 错误信息)，顺序与 paths 相同
+    """
+    results = {}
+    # 未命中缓存的文件: [(文件路径, stat)]
+    pending = []
+    for path in paths:
+        check_cancelled()
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            results[path] = (None, str(e))
+            continue
+        deps = cached(path, st)
+        if deps is not None:
+            results[path] = (deps, None)
+        elif workers > 1:
+            pending.append((path, st))
+        else:
+            results[path] = parse_batch([path])[0]
+            if results[path][0] is not None:
+                store(path, st, results[path][0])
+
+    if pending:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [
+                (pending[i:i + batch_size], pool.submit(parse_batch, [path for path, _ in pending[i:i + batch_size]]))
+                for i in range(0, len(pending), batch_size)
+            ]
+            for batch, future in futures:
+                check_cancelled()
+                for (path, st), result in zip(batch, future.result()):
+                    results[path] = result
+                    if result[0] is not None:
+                        store(path, st, result[0])
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    for path in paths:
+        yield (path, *results[path])
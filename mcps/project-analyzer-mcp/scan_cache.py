@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+目录扫描快照
+
+为 analyze_structure、count_lines 和 list_dependencies 提供按根目录共享的内存快照：
+- 快照按需记录每个目录的扫描结果（子目录名，文件的大小、mtime 和语言），各工具对同一根目录
+  的重复遍历不再调用 os.scandir、stat 和 .gitignore 匹配
+- 每次读取目录时检查目录的 mtime，新增、删除或重命名过文件的目录会被重新扫描
+- 原地修改文件内容不会改变目录的 mtime，快照超过 TTL 后整体丢弃重建
+- 最多保留 max_roots 个根目录的快照（LRU），子目录复用其祖先目录的快照
+- 设置了文件系统监视器且根目录被完整监视时，快照由监视事件主动失效：读取目录时不再检查 mtime，
+  也不受 TTL 限制
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, NamedTuple, Optional
+
+from mcp_common.executor import check_cancelled
+from mcp_common.gitignore import IgnoreChain
+from mcp_common.walker import scan_dir
+from mcp_common.watcher import TreeWatcher
+
+# 快照的存活时间（秒）和最多保留的根目录数（可通过环境变量配置）
+SCAN_CACHE_TTL = float(os.environ.get('PROJECT_ANALYZER_SCAN_TTL', 300))
+SCAN_CACHE_ROOTS = int(os.environ.get('PROJECT_ANALYZER_SCAN_ROOTS', 8))
+
+
+class FileInfo(NamedTuple):
+    """快照中的文件"""
+    name: str
+    path: str
+    size: int
+    mtime_ns: int
+    language: Optional[str]
+
+
+class DirListing:
+    """快照中单个目录的扫描结果"""
+
+    __slots__ = ('path', 'mtime_ns', 'chain', 'dirs', 'files', 'child_chain', 'rollup')
+
+    def __init__(self, path: str, mtime_ns: int, chain: Optional[IgnoreChain]):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.chain = chain
+        # 子目录名和文件，均按名称排序
+        self.dirs: list[str] = []
+        self.files: list[FileInfo] = []
+        self.child_chain = chain
+        # 目录中直接包含的文件的汇总（由 summarize_structure 按需填充）
+        self.rollup: Optional[dict] = None
+
+    def dir_paths(self) -> list[str]:
+        return [os.path.join(self.path, name) for name in self.dirs]
+
+
+def chain_key(chain: Optional[IgnoreChain]) -> Optional[tuple]:
+    """规则链的比较键：规则对象按文件指纹缓存，.gitignore 变化后为新对象"""
+    return chain.chain if chain is not None else None
+
+
+class Snapshot:
+    """单个根目录的扫描快照"""
+
+    def __init__(self, root: str, respect_gitignore: bool, languages: dict):
+        self.root = root
+        self.respect_gitignore = respect_gitignore
+        self.languages = languages
+        self.created = time.monotonic()
+        self.listings: dict[str, DirListing] = {}
+        # 是否由监视器保证新鲜（无需检查目录 mtime）
+        self.trusted = False
+        # 每次失效时递增，扫描期间发生变化的结果不会被缓存
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def listdir(self, path: str, chain: Optional[IgnoreChain]) -> DirListing:
+        """
+        返回目录的扫描结果，目录的 mtime 或规则链变化时重新扫描
+
+        Args:
+            path: 目录路径
+            chain: 该目录生效的 .gitignore 规则链（与 scan_dir 的 ignore 参数相同）
+
+        Raises:
+            OSError: 目录无法读取
+        """
+        listing = self.listings.get(path)
+        if self.trusted and listing is not None and chain_key(listing.chain) == chain_key(chain):
+            self.hits += 1
+            return listing
+        generation = self.generation
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self.listings.pop(path, None)
+            raise
+        listing = self.listings.get(path)
+        if listing is not None and listing.mtime_ns == mtime_ns and chain_key(listing.chain) == chain_key(chain):
+            self.hits += 1
+            return listing
+
+        self.misses += 1
+        dirs, files, child_chain = scan_dir(path, ignore=chain)
+        listing = DirListing(path, mtime_ns, chain)
+        listing.dirs = [entry.name for entry in dirs]
+        for entry in files:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            language = self.languages.get(os.path.splitext(entry.name)[1].lower())
+            listing.files.append(FileInfo(entry.name, entry.path, st.st_size, st.st_mtime_ns, language))
+        listing.child_chain = child_chain
+        if self.generation == generation:
+            self.listings[path] = listing
+        return listing
+
+    def root_chain(self, root: str) -> Optional[IgnoreChain]:
+        """root 的祖先目录中生效的规则链"""
+        return IgnoreChain.for_root(root) if self.respect_gitignore else None
+
+    def walk_files(self, root: str) -> Iterator[FileInfo]:
+        """
+        深度优先遍历 root 下的所有文件（顺序与 walker.walk_files 相同）
+
+        无法读取的目录会被跳过；所在的工具调用被取消时抛出 ToolCancelled。
+        """
+        stack = [(root, self.root_chain(root))]
+        while stack:
+            check_cancelled()
+            path, chain = stack.pop()
+            try:
+                listing = self.listdir(path, chain)
+            except OSError:
+                continue
+            yield from listing.files
+            stack.extend((child, listing.child_chain) for child in reversed(listing.dir_paths()))
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class ScanCache:
+    """按根目录保留扫描快照（LRU + TTL）"""
+
+    def __init__(self, languages: dict, ttl: float = SCAN_CACHE_TTL, max_roots: int = SCAN_CACHE_ROOTS):
+        self.languages = languages
+        self.ttl = ttl
+        self.max_roots = max_roots
+        # {(根目录, 是否遵循 .gitignore): Snapshot}
+        self.snapshots: OrderedDict[tuple[str, bool], Snapshot] = OrderedDict()
+        self.lock = threading.Lock()
+        # 可选的文件系统监视器（回调为 on_change）
+        self.watcher: Optional[TreeWatcher] = None
+
+    def snapshot(self, root: str, respect_gitignore: bool = True) -> Snapshot:
+        """
+        返回覆盖 root 的快照
+
+        root 或其祖先目录已有未过期的快照时直接复用，否则新建快照。
+
+        Args:
+            root: 根目录（绝对路径）
+            respect_gitignore: 是否遵循 .gitignore
+        """
+        now = time.monotonic()
+        with self.lock:
+            for key in list(self.snapshots):
+                if not self.snapshots[key].trusted and now - self.snapshots[key].created > self.ttl:
+                    self._drop(key)
+            current = root
+            while True:
+                key = (current, respect_gitignore)
+                if key in self.snapshots:
+                    self.snapshots.move_to_end(key)
+                    return self.snapshots[key]
+                parent = os.path.dirname(current)
+                if parent == current:
+                    break
+                current = parent
+            snapshot = Snapshot(root, respect_gitignore, self.languages)
+            if self.watcher is not None:
+                snapshot.trusted = self.watcher.watch(root)
+            self.snapshots[(root, respect_gitignore)] = snapshot
+            while len(self.snapshots) > self.max_roots:
+                self._drop(next(iter(self.snapshots)))
+            return snapshot
+
+    def _drop(self, key: tuple[str, bool]):
+        """丢弃快照，没有其他快照使用同一根目录时停止监视"""
+        snapshot = self.snapshots.pop(key)
+        if self.watcher is not None and not any(root == snapshot.root for root, _ in self.snapshots):
+            self.watcher.unwatch(snapshot.root)
+
+    def invalidate(self, path: Optional[str] = None):
+        """丢弃包含 path 的快照中该目录的扫描结果，path 为 None 时丢弃全部快照"""
+        with self.lock:
+            if path is None:
+                for key in list(self.snapshots):
+                    self._drop(key)
+                return
+            for snapshot in self.snapshots.values():
+                snapshot.listings.pop(path, None)
+                snapshot.generation += 1
+
+    def on_change(self, path: Optional[str]):
+        """监视器回调：文件变化时失效其所在目录，目录变化时同时失效目录本身"""
+        if path is None:
+            self.invalidate(None)
+            return
+        self.invalidate(path)
+        self.invalidate(os.path.dirname(path))
@@ -9,8 +9,12 @@ Project Analyzer MCP Server
 """
 
 import ast
+import base64
+import bisect
 import json
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Any
 
@@ -18,6 +22,22 @@ from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 
+# 共享模块位于 mcps/mcp_common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from line_cache import LineCountCache
+from manifests import LOCKFILES, parse_manifests
+from scan_cache import DirListing, FileInfo, ScanCache, Snapshot
+from mcp_common.binary import (
+    SKIP_BINARY, SKIP_EXTENSION, SKIP_SIZE, looks_binary, skip_by_stat,
+)
+from mcp_common.encoding import OUTPUT_FORMAT_PROPERTY, encode_result
+from mcp_common.executor import ToolExecutor, check_cancelled
+from mcp_common.progress import current_progress, deadline_after, expired, start_progress
+from mcp_common.gitignore import IgnoreChain
+from mcp_common.walker import relative_path
+from mcp_common.watcher import watcher_from_env
+
 # 服务器配置
 server = Server("project-analyzer-mcp")
 
@@ -52,6 +72,18 @@ CODE_EXTENSIONS = {
     '.md': 'Markdown',
 }
 
+# 分页返回目录结构时的默认每页条目数
+STRUCTURE_PAGE_SIZE = 200
+
+# 列出依赖时的默认每页条目数
+DEPENDENCY_PAGE_SIZE = 200
+
+# 统计行数时每次读取的块大小
+LINE_COUNT_BLOCK = 1024 * 1024
+
+# 并行统计行数时每批提交给进程池的默认文件数
+COUNT_BATCH_SIZE = 256
+
 # 依赖文件映射
 DEPENDENCY_FILES = {
     'requirements.txt': 'pip',
@@ -68,14 +100,312 @@ DEPENDENCY_FILES = {
     'Podfile': 'CocoaPods',
 }
 
+# 各工具的最大并发数（工具在有界线程池中执行；count_lines 自身可再使用进程池）
+TOOL_LIMITS = {'analyze_structure': 2, 'count_lines': 1, 'list_dependencies': 2}
+
+# 执行工具调用的线程池
+executor = ToolExecutor(TOOL_LIMITS)
+
+# 三个工具共享的目录扫描快照
+scan_cache = ScanCache(CODE_EXTENSIONS)
+
+# 可选的文件系统监视（PROJECT_ANALYZER_WATCH=auto|inotify|poll，默认关闭），文件变化时主动失效快照
+scan_cache.watcher = watcher_from_env('PROJECT_ANALYZER_WATCH', scan_cache.on_change)
+
+
+def summarize_entries(snapshot: Snapshot, listing: DirListing) -> dict:
+    """
+    汇总目录（含子目录）中的文件，用于折叠后的大目录
+
+    Args:
+        snapshot: 扫描快照
+        listing: 目录的扫描结果
 
-def analyze_directory(path: str, max_depth: int = 3) -> dict:
+    Returns:
+        {'files': 文件数, 'bytes': 总大小, 'languages': {语言: 文件数}}
+    """
+    count = total = 0
+    languages = {}
+    stack = [(path, listing.child_chain) for path in listing.dir_paths()]
+    while True:
+        for info in listing.files:
+            count += 1
+            total += info.size
+            lang = info.language or 'Unknown'
+            languages[lang] = languages.get(lang, 0) + 1
+        if not stack:
+            break
+        check_cancelled()
+        path, chain = stack.pop()
+        try:
+            listing = snapshot.listdir(path, chain)
+        except OSError:
+            continue
+        stack.extend((child, listing.child_chain) for child in listing.dir_paths())
+    return {
+        'files': count,
+        'bytes': total,
+        'languages': dict(sorted(languages.items(), key=lambda item: (-item[1], item[0]))),
+    }
+
+
+def collapsed_node(name: str, snapshot: Snapshot, listing: DirListing) -> dict:
+    """大目录的摘要节点"""
+    return {
+        'name': name,
+        'type': 'dir',
+        'path': listing.path,
+        'collapsed': True,
+        'entries_count': len(listing.dirs) + len(listing.files),
+        **summarize_entries(snapshot, listing),
+    }
+
+
+def file_node(info: FileInfo) -> dict:
+    return {
+        'name': info.name,
+        'type': 'file',
+        'language': info.language or 'Unknown',
+        'size': info.size,
+    }
+
+
+def sorted_entries(listing: DirListing) -> list[tuple[str, FileInfo | None]]:
+    """目录中的条目按名称排序：[(名称, 文件信息)]，子目录的文件信息为 None"""
+    return sorted(
+        [(name, None) for name in listing.dirs] + [(info.name, info) for info in listing.files],
+        key=lambda item: item[0],
+    )
+
+
+def encode_cursor(root: Path, after: str) -> str:
+    """生成续页游标：记录根目录和上一页最后一个条目（目录结构中为相对路径）"""
+    payload = json.dumps({'root': str(root), 'after': after}, ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(root: Path, cursor: str) -> str | None:
+    """解析续页游标，返回上一页最后一个条目；游标无效或不属于 root 时为 None"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        return None
+    if not isinstance(payload, dict) or payload.get('root') != str(root) or not isinstance(payload.get('after'), str):
+        return None
+    return payload['after'] or None
+
+
+def iter_structure(
+    snapshot: Snapshot,
+    root: Path,
+    max_depth: int,
+    ignore: IgnoreChain | None,
+    collapse_threshold: int | None,
+    after: list[str] | None = None
+):
+    """
+    按深度优先先序（每个目录内按名称排序）逐个产出目录树条目
+
+    Args:
+        snapshot: 扫描快照
+        root: 根目录
+        max_depth: 最大递归深度
+        ignore: 根目录的 .gitignore 规则链，None 表示不使用 .gitignore
+        collapse_threshold: 直接子项超过该数量的目录折叠为摘要节点，None 表示不折叠
+        after: 从该路径（路径分量列表）之后继续，排在它之前的同级子树不会被扫描
+
+    Yields:
+        带 path（相对路径，/ 分隔）和 depth 的条目
+    """
+    def scan(dir_path: str, chain: IgnoreChain | None) -> DirListing | None:
+        check_cancelled()
+        try:
+            return snapshot.listdir(dir_path, chain)
+        except OSError:
+            return None
+
+    def collapsible(listing: DirListing) -> bool:
+        return collapse_threshold is not None and len(listing.dirs) + len(listing.files) > collapse_threshold
+
+    def visit(listing: DirListing, prefix: str, depth: int, after: list[str] | None):
+        for name, info in sorted_entries(listing):
+            is_dir = info is None
+            rel = prefix + name
+            if after:
+                if name < after[0]:
+                    continue
+                if name == after[0]:
+                    # 该条目已在上一页产出，只需继续其子树中剩余的部分
+                    if is_dir and depth + 1 <= max_depth:
+                        child = scan(os.path.join(listing.path, name), listing.child_chain)
+                        if child is not None and not collapsible(child):
+                            yield from visit(child, rel + '/', depth + 1, after[1:])
+                    after = None
+                    continue
+                after = None
+
+            if not is_dir:
+                yield {'path': rel, 'depth': depth + 1, **file_node(info)}
+                continue
+            if depth + 1 > max_depth:
+                yield {'path': rel, 'depth': depth + 1, 'name': name, 'type': 'dir', 'truncated': True}
+                continue
+            child = scan(os.path.join(listing.path, name), listing.child_chain)
+            if child is None:
+                yield {'path': rel, 'depth': depth + 1, 'name': name, 'type': 'dir', 'error': 'Permission denied'}
+            elif collapsible(child):
+                yield {'depth': depth + 1, **collapsed_node(name, snapshot, child), 'path': rel}
+            else:
+                yield {'path': rel, 'depth': depth + 1, 'name': name, 'type': 'dir'}
+                yield from visit(child, rel + '/', depth + 1, None)
+
+    listing = scan(str(root), ignore)
+    if listing is not None:
+        yield from visit(listing, '', 0, after)
+
+
+def directory_rollup(listing: DirListing) -> dict:
+    """
+    汇总目录中直接包含的文件
+
+    Returns:
+        {'files': 文件数, 'bytes': 总大小, 'lines': 代码行数, 'languages': {语言: 代码行数}}
+    """
+    rollup = {'files': 0, 'bytes': 0, 'lines': 0, 'languages': {}}
+    for info in listing.files:
+        lines = None
+        if info.language is not None and skip_by_stat(info.name, info.size) is None:
+            try:
+                lines = count_file_lines(info.path)
+            except OSError:
+                continue
+        rollup['files'] += 1
+        rollup['bytes'] += info.size
+        if lines:
+            rollup['lines'] += lines
+            rollup['languages'][info.language] = rollup['languages'].get(info.language, 0) + lines
+    return rollup
+
+
+def summarize_structure(
+    snapshot: Snapshot,
+    root: Path,
+    max_depth: int,
+    ignore: IgnoreChain | None,
+    top_k: int,
+    sort_by: str,
+    deadline: float | None = None
+) -> dict:
+    """
+    汇总目录树：一次剪枝遍历计算每个目录的递归总计（字节数、文件数、代码行数、语言分布），
+    返回根目录的总计和最重的 top_k 个子树
+
+    每个目录的直接文件汇总保存在扫描快照的目录扫描结果上，目录未被重新扫描（mtime 和
+    .gitignore 规则链不变）时直接复用，只有新增、删除或重命名过文件的目录需要重新统计。
+
+    Args:
+        snapshot: 扫描快照
+        root: 根目录
+        max_depth: 参与排名的子目录最大深度
+        ignore: 根目录的 .gitignore 规则链，None 表示不使用 .gitignore
+        top_k: 返回的子树数量
+        sort_by: 排名依据（bytes、files 或 lines）
+        deadline: 截止时间（time.monotonic），到达后不再进入新的目录，结果标记 truncated_by_deadline
+
+    Returns:
+        汇总结果
+    """
+    root_str = str(root)
+    ranked = []
+    hits = misses = 0
+    progress = current_progress()
+    truncated_by_deadline = False
+
+    def visit(dir_path: str, chain: IgnoreChain | None, depth: int) -> dict:
+        nonlocal hits, misses, truncated_by_deadline
+        check_cancelled()
+        if expired(deadline):
+            truncated_by_deadline = True
+            return {'files': 0, 'bytes': 0, 'lines': 0, 'languages': {}}
+        progress.update(hits + misses, None, f'已汇总 {hits + misses} 个目录')
+        try:
+            listing = snapshot.listdir(dir_path, chain)
+        except OSError:
+            return {'files': 0, 'bytes': 0, 'lines': 0, 'languages': {}}
+        if listing.rollup is not None:
+            hits += 1
+        else:
+            misses += 1
+            listing.rollup = directory_rollup(listing)
+
+        totals = {**listing.rollup, 'languages': dict(listing.rollup['languages'])}
+        for child in listing.dir_paths():
+            sub = visit(child, listing.child_chain, depth + 1)
+            for metric in ('files', 'bytes', 'lines'):
+                totals[metric] += sub[metric]
+            for lang, lines in sub['languages'].items():
+                totals['languages'][lang] = totals['languages'].get(lang, 0) + lines
+        if 0 < depth <= max_depth:
+            ranked.append((dir_path[len(root_str.rstrip(os.sep)) + 1:], depth, totals))
+        return totals
+
+    def rollup(totals: dict) -> dict:
+        return {
+            'files': totals['files'],
+            'bytes': totals['bytes'],
+            'lines': totals['lines'],
+            'languages': dict(sorted(totals['languages'].items(), key=lambda item: (-item[1], item[0]))),
+        }
+
+    total = visit(root_str, ignore, 0)
+    ranked.sort(key=lambda item: (-item[2][sort_by], item[0]))
+    result = {
+        'path': root_str,
+        'summary': rollup(total),
+        'top': [
+            {'path': rel.replace(os.sep, '/'), 'depth': depth, **rollup(totals)}
+            for rel, depth, totals in ranked[:top_k]
+        ],
+        'sort_by': sort_by,
+        'cache': {'hits': hits, 'misses': misses},
+    }
+    if deadline is not None:
+        result['truncated_by_deadline'] = truncated_by_deadline
+    return result
+
+
+def analyze_directory(
+    path: str,
+    max_depth: int = 3,
+    respect_gitignore: bool = True,
+    page_size: int | None = None,
+    cursor: str | None = None,
+    collapse_threshold: int | None = None,
+    summary: bool = False,
+    top_k: int = 10,
+    sort_by: str = 'bytes',
+    time_budget: float | None = None
+) -> dict:
     """
     分析目录结构
 
+    默认返回完整的嵌套目录树；指定 page_size 或 cursor 时按需遍历，
+    以扁平列表分页返回条目，并在还有剩余条目时返回 next_cursor；
+    summary 为 True 时只返回目录汇总和最重的子树。
+    遍历过程中报告进度，分页模式下产出的条目可流式返回。
+
     Args:
         path: 目录路径
         max_depth: 最大递归深度
+        respect_gitignore: 是否跳过 .gitignore 中忽略的文件和目录
+        page_size: 每页条目数
+        cursor: 上一页返回的 next_cursor
+        collapse_threshold: 直接子项超过该数量的目录折叠为摘要节点（文件数、总大小、语言分布）
+        summary: 是否只返回汇总（递归的字节数、文件数、代码行数和语言分布）
+        top_k: 汇总模式下返回的最重子树数量
+        sort_by: 汇总模式下子树的排名依据（bytes、files 或 lines）
+        time_budget: 时间预算（秒），超出后返回已遍历的部分并标记 truncated_by_deadline；
+            分页模式下从最后一个已返回的条目继续的 next_cursor 仍然有效
 
     Returns:
         包含目录结构的字典
@@ -83,50 +413,204 @@ def analyze_directory(path: str, max_depth: int = 3) -> dict:
     root = Path(path).resolve()
     if not root.exists() or not root.is_dir():
         return {'error': f'路径不存在或不是目录: {path}'}
+    snapshot = scan_cache.snapshot(str(root), respect_gitignore)
+    ignore = snapshot.root_chain(str(root))
+    progress = current_progress()
+    deadline = deadline_after(time_budget)
+    truncated_by_deadline = False
+
+    if summary:
+        if sort_by not in ('bytes', 'files', 'lines'):
+            return {'error': f'未知的排名依据: {sort_by}'}
+        return summarize_structure(snapshot, root, max_depth, ignore, top_k, sort_by, deadline)
 
-    def build_tree(current_path: Path, current_depth: int) -> dict:
+    if page_size is not None or cursor is not None:
+        after = None
+        if cursor is not None:
+            after = decode_cursor(root, cursor)
+            if after is None:
+                return {'error': '无效的 cursor'}
+            after = after.split('/')
+        page_size = page_size or STRUCTURE_PAGE_SIZE
+        entries = []
+        # 多取一个条目判断是否还有下一页
+        for entry in iter_structure(snapshot, root, max_depth, ignore, collapse_threshold, after):
+            entries.append(entry)
+            if len(entries) > page_size:
+                break
+            progress.partial([entry])
+            progress.update(len(entries), page_size, f'已列出 {len(entries)} 个条目')
+            if expired(deadline):
+                truncated_by_deadline = True
+                break
+        has_more = len(entries) > page_size or (truncated_by_deadline and entries)
+        entries = entries[:page_size]
+        result = {
+            'path': str(root),
+            'entries': entries,
+            'next_cursor': encode_cursor(root, entries[-1]['path']) if has_more else None,
+        }
+        if time_budget is not None:
+            result['truncated_by_deadline'] = truncated_by_deadline
+        return result
+
+    visited = 0
+
+    def build_tree(current_path: Path, current_depth: int, ignore: IgnoreChain | None) -> dict:
+        nonlocal visited, truncated_by_deadline
         if current_depth > max_depth:
             return {'name': current_path.name, 'type': 'dir', 'truncated': True}
 
+        check_cancelled()
+        if expired(deadline):
+            truncated_by_deadline = True
+            return {'name': current_path.name, 'type': 'dir', 'truncated': True}
+        visited += 1
+        progress.update(visited, None, f'已遍历 {visited} 个目录')
         try:
             entries = []
-            for item in sorted(current_path.iterdir()):
-                # 跳过隐藏文件和常见忽略目录
-                if item.name.startswith('.'):
-                    continue
-                if item.is_dir() and item.name in {'node_modules', '__pycache__', 'venv', '.venv', 'target', 'build', 'dist'}:
-                    continue
-
-                if item.is_dir():
-                    entries.append(build_tree(item, current_depth + 1))
+            # 跳过隐藏文件和常见忽略目录（忽略目录在扫描时即被剪枝）
+            listing = snapshot.listdir(str(current_path), ignore)
+            if (current_depth > 0 and collapse_threshold is not None
+                    and len(listing.dirs) + len(listing.files) > collapse_threshold):
+                return collapsed_node(current_path.name, snapshot, listing)
+            for name, info in sorted_entries(listing):
+                if info is None:
+                    entries.append(build_tree(current_path / name, current_depth + 1, listing.child_chain))
                 else:
-                    ext = item.suffix.lower()
-                    lang = CODE_EXTENSIONS.get(ext, 'Unknown')
-                    entries.append({
-                        'name': item.name,
-                        'type': 'file',
-                        'language': lang,
-                        'size': item.stat().st_size,
-                    })
+                    entries.append(file_node(info))
             return {
                 'name': current_path.name,
                 'type': 'dir',
                 'path': str(current_path),
                 'entries': entries,
             }
-        except PermissionError:
-            return {'name': current_path.name, 'type': 'dir', 'error': 'Permission denied'}
+        except OSError as e:
+            # 无权限，或目录在快照建立后被删除
+            return {'name': current_path.name, 'type': 'dir', 'error': e.strerror or str(e)}
 
-    return build_tree(root, 0)
+    tree = build_tree(root, 0, ignore)
+    if time_budget is not None:
+        tree['truncated_by_deadline'] = truncated_by_deadline
+    return tree
+
+
+def count_file_lines(file_path: str, skip_binary: bool = True) -> int | None:
+    """
+    统计单个文件的行数
+
+    按大块读取二进制内容，用 bytes.count 统计换行符，不解码也不逐行迭代。
+    结果与文本模式逐行迭代（通用换行符）完全一致：\n、\r\n 和单独的 \r 都算作换行，
+    末尾没有换行符的最后一行同样计为一行。
+
+    Args:
+        file_path: 文件路径
+        skip_binary: 是否先嗅探首个数据块，跳过二进制文件
+
+    Returns:
+        行数，文件被识别为二进制文件时为 None
+    """
+    lf = cr = crlf = 0
+    prev_cr = False
+    last = b''
+    with open(file_path, 'rb') as f:
+        first = True
+        while True:
+            block = f.read(LINE_COUNT_BLOCK)
+            if not block:
+                break
+            # 解码前先嗅探首个数据块，二进制文件直接跳过
+            if first:
+                if skip_binary and looks_binary(block):
+                    return None
+                first = False
+            lf += block.count(b'\n')
+            block_cr = block.count(b'\r')
+            if block_cr:
+                cr += block_cr
+                crlf += block.count(b'\r\n')
+            # 跨块边界的 \r\n
+            if prev_cr and block[0] == 0x0A:
+                crlf += 1
+            prev_cr = block[-1] == 0x0D
+            last = block[-1:]
+    lines = lf + cr - crlf
+    if last and last not in (b'\n', b'\r'):
+        lines += 1
+    return lines
+
+
+def count_batch(files: list, skip_binary: bool) -> list:
+    """
+    统计一批文件（供进程池调用）
+
+    Args:
+        files: 文件路径列表
+
+    Returns:
+        与 files 一一对应的行数，二进制文件为 None，无法读取的文件为 False
+    """
+    results = []
+    for file_path in files:
+        try:
+            results.append(count_file_lines(file_path, skip_binary))
+        except OSError:
+            results.append(False)
+    return results
 
 
-def count_lines(path: str, by_language: bool = True) -> dict:
+def parallel_count(files: list, workers: int, batch_size: int, skip_binary: bool):
+    """
+    在进程池中分批统计文件
+
+    Args:
+        files: 文件路径列表
+        workers: 进程数
+        batch_size: 每批文件数
+
+    Yields:
+        与 files 一一对应的统计结果（按提交顺序）
+    """
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [
+            pool.submit(count_batch, files[i:i + batch_size], skip_binary)
+            for i in range(0, len(files), batch_size)
+        ]
+        for future in futures:
+            check_cancelled()
+            yield from future.result()
+    finally:
+        # 调用被取消时不再等待尚未开始的批次
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def count_lines(
+    path: str,
+    by_language: bool = True,
+    respect_gitignore: bool = True,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    use_cache: bool = True,
+    workers: int = 1,
+    batch_size: int = COUNT_BATCH_SIZE,
+    time_budget: float | None = None
+) -> dict:
     """
     统计代码行数
 
+    先从扫描快照中列出待统计的文件，统计过程中报告进度（已统计的文件数和预计剩余时间）。
+
     Args:
         path: 目录路径
         by_language: 是否按语言分类统计
+        respect_gitignore: 是否跳过 .gitignore 中忽略的文件和目录
+        skip_binary: 是否跳过二进制文件（压缩后的前端资源和首个数据块中含 NUL 字节的文件）
+        max_file_size: 文件大小上限（字节），None 表示不限制
+        use_cache: 是否使用持久化的逐文件缓存，只重新统计发生变化的文件
+        workers: 统计进程数，1 表示在当前进程中顺序统计
+        batch_size: 并行统计时每批提交的文件数
+        time_budget: 时间预算（秒），超出后返回已统计部分的结果并标记 truncated_by_deadline
 
     Returns:
         代码行数统计结果
@@ -134,45 +618,170 @@ def count_lines(path: str, by_language: bool = True) -> dict:
     root = Path(path).resolve()
     if not root.exists() or not root.is_dir():
         return {'error': f'路径不存在或不是目录: {path}'}
+    if workers < 1 or batch_size < 1:
+        return {'error': 'workers 和 batch_size 必须为正整数'}
 
     stats = {}
-    total_lines = 0
-    total_files = 0
-
-    for file_path in root.rglob('*'):
-        if file_path.is_file() and not file_path.name.startswith('.'):
-            ext = file_path.suffix.lower()
-            if ext in CODE_EXTENSIONS:
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = sum(1 for _ in f)
-                        lang = CODE_EXTENSIONS[ext]
-                        if by_language:
-                            if lang not in stats:
-                                stats[lang] = {'files': 0, 'lines': 0}
-                            stats[lang]['files'] += 1
-                            stats[lang]['lines'] += lines
-                        else:
-                            total_files += 1
-                            total_lines += lines
-                except (PermissionError, UnicodeDecodeError):
-                    pass
+    totals = {'files': 0, 'lines': 0}
+    skipped = {SKIP_EXTENSION: 0, SKIP_SIZE: 0, SKIP_BINARY: 0}
+    cache = LineCountCache(root) if use_cache else None
+    root_str = str(root)
+    # 并行模式下未命中缓存的文件: [(相对路径, stat, 语言, 文件路径)]
+    pending = []
+
+    def tally(lang: str, lines: int | None):
+        if lines is None:
+            skipped[SKIP_BINARY] += 1
+            return
+        if by_language:
+            if lang not in stats:
+                stats[lang] = {key: 0 for key in totals}
+            target = stats[lang]
+        else:
+            target = totals
+        target['files'] += 1
+        target['lines'] += lines
+
+    progress = current_progress()
+    deadline = deadline_after(time_budget)
+    truncated_by_deadline = False
+
+    # 文件列表来自共享的扫描快照；仍重新 stat 每个文件作为缓存指纹，原地修改的文件同样会被发现
+    files = [
+        entry for entry in scan_cache.snapshot(root_str, respect_gitignore).walk_files(root_str)
+        if entry.language is not None
+    ]
+    for done, entry in enumerate(files):
+        check_cancelled()
+        if expired(deadline):
+            truncated_by_deadline = True
+            break
+        progress.update(done, len(files), f'已统计 {done}/{len(files)} 个文件')
+        lang = entry.language
+        try:
+            st = os.stat(entry.path)
+            rel_path = relative_path(entry, root_str)
+            reason = skip_by_stat(entry.name, st.st_size, max_file_size, skip_binary)
+            if reason:
+                skipped[reason] += 1
+                if cache:
+                    cache.keep(rel_path)
+                continue
+            cached = cache.get(rel_path, st) if cache else None
+            if cached is not None and (skip_binary or not cached[0]):
+                lines = None if cached[0] else cached[1]
+            elif workers > 1:
+                pending.append((rel_path, st, lang, entry.path))
+                continue
+            else:
+                lines = count_file_lines(entry.path, skip_binary)
+                if cache:
+                    cache.put(rel_path, st, lines is None, lines)
+        except OSError:
+            # 无权限，或文件在快照建立后被删除
+            continue
+        tally(lang, lines)
+
+    if pending and not truncated_by_deadline:
+        counted = parallel_count(
+            [file_path for _, _, _, file_path in pending], workers, batch_size, skip_binary,
+        )
+        start = len(files) - len(pending)
+        for done, ((rel_path, st, lang, _), result) in enumerate(zip(pending, counted), start):
+            progress.update(done, len(files), f'已统计 {done}/{len(files)} 个文件')
+            if result is not False:
+                if cache:
+                    cache.put(rel_path, st, result is None, result)
+                tally(lang, result)
+            if expired(deadline):
+                truncated_by_deadline = True
+                break
+        # 提前结束时关闭生成器，取消尚未开始的批次
+        counted.close()
 
     if by_language:
-        return {
-            'by_language': stats,
-            'total_files': sum(s['files'] for s in stats.values()),
-            'total_lines': sum(s['lines'] for s in stats.values()),
-        }
-    return {'files': total_files, 'lines': total_lines}
+        result = {'by_language': stats}
+        for key in totals:
+            result[f'total_{key}'] = sum(s[key] for s in stats.values())
+        result['skipped'] = skipped
+    else:
+        result = {**totals, 'skipped': skipped}
+
+    if cache:
+        # 因时间预算提前结束时，未访问到的文件不代表已被删除，保留它们的记录
+        cache.save(prune=not truncated_by_deadline)
+        result['cache'] = cache.stats()
+    if time_budget is not None:
+        result['truncated_by_deadline'] = truncated_by_deadline
+    return result
+
+
+def page_cursor(root: Path, cursor: str | None) -> int | None:
+    """解析依赖列表的续页游标，返回偏移量；游标无效时为 None"""
+    if cursor is None:
+        return 0
+    after = decode_cursor(root, cursor)
+    return int(after) if after is not None and after.isdigit() else None
+
+
+def dependency_graph(root_str: str, parsed: list[tuple[str, list[dict]]]) -> tuple[dict, list[dict]]:
+    """
+    按包汇总各工作区声明的依赖
+
+    Args:
+        root_str: 根目录
+        parsed: [(清单文件路径, 依赖列表)]
+
+    Returns:
+        ({(包管理器, 包名): 包节点}, 工作区列表)
+    """
+    packages = {}
+    workspaces = {}
+    for file_path, deps in parsed:
+        directory, dep_file = os.path.split(file_path)
+        workspace = os.path.relpath(directory, root_str).replace(os.sep, '/')
+        manager = DEPENDENCY_FILES[dep_file]
+        workspaces.setdefault(workspace, {})[dep_file] = len(deps)
+        if dep_file in LOCKFILES:
+            # 锁文件的完整依赖树不并入图中，只在工作区中记录包数
+            continue
+        for dep in deps:
+            node = packages.get((manager, dep['name']))
+            if node is None:
+                node = packages[(manager, dep['name'])] = {
+                    'name': dep['name'], 'manager': manager, 'versions': [], 'workspaces': [],
+                }
+            if dep['version'] and dep['version'] not in node['versions']:
+                node['versions'].append(dep['version'])
+            node['workspaces'].append({'workspace': workspace, **{k: v for k, v in dep.items() if k != 'name'}})
+    return packages, [{'path': path, 'files': files} for path, files in sorted(workspaces.items())]
 
 
-def list_dependencies(path: str) -> dict:
+def list_dependencies(
+    path: str,
+    recursive: bool = False,
+    respect_gitignore: bool = True,
+    page_size: int = DEPENDENCY_PAGE_SIZE,
+    cursor: str | None = None,
+    workers: int = 1
+) -> dict:
     """
     列出项目依赖
 
+    清单文件（requirements.txt、package.json 等）列出声明的直接依赖，锁文件（package-lock.json、
+    yarn.lock、pnpm-lock.yaml）单独列出解析后的完整依赖树。解析结果按文件指纹缓存。
+
+    默认只查看根目录中的清单文件（不受 .gitignore 影响，被忽略的锁文件同样列出）；recursive 时在一次
+    剪枝遍历中发现所有子目录（工作区）中的清单文件，并返回按包去重的依赖图：每个包列出使用它的工作区及
+    各自声明的版本。
+
     Args:
         path: 目录路径
+        recursive: 是否递归发现子目录中的清单文件
+        respect_gitignore: 递归时是否跳过 .gitignore 中忽略的目录和文件（不影响非递归时的根目录）
+        page_size: 每页条目数（非递归时为每个文件的依赖数，递归时为包数）
+        cursor: 上一页返回的 next_cursor
+        workers: 解析进程数，1 表示在当前进程中顺序解析
 
     Returns:
         项目依赖信息
@@ -180,48 +789,78 @@ def list_dependencies(path: str) -> dict:
     root = Path(path).resolve()
     if not root.exists() or not root.is_dir():
         return {'error': f'路径不存在或不是目录: {path}'}
+    if page_size < 1 or workers < 1:
+        return {'error': 'page_size 和 workers 必须为正整数'}
+    root_str = str(root)
 
-    dependencies = {}
+    if recursive:
+        snapshot = scan_cache.snapshot(root_str, respect_gitignore)
+        paths = [info.path for info in snapshot.walk_files(root_str) if info.name in DEPENDENCY_FILES]
+    else:
+        # 根目录中的清单文件总是列出，即使被 .gitignore 忽略（例如忽略锁文件的项目）
+        paths = [
+            os.path.join(root_str, dep_file) for dep_file in DEPENDENCY_FILES
+            if os.path.isfile(os.path.join(root_str, dep_file))
+        ]
 
-    for dep_file, manager in DEPENDENCY_FILES.items():
-        file_path = root / dep_file
-        if file_path.exists():
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-
-                deps = []
-                if dep_file == 'requirements.txt':
-                    deps = [line.strip().split('==')[0].split('>=')[0].split('<=')[0]
-                           for line in content.split('\n')
-                           if line.strip() and not line.startswith('#')]
-                elif dep_file in ['package.json', 'composer.json', 'Cargo.toml', 'go.mod']:
-                    try:
-                        data = json.loads(content) if dep_file.endswith('.json') else {}
-                        if dep_file == 'package.json':
-                            deps = list(data.get('dependencies', {}).keys())
-                            deps += list(data.get('devDependencies', {}).keys())
-                    except json.JSONDecodeError:
-                        pass
-                elif dep_file == 'pom.xml':
-                    # 简化的 XML 解析
-                    import re
-                    deps = re.findall(r'<artifactId>([^<]+)</artifactId>', content)
-
-                if deps:
-                    dependencies[manager] = {
-                        'file': dep_file,
-                        'count': len(deps),
-                        'dependencies': deps[:20],  # 限制返回数量
-                        'truncated': len(deps) > 20,
-                    }
-            except (PermissionError, UnicodeDecodeError):
-                pass
+    parsed = []
+    errors = {}
+    for file_path, deps, error in parse_manifests(paths, workers):
+        if error is not None:
+            errors[os.path.relpath(file_path, root_str).replace(os.sep, '/')] = error
+        elif deps:
+            parsed.append((file_path, deps))
 
-    return {
-        'dependency_managers': list(dependencies.keys()),
-        'dependencies': dependencies,
-    }
+    if recursive:
+        packages, workspaces = dependency_graph(root_str, parsed)
+        order = sorted(packages)
+        start = 0
+        if cursor is not None:
+            after = decode_cursor(root, cursor)
+            if after is None or ':' not in after:
+                return {'error': '无效的 cursor'}
+            key = tuple(after.split(':', 1))
+            start = bisect.bisect_right(order, key)
+        page = order[start:start + page_size]
+        has_more = start + page_size < len(order)
+        result = {
+            'path': root_str,
+            'dependency_managers': list(dict.fromkeys(
+                DEPENDENCY_FILES[os.path.basename(file_path)] for file_path, _ in parsed
+            )),
+            'manifests': len(parsed),
+            'workspaces': workspaces,
+            'total_packages': len(order),
+            'packages': [packages[key] for key in page],
+            'next_cursor': encode_cursor(root, ':'.join(page[-1])) if has_more else None,
+        }
+    else:
+        offset = page_cursor(root, cursor)
+        if offset is None:
+            return {'error': '无效的 cursor'}
+        dependencies = {}
+        lockfiles = {}
+        has_more = False
+        for file_path, deps in parsed:
+            dep_file = os.path.basename(file_path)
+            manager = DEPENDENCY_FILES[dep_file]
+            entry = {'file': dep_file, 'count': len(deps), 'dependencies': deps[offset:offset + page_size]}
+            has_more = has_more or offset + page_size < len(deps)
+            if dep_file in LOCKFILES:
+                lockfiles[dep_file] = {'manager': manager, **entry}
+            else:
+                dependencies[manager] = entry
+        result = {
+            'dependency_managers': list(dict.fromkeys(
+                [*dependencies, *(entry['manager'] for entry in lockfiles.values())]
+            )),
+            'dependencies': dependencies,
+            'lockfiles': lockfiles,
+            'next_cursor': encode_cursor(root, str(offset + page_size)) if has_more else None,
+        }
+    if errors:
+        result['errors'] = errors
+    return result
 
 
 @server.list_tools()
@@ -230,7 +869,7 @@ async def list_tools() -> list[Tool]:
     return [
         Tool(
             name="analyze_structure",
-            description="分析项目的目录结构，返回文件树。支持设置最大递归深度。",
+            description="分析项目的目录结构，返回文件树。支持设置最大递归深度、分页返回和折叠大目录。",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -245,6 +884,53 @@ async def list_tools() -> list[Tool]:
                         "minimum": 1,
                         "maximum": 10,
                     },
+                    "respect_gitignore": {
+                        "type": "boolean",
+                        "description": "跳过 .gitignore 中忽略的文件和目录（默认 true）",
+                        "default": True,
+                    },
+                    "page_size": {
+                        "type": "number",
+                        "description": "分页模式：每页返回的条目数（扁平列表，按深度优先顺序）",
+                        "minimum": 1,
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "分页模式：上一页返回的 next_cursor",
+                    },
+                    "collapse_threshold": {
+                        "type": "number",
+                        "description": "直接子项超过该数量的目录折叠为摘要节点（文件数、总大小、语言分布）",
+                        "minimum": 0,
+                    },
+                    "summary": {
+                        "type": "boolean",
+                        "description": "汇总模式：只返回递归的字节数、文件数、代码行数、语言分布和最重的子树（默认 false）",
+                        "default": False,
+                    },
+                    "top_k": {
+                        "type": "number",
+                        "description": "汇总模式：返回的最重子树数量（默认 10）",
+                        "default": 10,
+                        "minimum": 1,
+                    },
+                    "sort_by": {
+                        "type": "string",
+                        "description": "汇总模式：子树的排名依据（默认 bytes）",
+                        "enum": ["bytes", "files", "lines"],
+                        "default": "bytes",
+                    },
+                    "time_budget": {
+                        "type": "number",
+                        "description": "时间预算（秒），超出后返回已遍历的部分并标记 truncated_by_deadline",
+                        "exclusiveMinimum": 0,
+                    },
+                    "stream": {
+                        "type": "boolean",
+                        "description": "分页模式下，请求带 progressToken 时把新列出的条目以 notifications/message 增量发送（默认 false）",
+                        "default": False,
+                    },
+                    "output_format": OUTPUT_FORMAT_PROPERTY,
                 },
             },
         ),
@@ -263,12 +949,51 @@ async def list_tools() -> list[Tool]:
                         "description": "是否按语言分类统计（默认 true）",
                         "default": True,
                     },
+                    "respect_gitignore": {
+                        "type": "boolean",
+                        "description": "跳过 .gitignore 中忽略的文件和目录（默认 true）",
+                        "default": True,
+                    },
+                    "skip_binary": {
+                        "type": "boolean",
+                        "description": "跳过二进制文件和压缩后的前端资源（默认 true）",
+                        "default": True,
+                    },
+                    "max_file_size": {
+                        "type": "number",
+                        "description": "文件大小上限（字节），超过的文件会被跳过",
+                        "minimum": 1,
+                    },
+                    "use_cache": {
+                        "type": "boolean",
+                        "description": "使用持久化的逐文件缓存，只重新统计发生变化的文件（默认 true）",
+                        "default": True,
+                    },
+                    "workers": {
+                        "type": "number",
+                        "description": "统计进程数，1 表示顺序统计（默认 1）",
+                        "default": 1,
+                        "minimum": 1,
+                        "maximum": 64,
+                    },
+                    "batch_size": {
+                        "type": "number",
+                        "description": f"并行统计时每批提交的文件数（默认 {COUNT_BATCH_SIZE}）",
+                        "default": COUNT_BATCH_SIZE,
+                        "minimum": 1,
+                    },
+                    "time_budget": {
+                        "type": "number",
+                        "description": "时间预算（秒），超出后返回已统计部分的结果并标记 truncated_by_deadline",
+                        "exclusiveMinimum": 0,
+                    },
+                    "output_format": OUTPUT_FORMAT_PROPERTY,
                 },
             },
         ),
         Tool(
             name="list_dependencies",
-            description="列出项目的依赖包和依赖管理器。",
+            description="列出项目的依赖包和依赖管理器。支持递归发现 monorepo 各工作区的清单文件并返回按包去重的依赖图，结果分页返回。",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -276,6 +1001,34 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "项目根目录路径（默认为当前工作目录）",
                     },
+                    "recursive": {
+                        "type": "boolean",
+                        "description": "递归发现子目录中的清单文件，返回包 → 工作区的依赖图（默认 false）",
+                        "default": False,
+                    },
+                    "respect_gitignore": {
+                        "type": "boolean",
+                        "description": "递归时跳过 .gitignore 中忽略的目录和文件，非递归时不生效（默认 true）",
+                        "default": True,
+                    },
+                    "page_size": {
+                        "type": "number",
+                        "description": f"每页条目数：非递归时为每个文件的依赖数，递归时为包数（默认 {DEPENDENCY_PAGE_SIZE}）",
+                        "default": DEPENDENCY_PAGE_SIZE,
+                        "minimum": 1,
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "上一页返回的 next_cursor",
+                    },
+                    "workers": {
+                        "type": "number",
+                        "description": "解析进程数，1 表示顺序解析（默认 1）",
+                        "default": 1,
+                        "minimum": 1,
+                        "maximum": 64,
+                    },
+                    "output_format": OUTPUT_FORMAT_PROPERTY,
                 },
             },
         ),
@@ -284,22 +1037,63 @@ async def list_tools() -> list[Tool]:
 
 @server.call_tool()
 async def call_tool(name: str, arguments: Any) -> list[TextContent]:
-    """处理工具调用"""
+    """
+    处理工具调用：在线程池中执行，不阻塞事件循环，客户端取消时协作式中止
+
+    请求带 progressToken 时，执行期间发送进度通知（和流式的部分结果）。
+    """
+    try:
+        context = server.request_context
+    except LookupError:
+        context = None
+    progress = start_progress(context, name, arguments.get('stream', False))
+    result = await executor.run(name, run_tool, name, arguments)
+    if progress is not None:
+        await progress.drain()
+    return result
+
+
+def run_tool(name: str, arguments: Any) -> list[TextContent]:
+    """执行工具调用（同步）"""
     path = arguments.get('path', os.getcwd())
+    respect_gitignore = arguments.get('respect_gitignore', True)
 
     if name == "analyze_structure":
         max_depth = arguments.get('max_depth', 3)
-        result = analyze_directory(path, max_depth)
-        return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+        page_size = arguments.get('page_size')
+        collapse_threshold = arguments.get('collapse_threshold')
+        result = analyze_directory(
+            path, max_depth, respect_gitignore,
+            page_size=int(page_size) if page_size is not None else None,
+            cursor=arguments.get('cursor'),
+            collapse_threshold=int(collapse_threshold) if collapse_threshold is not None else None,
+            summary=arguments.get('summary', False),
+            top_k=int(arguments.get('top_k', 10)),
+            sort_by=arguments.get('sort_by', 'bytes'),
+            time_budget=arguments.get('time_budget'),
+        )
+        return [TextContent(type="text", text=encode_result(result, arguments.get('output_format')))]
 
     elif name == "count_lines":
         by_language = arguments.get('by_language', True)
-        result = count_lines(path, by_language)
-        return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+        skip_binary = arguments.get('skip_binary', True)
+        max_file_size = arguments.get('max_file_size')
+        use_cache = arguments.get('use_cache', True)
+        workers = int(arguments.get('workers', 1))
+        batch_size = int(arguments.get('batch_size', COUNT_BATCH_SIZE))
+        result = count_lines(
+            path, by_language, respect_gitignore, skip_binary, max_file_size,
+            use_cache, workers, batch_size, arguments.get('time_budget'),
+        )
+        return [TextContent(type="text", text=encode_result(result, arguments.get('output_format')))]
 
     elif name == "list_dependencies":
-        result = list_dependencies(path)
-        return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+        result = list_dependencies(
+            path, arguments.get('recursive', False), respect_gitignore,
+            int(arguments.get('page_size', DEPENDENCY_PAGE_SIZE)), arguments.get('cursor'),
+            int(arguments.get('workers', 1)),
+        )
+        return [TextContent(type="text", text=encode_result(result, arguments.get('output_format')))]
 
     else:
         raise ValueError(f"Unknown tool: {name}")
@@ -5,15 +5,29 @@ Project Analyzer MCP Server 测试
 运行方式: python test.py
 """
 
+import asyncio
+import contextvars
 import json
 import os
 import sys
+import tempfile
+import threading
+import time
 from pathlib import Path
 
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from server import analyze_directory, count_lines, list_dependencies
+# 缓存写入临时目录，需在导入服务器前配置
+os.environ.setdefault('PROJECT_ANALYZER_CACHE_DIR', tempfile.mkdtemp(prefix='project-analyzer-cache-'))
+
+import server
+from manifests import parse_manifest
+from mcp_common import executor
+from mcp_common.encoding import OUTPUT_FORMATS, encode_result, from_columnar
+from mcp_common.progress import Progress, use_progress
+from mcp_common.watcher import TreeWatcher
+from server import analyze_directory, count_file_lines, count_lines, list_dependencies
 
 # 颜色输出
 class Colors:
@@ -55,7 +69,7 @@ def run_tests():
 
     for test in tests:
         try:
-            result = test.fn()
+            result = test['fn']()
 
             # 验证结果
             if isinstance(result, dict):
@@ -82,6 +96,531 @@ def run_tests():
             log(test['name'], 'FAIL', str(e))
             failed += 1
 
+    # 额外测试：忽略目录在遍历时被剪枝
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'src').mkdir()
+            (Path(tmpdir) / 'src' / 'main.py').write_text('a = 1\nb = 2\n')
+            (Path(tmpdir) / 'node_modules' / 'pkg').mkdir(parents=True)
+            (Path(tmpdir) / 'node_modules' / 'pkg' / 'index.js').write_text('x\n')
+            (Path(tmpdir) / 'src' / 'vendor.min.js').write_text('x\n')
+            (Path(tmpdir) / 'src' / 'data.json').write_bytes(b'{}\n\x00\x00\n')
+            (Path(tmpdir) / '.gitignore').write_text('/out/\n')
+            (Path(tmpdir) / 'out').mkdir()
+            (Path(tmpdir) / 'out' / 'bundle.js').write_text('x\ny\n')
+            result = count_lines(tmpdir)
+            tree = analyze_directory(tmpdir)
+        names = [e['name'] for e in tree.get('entries', [])]
+        if result.get('total_files') != 1 or result.get('total_lines') != 2:
+            raise ValueError(f'统计结果不正确: {result}')
+        if result['skipped'].get('extension') != 1 or result['skipped'].get('binary') != 1:
+            raise ValueError(f'二进制文件跳过统计不正确: {result["skipped"]}')
+        if names != ['src']:
+            raise ValueError(f'目录树未剪枝忽略目录: {names}')
+        log('忽略目录剪枝', 'PASS', '跳过 node_modules、.gitignore 中的目录和二进制文件')
+        passed += 1
+    except Exception as e:
+        log('忽略目录剪枝', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：分页返回目录结构与折叠大目录
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ('a', 'b/c', 'b/d', 'e'):
+                (Path(tmpdir) / name).mkdir(parents=True)
+                (Path(tmpdir) / name / 'x.py').write_text('x = 1\n')
+            for i in range(5):
+                (Path(tmpdir) / 'e' / f'f{i}.js').write_text('run();\n')
+            full = analyze_directory(tmpdir, page_size=1000)
+            paths = []
+            cursor = None
+            pages = 0
+            while True:
+                page = analyze_directory(tmpdir, page_size=3, cursor=cursor)
+                paths += [e['path'] for e in page['entries']]
+                pages += 1
+                cursor = page['next_cursor']
+                if cursor is None:
+                    break
+            collapsed = analyze_directory(tmpdir, collapse_threshold=3)
+            invalid = analyze_directory(tmpdir, cursor='not-a-cursor')
+        if full['next_cursor'] is not None or paths != [e['path'] for e in full['entries']]:
+            raise ValueError(f'分页结果与完整结果不一致: {paths}')
+        if paths[:4] != ['a', 'a/x.py', 'b', 'b/c']:
+            raise ValueError(f'条目顺序不正确: {paths}')
+        summary = [e for e in collapsed['entries'] if e['name'] == 'e'][0]
+        if not summary.get('collapsed') or summary['files'] != 6 or summary['languages'] != {'JavaScript': 5, 'Python': 1}:
+            raise ValueError(f'折叠节点不正确: {summary}')
+        if 'error' not in invalid:
+            raise ValueError('无效的 cursor 未返回错误')
+        log('分页目录结构', 'PASS', f'{len(paths)} 个条目分 {pages} 页返回')
+        passed += 1
+    except Exception as e:
+        log('分页目录结构', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：汇总模式的递归总计与按目录 mtime 失效的缓存
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / 'src' / 'core').mkdir(parents=True)
+            (root / 'docs').mkdir()
+            (root / 'src' / 'core' / 'a.py').write_text('a = 1\nb = 2\n')
+            (root / 'src' / 'b.js').write_text('run();\n')
+            (root / 'docs' / 'guide.md').write_text('# Guide\n' * 100)
+            (root / 'README').write_text('readme\n')
+            first = analyze_directory(tmpdir, summary=True, top_k=2)
+            second = analyze_directory(tmpdir, summary=True, top_k=2, sort_by='lines')
+            (root / 'src' / 'core' / 'c.py').write_text('c = 3\n')
+            third = analyze_directory(tmpdir, summary=True)
+        if first['summary']['files'] != 4 or first['summary']['lines'] != 103:
+            raise ValueError(f'根目录总计不正确: {first["summary"]}')
+        if [e['path'] for e in first['top']] != ['docs', 'src']:
+            raise ValueError(f'按字节排名不正确: {first["top"]}')
+        if second['cache'] != {'hits': 4, 'misses': 0}:
+            raise ValueError(f'未复用汇总缓存: {second["cache"]}')
+        src = [e for e in third['top'] if e['path'] == 'src'][0]
+        if third['cache']['misses'] != 1 or src['files'] != 3 or src['languages'] != {'Python': 3, 'JavaScript': 1}:
+            raise ValueError(f'目录变化后汇总不正确: {third}')
+        log('目录汇总', 'PASS', f'缓存 {second["cache"]}')
+        passed += 1
+    except Exception as e:
+        log('目录汇总', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：三个工具共享扫描快照，目录变化后只重新扫描该目录
+    ttl = server.scan_cache.ttl
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir).resolve()
+            (root / 'pkg' / 'sub').mkdir(parents=True)
+            (root / 'pkg' / 'sub' / 'a.py').write_text('a = 1\n')
+            (root / 'requirements.txt').write_text('requests==2.0\n')
+            analyze_directory(tmpdir)
+            snapshot = server.scan_cache.snapshot(str(root))
+            before = snapshot.stats()
+            count_lines(tmpdir, use_cache=False)
+            deps = list_dependencies(tmpdir)
+            shared = snapshot.stats()
+            (root / 'pkg' / 'sub' / 'b.py').write_text('b = 2\nc = 3\n')
+            result = count_lines(tmpdir, use_cache=False)
+            after = snapshot.stats()
+            server.scan_cache.ttl = 0
+            fresh = server.scan_cache.snapshot(str(root))
+        server.scan_cache.ttl = ttl
+        if shared['misses'] != before['misses'] or deps['dependency_managers'] != ['pip']:
+            raise ValueError(f'未复用快照: {before} -> {shared}')
+        if after['misses'] - shared['misses'] != 1 or result['total_lines'] != 3:
+            raise ValueError(f'目录变化后结果不正确: {after}, {result}')
+        if fresh is snapshot:
+            raise ValueError('过期的快照未被丢弃')
+        log('共享扫描快照', 'PASS', f'快照统计 {after}')
+        passed += 1
+    except Exception as e:
+        server.scan_cache.ttl = ttl
+        log('共享扫描快照', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：监视器主动失效快照，原地修改的文件同样会反映到汇总中
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir).resolve()
+            (root / 'a').mkdir()
+            (root / 'a' / 'x.py').write_text('x = 1\n')
+            server.scan_cache.watcher = TreeWatcher(server.scan_cache.on_change, poll_interval=0.1)
+            first = analyze_directory(tmpdir, summary=True)
+            trusted = server.scan_cache.snapshot(str(root)).trusted
+            (root / 'a' / 'x.py').write_text('x = 1\ny = 2\nz = 3\n')
+            deadline = time.monotonic() + 5
+            while True:
+                second = analyze_directory(tmpdir, summary=True)
+                if second['summary']['lines'] == 3 or time.monotonic() > deadline:
+                    break
+                time.sleep(0.1)
+        if not trusted or first['summary']['lines'] != 1 or second['summary']['lines'] != 3:
+            raise ValueError(f'快照未被失效: {first["summary"]} -> {second["summary"]}')
+        if second['cache'] != {'hits': 1, 'misses': 1}:
+            raise ValueError(f'只应重新统计变化的目录: {second["cache"]}')
+        log('监视器失效快照', 'PASS', f'{server.scan_cache.watcher.backend} 后端')
+        passed += 1
+    except Exception as e:
+        log('监视器失效快照', 'FAIL', str(e))
+        failed += 1
+    finally:
+        if server.scan_cache.watcher is not None:
+            server.scan_cache.watcher.stop()
+            server.scan_cache.watcher = None
+        server.scan_cache.invalidate()
+
+    # 额外测试：清单和锁文件解析（带版本），锁文件按文件指纹缓存
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / 'package.json').write_text(json.dumps({
+                'dependencies': {'react': '^18.0.0'}, 'devDependencies': {'jest': '^29.0.0'},
+            }))
+            (root / 'yarn.lock').write_text(
+                '# yarn lockfile v1\n\n'
+                '"@babel/core@^7.0.0", "@babel/core@^7.1.0":\n  version "7.22.0"\n  dependencies:\n    ms "^2.0.0"\n\n'
+                'react@^18.0.0:\n  version "18.2.0"\n'
+            )
+            (root / 'go.mod').write_text(
+                'module example.com/x\n\nrequire (\n\tgithub.com/a/b v1.2.3\n\tgolang.org/x/sys v0.1.0 // indirect\n)\n'
+            )
+            (root / 'Cargo.toml').write_text(
+                '[dependencies]\nserde = { version = "1.0", features = ["derive"] }\n\n[dev-dependencies]\nrand = "0.8"\n'
+            )
+            (root / 'requirements.txt').write_text(
+                'requests[socks]>=2.0 ; python_version >= "3.8"\n'
+                'git+https://github.com/o/r.git@v1\n'
+                'git+https://github.com/o/tool.git@main#egg=tool\n'
+                'https://example.com/dist/pkg-1.0-py3-none-any.whl\n'
+                './vendor/local-1.0.tar.gz\n'
+                '-e git+https://github.com/o/dev.git#egg=devpkg\n'
+                '-e .\n'
+                'flask @ https://example.com/flask.zip\n'
+            )
+            result = list_dependencies(tmpdir)
+            cached = parse_manifest(str(root.resolve() / 'yarn.lock'))
+            again = parse_manifest(str(root.resolve() / 'yarn.lock'))
+        npm = result['dependencies']['npm']['dependencies']
+        if npm != [
+            {'name': 'react', 'version': '^18.0.0', 'scope': 'dependencies'},
+            {'name': 'jest', 'version': '^29.0.0', 'scope': 'devDependencies'},
+        ]:
+            raise ValueError(f'package.json 解析不正确: {npm}')
+        yarn = result['lockfiles']['yarn.lock']['dependencies']
+        if yarn != [{'name': '@babel/core', 'version': '7.22.0'}, {'name': 'react', 'version': '18.2.0'}]:
+            raise ValueError(f'yarn.lock 解析不正确: {yarn}')
+        go = result['dependencies']['Go Modules']['dependencies']
+        if [dep['scope'] for dep in go] != ['require', 'indirect'] or go[0]['version'] != 'v1.2.3':
+            raise ValueError(f'go.mod 解析不正确: {go}')
+        pip = [(dep['name'], dep['version']) for dep in result['dependencies']['pip']['dependencies']]
+        if pip != [
+            ('requests', '>=2.0'),
+            ('tool', 'git+https://github.com/o/tool.git@main'),
+            ('devpkg', 'git+https://github.com/o/dev.git'),
+            ('flask', 'https://example.com/flask.zip'),
+        ]:
+            raise ValueError(f'requirements.txt 解析不正确: {pip}')
+        cargo = result['dependencies']['Cargo']['dependencies']
+        if [(dep['name'], dep['version']) for dep in cargo] != [('serde', '1.0'), ('rand', '0.8')]:
+            raise ValueError(f'Cargo.toml 解析不正确: {cargo}')
+        if cached is not again:
+            raise ValueError('未变化的锁文件被重复解析')
+        log('依赖清单解析', 'PASS', f'包管理器: {", ".join(result["dependency_managers"])}')
+        passed += 1
+    except Exception as e:
+        log('依赖清单解析', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：顶层不是对象的 JSON 清单只报告该文件的错误，其余文件照常解析
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / 'package.json').write_text('[]')
+            (root / 'composer.json').write_text('"monolog/monolog"')
+            (root / 'package-lock.json').write_text('{"dependencies": []}')
+            (root / 'requirements.txt').write_text('requests==2.0\n')
+            flat = list_dependencies(tmpdir)
+            (root / 'web').mkdir()
+            (root / 'web' / 'package.json').write_text('{"dependencies": {"react": "^18.0.0"}}')
+            nested = list_dependencies(tmpdir, recursive=True, workers=2)
+        if sorted(flat.get('errors', {})) != ['composer.json', 'package.json']:
+            raise ValueError(f'错误未按文件报告: {flat.get("errors")}')
+        if flat['dependency_managers'] != ['pip']:
+            raise ValueError(f'其余清单未解析: {flat}')
+        if sorted(nested.get('errors', {})) != ['composer.json', 'package.json'] or nested['manifests'] != 2:
+            raise ValueError(f'并行解析的错误处理不正确: {nested}')
+        log('非对象 JSON 清单', 'PASS', f'{len(flat["errors"])} 个文件报告错误')
+        passed += 1
+    except Exception as e:
+        log('非对象 JSON 清单', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：respect_gitignore 只作用于递归发现，根目录中被忽略的锁文件仍然列出
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / '.gitignore').write_text('package-lock.json\n')
+            (root / 'package.json').write_text('{"dependencies": {"react": "^18.0.0"}}')
+            (root / 'package-lock.json').write_text(json.dumps({
+                'lockfileVersion': 3,
+                'packages': {'': {}, 'node_modules/react': {'version': '18.2.0'}},
+            }))
+            flat = list_dependencies(tmpdir)
+            nested = list_dependencies(tmpdir, recursive=True)
+            unfiltered = list_dependencies(tmpdir, recursive=True, respect_gitignore=False)
+        if list(flat.get('lockfiles', {})) != ['package-lock.json']:
+            raise ValueError(f'被忽略的根目录锁文件未列出: {flat}')
+        if nested['workspaces'][0]['files'] != {'package.json': 1}:
+            raise ValueError(f'递归时未跳过被忽略的锁文件: {nested["workspaces"]}')
+        if unfiltered['workspaces'][0]['files'] != {'package-lock.json': 1, 'package.json': 1}:
+            raise ValueError(f'关闭 respect_gitignore 后结果不正确: {unfiltered["workspaces"]}')
+        log('被忽略的根目录锁文件', 'PASS', '非递归时列出，递归时按 .gitignore 跳过')
+        passed += 1
+    except Exception as e:
+        log('被忽略的根目录锁文件', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：递归发现 monorepo 中的清单文件，按包去重并分页返回
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            for i in range(5):
+                workspace = root / 'packages' / f'p{i}'
+                workspace.mkdir(parents=True)
+                (workspace / 'package.json').write_text(json.dumps({
+                    'dependencies': {'react': f'^18.{i % 2}.0', f'lib{i}': '1.0.0'},
+                }))
+            (root / 'node_modules' / 'x').mkdir(parents=True)
+            (root / 'node_modules' / 'x' / 'package.json').write_text('{"dependencies": {"ignored": "1"}}')
+            (root / 'svc').mkdir()
+            (root / 'svc' / 'go.mod').write_text('module x\n\nrequire github.com/a/b v1.0.0\n')
+            packages = []
+            cursor = None
+            pages = 0
+            while True:
+                result = list_dependencies(tmpdir, recursive=True, page_size=3, cursor=cursor)
+                packages += result['packages']
+                pages += 1
+                cursor = result['next_cursor']
+                if cursor is None:
+                    break
+            parallel = list_dependencies(tmpdir, recursive=True, workers=2)
+            flat = list_dependencies(str(root / 'packages' / 'p0'), page_size=1)
+            rest = list_dependencies(str(root / 'packages' / 'p0'), page_size=1, cursor=flat['next_cursor'])
+        names = [package['name'] for package in packages]
+        if names != ['github.com/a/b', 'lib0', 'lib1', 'lib2', 'lib3', 'lib4', 'react'] or pages != 3:
+            raise ValueError(f'分页结果不正确: {names}')
+        react = packages[-1]
+        if react['versions'] != ['^18.0.0', '^18.1.0'] or len(react['workspaces']) != 5:
+            raise ValueError(f'依赖图不正确: {react}')
+        if result['manifests'] != 6 or parallel['packages'] != packages:
+            raise ValueError(f'并行解析结果不一致: {parallel["manifests"]}')
+        if [dep['name'] for dep in flat['dependencies']['npm']['dependencies'] + rest['dependencies']['npm']['dependencies']] != ['react', 'lib0'] or rest['next_cursor'] is not None:
+            raise ValueError(f'非递归分页不正确: {flat}, {rest}')
+        log('monorepo 依赖图', 'PASS', f'{result["manifests"]} 个清单文件，{len(packages)} 个包分 {pages} 页返回')
+        passed += 1
+    except Exception as e:
+        log('monorepo 依赖图', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：紧凑和列式输出编码与默认输出等价
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / 'src').mkdir()
+            for i in range(3):
+                (root / 'src' / f'm{i}.py').write_text('x = 1\n')
+            result = analyze_directory(tmpdir, page_size=100)
+        pretty = encode_result(result)
+        compact = encode_result(result, 'compact')
+        columnar = encode_result(result, 'columnar')
+        if pretty != json.dumps(result, indent=2, ensure_ascii=False) or json.loads(compact) != result:
+            raise ValueError('pretty/compact 输出与原始结果不一致')
+        table = json.loads(columnar)['entries']
+        if table['columns'][:3] != ['path', 'depth', 'name'] or len(table['rows']) != len(result['entries']):
+            raise ValueError(f'列式编码不正确: {table}')
+        expanded = from_columnar(json.loads(columnar))['entries']
+        if [{k: v for k, v in entry.items() if v is not None} for entry in expanded] != result['entries']:
+            raise ValueError('列式编码无法还原')
+        try:
+            encode_result(result, 'yaml')
+            raise AssertionError('未知格式未报错')
+        except ValueError:
+            pass
+        log('输出编码', 'PASS', f'pretty {len(pretty)} / compact {len(compact)} / columnar {len(columnar)} 字节')
+        passed += 1
+    except Exception as e:
+        log('输出编码', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：工具调用在线程池中执行，被取消的调用在遍历中途中止
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(3):
+                (Path(tmpdir) / f'pkg{i}').mkdir()
+                (Path(tmpdir) / f'pkg{i}' / 'a.py').write_text('a = 1\n')
+            response = asyncio.run(server.call_tool('count_lines', {'path': tmpdir, 'use_cache': False}))
+            cancelled = threading.Event()
+            cancelled.set()
+            aborted = []
+            for fn in (
+                lambda: count_lines(tmpdir, use_cache=False),
+                lambda: analyze_directory(tmpdir, summary=True),
+                lambda: list_dependencies(tmpdir, recursive=True),
+            ):
+                context = contextvars.copy_context()
+                context.run(executor._cancel_event.set, cancelled)
+                try:
+                    context.run(fn)
+                except executor.ToolCancelled:
+                    aborted.append(True)
+        if json.loads(response[0].text)['total_lines'] != 3:
+            raise ValueError(f'call_tool 结果不正确: {response[0].text}')
+        if len(aborted) != 3:
+            raise ValueError(f'只有 {len(aborted)} 个工具响应了取消')
+        log('线程池执行与取消', 'PASS', '三个工具均在遍历中响应取消')
+        passed += 1
+    except Exception as e:
+        log('线程池执行与取消', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：进度通知、分页条目的流式返回和时间预算
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(4):
+                sub = Path(tmpdir) / f'pkg{i}'
+                sub.mkdir()
+                (sub / 'mod.py').write_text('a = 1\nb = 2\n')
+            updates, partials = [], []
+
+            def with_progress():
+                progress = Progress(send=lambda *args: updates.append(args), stream=partials.extend, interval=0)
+                use_progress(progress)
+                counted = count_lines(tmpdir, use_cache=False, time_budget=60)
+                page = analyze_directory(tmpdir, page_size=3, time_budget=60)
+                progress.flush()
+                return counted, page
+
+            counted, page = contextvars.copy_context().run(with_progress)
+            if counted['truncated_by_deadline'] or counted['total_lines'] != 8:
+                raise ValueError(f'行数统计不正确: {counted}')
+            if page['truncated_by_deadline'] or partials != page['entries'] or not page['next_cursor']:
+                raise ValueError(f'流式条目不正确: {partials}, {page}')
+            if not any(total == 4 for _, total, _ in updates):
+                raise ValueError(f'进度通知缺少总数: {updates}')
+            expired = [
+                count_lines(tmpdir, use_cache=False, time_budget=1e-9),
+                analyze_directory(tmpdir, page_size=3, time_budget=1e-9),
+                analyze_directory(tmpdir, summary=True, time_budget=1e-9),
+                analyze_directory(tmpdir, time_budget=1e-9),
+            ]
+            if not all(result['truncated_by_deadline'] for result in expired):
+                raise ValueError(f'时间预算未生效: {expired}')
+            # 超时的分页结果仍可从 next_cursor 继续
+            rest = analyze_directory(tmpdir, page_size=100, cursor=expired[1]['next_cursor'])
+            if len(expired[1]['entries']) + len(rest['entries']) != len(analyze_directory(tmpdir, page_size=100)['entries']):
+                raise ValueError(f'超时后续页不完整: {expired[1]}, {rest}')
+        log('进度与时间预算', 'PASS', f'{len(updates)} 次进度通知，流式返回 {len(partials)} 个条目')
+        passed += 1
+    except Exception as e:
+        log('进度与时间预算', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：增量缓存只重新统计变化的文件
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'a.py').write_text('1\n2\n')
+            (Path(tmpdir) / 'b.py').write_text('1\n')
+            first = count_lines(tmpdir)
+            second = count_lines(tmpdir)
+            (Path(tmpdir) / 'b.py').write_text('1\n2\n3\n')
+            third = count_lines(tmpdir)
+        if first['cache'] != {'hits': 0, 'misses': 2} or second['cache'] != {'hits': 2, 'misses': 0}:
+            raise ValueError(f'缓存命中统计不正确: {first["cache"]}, {second["cache"]}')
+        if third['cache'] != {'hits': 1, 'misses': 1} or third['total_lines'] != 5:
+            raise ValueError(f'文件变化后统计不正确: {third}')
+        log('增量行数缓存', 'PASS', f'第二次调用命中 {second["cache"]["hits"]} 个文件')
+        passed += 1
+    except Exception as e:
+        log('增量行数缓存', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：提前结束或按大小跳过的统计不会删除未访问文件的缓存记录
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'a.py').write_text('1\n')
+            (Path(tmpdir) / 'b.py').write_text('1\n2\n')
+            (Path(tmpdir) / 'big.py').write_text('x = 1\n' * 100)
+            first = count_lines(tmpdir)
+            truncated = count_lines(tmpdir, time_budget=1e-9)
+            small = count_lines(tmpdir, max_file_size=100)
+            last = count_lines(tmpdir)
+        if not truncated['truncated_by_deadline'] or small['skipped']['size'] != 1:
+            raise ValueError(f'前置条件不成立: {truncated}, {small}')
+        if first['cache']['misses'] != 3 or last['cache'] != {'hits': 3, 'misses': 0}:
+            raise ValueError(f'缓存记录被删除: {last["cache"]}')
+        log('缓存保留未访问的文件', 'PASS', f'最后一次调用命中 {last["cache"]["hits"]} 个文件')
+        passed += 1
+    except Exception as e:
+        log('缓存保留未访问的文件', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：快照建立后被删除的文件直接跳过
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / 'a.py').write_text('a = 1\n')
+            (Path(tmpdir) / 'b.py').write_text('b = 1\n')
+            count_lines(tmpdir)
+            # 保持目录 mtime 不变，快照不会重新扫描，仍然列出已删除的文件
+            st = os.stat(tmpdir)
+            (Path(tmpdir) / 'b.py').unlink()
+            os.utime(tmpdir, ns=(st.st_atime_ns, st.st_mtime_ns))
+            sequential = count_lines(tmpdir, use_cache=False)
+            parallel = count_lines(tmpdir, use_cache=False, workers=2)
+        for result in (sequential, parallel):
+            if result.get('total_files') != 1 or result.get('total_lines') != 1:
+                raise ValueError(f'结果不正确: {result}')
+        log('快照中已删除的文件', 'PASS', '顺序和并行统计都跳过已删除的文件')
+        passed += 1
+    except Exception as e:
+        log('快照中已删除的文件', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：块计数与逐行迭代结果一致
+    try:
+        samples = [
+            b'', b'a', b'a\n', b'a\nb', b'a\r\nb\r\n', b'a\rb\rc', b'\r\n\r\n',
+            b'x\r', b'\xff\xfe\n\xc3\n', b'a\r' + b'\nb',
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sample_file = Path(tmpdir) / 'sample.txt'
+            # 使用很小的块，覆盖 \r\n 跨块边界的情况
+            block_size = server.LINE_COUNT_BLOCK
+            server.LINE_COUNT_BLOCK = 2
+            try:
+                for data in samples:
+                    sample_file.write_bytes(data)
+                    with open(sample_file, 'r', encoding='utf-8', errors='ignore') as f:
+                        expected = sum(1 for _ in f)
+                    actual = count_file_lines(str(sample_file))
+                    if actual != expected:
+                        raise ValueError(f'{data!r}: 期望 {expected}，实际 {actual}')
+            finally:
+                server.LINE_COUNT_BLOCK = block_size
+        log('块计数兼容性', 'PASS', f'{len(samples)} 个样例与逐行迭代一致')
+        passed += 1
+    except Exception as e:
+        log('块计数兼容性', 'FAIL', str(e))
+        failed += 1
+
+    # 额外测试：进程池并行统计与顺序统计结果一致
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for i in range(12):
+                package = Path(tmpdir) / f'pkg{i % 3}'
+                package.mkdir(exist_ok=True)
+                (package / f'm{i}.py').write_text('# c\n\nx = 1\n' * (i + 1))
+                (package / f'm{i}.js').write_text('// c\nrun();\n' * (i + 1))
+            (Path(tmpdir) / 'blob.json').write_bytes(b'\x00\x01')
+            sequential = count_lines(tmpdir, use_cache=False)
+            parallel = count_lines(tmpdir, workers=3, batch_size=4)
+            cached = count_lines(tmpdir, workers=3, batch_size=4)
+            response = asyncio.run(server.call_tool('count_lines', {'path': tmpdir, 'workers': 2, 'use_cache': False}))
+        if parallel['by_language'] != sequential['by_language'] or parallel['skipped'] != sequential['skipped']:
+            raise ValueError(f'并行结果与顺序结果不一致: {parallel}, {sequential}')
+        if cached['cache']['hits'] != 25 or cached['by_language'] != sequential['by_language']:
+            raise ValueError(f'并行统计未写入缓存: {cached["cache"]}')
+        if json.loads(response[0].text)['by_language'] != sequential['by_language']:
+            raise ValueError(f'工具调用结果不正确: {response[0].text}')
+        log('并行行数统计', 'PASS', f'{parallel["total_files"]} 个文件，3 个进程')
+        passed += 1
+    except Exception as e:
+        log('并行行数统计', 'FAIL', str(e))
+        failed += 1
+
     # 额外测试：测试不存在的路径
     try:
         result = analyze_directory('/nonexistent/path/12345')
@@ -100,5 +639,72 @@ def run_tests():
     sys.exit(0 if failed == 0 else 1)
 
 
+def run_benchmarks():
+    """对比逐行迭代与块计数在大型生成目录上的耗时（python test.py --bench）"""
+    print('\n=== 行数统计基准测试 ===\n')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        line = 'def handler(request):  # a typical line of source code\n'
+        for i in range(40):
+            package = Path(tmpdir) / f'pkg{i}'
+            package.mkdir()
+            for j in range(25):
+                (package / f'module{j}.py').write_text(line * 5000)
+        files = [str(p) for p in Path(tmpdir).rglob('*.py')]
+        size_mb = sum(os.path.getsize(p) for p in files) / 1024 / 1024
+
+        def legacy():
+            total = 0
+            for file_path in files:
+                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    total += sum(1 for _ in f)
+            return total
+
+        def blocks():
+            return sum(count_file_lines(file_path) for file_path in files)
+
+        timings = {}
+        for name, fn in [('逐行迭代（原实现）', legacy), ('块计数', blocks)]:
+            start = time.perf_counter()
+            total = fn()
+            timings[name] = time.perf_counter() - start
+            print(f'  {name}: {timings[name] * 1000:8.1f} ms  ({len(files)} 个文件, {size_mb:.0f} MB, {total} 行)')
+        print(f'  加速比: {timings["逐行迭代（原实现）"] / timings["块计数"]:.1f}x')
+
+        workers = max(2, min(os.cpu_count() or 1, 8))
+        for label, kwargs in [('count_lines 顺序', {}), (f'count_lines {workers} 进程', {'workers': workers})]:
+            start = time.perf_counter()
+            result = count_lines(tmpdir, use_cache=False, **kwargs)
+            elapsed = time.perf_counter() - start
+            print(f'  {label}: {elapsed * 1000:8.1f} ms  ({result["total_files"]} 个文件, {result["total_lines"]} 行)')
+
+    print('\n=== 输出编码基准测试 ===\n')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for i in range(100):
+            package = Path(tmpdir) / f'package_{i}' / 'src'
+            package.mkdir(parents=True)
+            for j in range(100):
+                (package / f'module_{j}.py').write_text('x = 1\n')
+        results = [
+            ('目录树（嵌套）', analyze_directory(tmpdir, max_depth=5)),
+            ('目录条目（分页的扁平列表）', analyze_directory(tmpdir, max_depth=5, page_size=20000)),
+        ]
+        for label, result in results:
+            print(f'  {label}:')
+            baseline = None
+            for output_format in OUTPUT_FORMATS:
+                start = time.perf_counter()
+                for _ in range(5):
+                    text = encode_result(result, output_format)
+                elapsed = (time.perf_counter() - start) / 5
+                size = len(text.encode('utf-8'))
+                baseline = baseline or size
+                print(f'    {output_format:>8}: {size / 1024:8.0f} KiB ({size / baseline:4.0%})  {elapsed * 1000:6.1f} ms')
+
+
 if __name__ == '__main__':
-    run_tests()
+    if '--bench' in sys.argv:
+        run_benchmarks()
+    else:
+        run_tests()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+GitHub API Response Cache
+
+github_*.py 脚本共享的磁盘 HTTP 缓存
+
+- 响应按 URL 和认证范围（Authorization 的哈希，未认证为 anonymous）存储，不同 token 之间不共享
+- 有缓存时请求带上 If-None-Match / If-Modified-Since 重新验证，304 响应不计入 API 限额，直接使用缓存内容
+- 响应体按内容寻址存储：文件内容（contents API 的 file 响应）以 git blob sha 为键，
+  同一文件在不同分支、不同路径下只存一份；其他响应体以 sha256 为键
+- 缓存总大小超过上限时按最近使用时间淘汰（LRU），不再被引用的内容随之删除；
+  总大小在写入时累计，只有超过上限时才扫描缓存目录，淘汰到上限的 EVICT_TARGET 以下
+- 最近使用的内容同时保存在进程内存中（常驻进程中 304 响应无需读取磁盘）
+
+Environment:
+    GITHUB_API_URL: API 地址，默认 https://api.github.com（GitHub Enterprise 或本地模拟服务器）
+    GITHUB_CACHE_DIR: 缓存目录，默认 ~/.cache/github-code-analyzer
+    GITHUB_CACHE_MAX_BYTES: 缓存大小上限（字节），默认 256MB
+    GITHUB_CACHE_MEMORY_BYTES: 进程内存中缓存的内容大小上限（字节），默认 32MB
+    GITHUB_NO_CACHE: 设为 1 时禁用缓存
+
+Example:
+    from github_cache import fetch_json
+    data = fetch_json(f"{API_URL}/repos/vitejs/vite", headers)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from github_client import GitHubClient, default_client
+
+API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+
+CACHE_DIR = os.environ.get('GITHUB_CACHE_DIR') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'github-code-analyzer'
+)
+CACHE_MAX_BYTES = int(os.environ.get('GITHUB_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+MEMORY_CACHE_BYTES = int(os.environ.get('GITHUB_CACHE_MEMORY_BYTES', 32 * 1024 * 1024))
+
+# 淘汰后保留的大小占上限的比例，避免缓存写满后每次写入都扫描整个目录
+EVICT_TARGET = 0.8
+
+
+def auth_scope(headers: Dict[str, str]) -> str:
+    """
+    请求头对应的认证范围
+
+    Args:
+        headers: 请求头
+
+    Returns:
+        未认证时为 "anonymous"，否则为 Authorization 的哈希（不在磁盘上保存 token）
+    """
+    authorization = headers.get('Authorization')
+    if not authorization:
+        return 'anonymous'
+    return 'auth-' + hashlib.sha256(authorization.encode('utf-8')).hexdigest()[:16]
+
+
+def write_atomic(path: str, data: bytes):
+    """先写入临时文件再替换，并发的脚本不会读到写了一半的文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class HttpCache:
+    """
+    磁盘上的响应缓存
+
+    目录结构：
+        entries/<key>.json  响应记录：URL、认证范围、ETag、Last-Modified 和引用的内容
+        blobs/<id>          响应体内容（git-<sha> 或 sha256-<hex>）
+
+    记录文件的修改时间即最近使用时间。内容按 id 寻址、不会改变，内存中的副本总是有效的。
+    total 是本进程所知的缓存总大小：首次写入时扫描一次目录，之后按每次写入的字节数累计，
+    淘汰时重新扫描校正（其他进程的写入由它们各自的累计值触发淘汰）。
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 memory_bytes: int = MEMORY_CACHE_BYTES):
+        """
+        Args:
+            directory: 缓存目录
+            max_bytes: 缓存大小上限（字节）
+            memory_bytes: 进程内存中缓存的内容大小上限（字节）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.memory_lock = threading.Lock()
+        self.total = None
+        self.total_lock = threading.Lock()
+        self.entries_dir = os.path.join(directory, 'entries')
+        self.blobs_dir = os.path.join(directory, 'blobs')
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+    def entry_path(self, url: str, scope: str) -> str:
+        key = hashlib.sha256(f'{scope} {url}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.entries_dir, key + '.json')
+
+    def load(self, url: str, scope: str) -> Optional[Dict[str, Any]]:
+        """
+        读取响应记录
+
+        Returns:
+            响应记录，不存在或已损坏时为 None
+        """
+        try:
+            with open(self.entry_path(url, scope), 'rb') as f:
+                entry = json.loads(f.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url or entry.get('scope') != scope:
+            return None
+        return entry
+
+    def read(self, entry: Dict[str, Any]) -> Optional[Any]:
+        """
+        还原记录对应的响应数据，并标记为最近使用
+
+        Returns:
+            解析后的 JSON，引用的内容已被删除时为 None
+        """
+        try:
+            data = json.loads(self.get_blob(entry['body']).decode('utf-8'))
+            if entry.get('content'):
+                data['content'] = self.get_blob(entry['content']).decode('utf-8')
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(self.entry_path(entry['url'], entry['scope']))
+        except OSError:
+            pass
+        return data
+
+    def remember(self, blob_id: str, data: bytes):
+        """把内容放入内存，超出上限时淘汰最久未使用的内容"""
+        if len(data) > self.memory_bytes:
+            return
+        with self.memory_lock:
+            if blob_id in self.memory:
+                self.memory.move_to_end(blob_id)
+                return
+            self.memory[blob_id] = data
+            self.memory_used += len(data)
+            while self.memory_used > self.memory_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= len(evicted)
+
+    def get_blob(self, blob_id: str) -> bytes:
+        """
+        读取内容（优先从内存中读取）
+
+        Raises:
+            OSError: 内容已从磁盘删除
+        """
+        with self.memory_lock:
+            data = self.memory.get(blob_id)
+            if data is not None:
+                self.memory.move_to_end(blob_id)
+                return data
+        with open(os.path.join(self.blobs_dir, blob_id), 'rb') as f:
+            data = f.read()
+        self.remember(blob_id, data)
+        return data
+
+    def put_blob(self, blob_id: str, data: bytes) -> int:
+        """
+        写入内容（已存在时跳过，内容寻址保证相同的 id 内容相同）
+
+        Returns:
+            新写入的字节数
+        """
+        path = os.path.join(self.blobs_dir, blob_id)
+        written = 0
+        if not os.path.exists(path):
+            write_atomic(path, data)
+            written = len(data)
+        self.remember(blob_id, data)
+        return written
+
+    def store(self, url: str, scope: str, data: Any, etag: Optional[str], last_modified: Optional[str]):
+        """
+        保存响应
+
+        Args:
+            url: 请求 URL
+            scope: 认证范围
+            data: 解析后的 JSON 响应
+            etag: ETag 响应头
+            last_modified: Last-Modified 响应头
+        """
+        written = 0
+        content_id = None
+        if isinstance(data, dict) and data.get('type') == 'file' and data.get('sha') \
+                and isinstance(data.get('content'), str):
+            # 文件内容按 git blob sha 去重，其余字段（路径、链接等）单独存储
+            content_id = 'git-' + data['sha']
+            written += self.put_blob(content_id, data['content'].encode('utf-8'))
+            data = dict(data, content=None)
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        body_id = 'sha256-' + hashlib.sha256(body).hexdigest()
+        written += self.put_blob(body_id, body)
+
+        entry = {
+            'url': url,
+            'scope': scope,
+            'etag': etag,
+            'last_modified': last_modified,
+            'body': body_id,
+            'content': content_id,
+            'stored_at': time.time(),
+        }
+        path = self.entry_path(url, scope)
+        try:
+            written -= os.path.getsize(path)
+        except OSError:
+            pass
+        record = json.dumps(entry).encode('utf-8')
+        write_atomic(path, record)
+        written += len(record)
+        self.grow(written)
+
+    def grow(self, written: int):
+        """累计写入的字节数，总大小超过上限时淘汰"""
+        with self.total_lock:
+            if self.total is None:
+                # 首次写入：扫描一次得到已有的大小（已包含本次写入）
+                self.total = self.disk_usage()
+            else:
+                self.total += written
+            over = self.total > self.max_bytes
+        if over:
+            self.evict()
+
+    @staticmethod
+    def file_stats(directory: str) -> Dict[str, tuple]:
+        """目录中各文件的 (大小, 修改时间)"""
+        stats = {}
+        with os.scandir(directory) as items:
+            for item in items:
+                try:
+                    st = item.stat()
+                except OSError:
+                    continue
+                stats[item.name] = (st.st_size, st.st_mtime)
+        return stats
+
+    def disk_usage(self) -> int:
+        """扫描缓存目录得到的总大小"""
+        return sum(size for size, _ in self.file_stats(self.blobs_dir).values()) + \
+            sum(size for size, _ in self.file_stats(self.entries_dir).values())
+
+    def evict(self):
+        """
+        缓存总大小超过上限时，从最久未使用的记录开始淘汰到上限的 EVICT_TARGET 以下，
+        并删除不再被引用的内容
+        """
+        blob_sizes = self.file_stats(self.blobs_dir)
+        entry_stats = self.file_stats(self.entries_dir)
+        total = sum(size for size, _ in blob_sizes.values()) + sum(size for size, _ in entry_stats.values())
+        if total <= self.max_bytes:
+            with self.total_lock:
+                self.total = total
+            return
+        target = self.max_bytes * EVICT_TARGET
+
+        entries = []
+        for name, (size, mtime) in entry_stats.items():
+            path = os.path.join(self.entries_dir, name)
+            try:
+                with open(path, 'rb') as f:
+                    entry = json.loads(f.read().decode('utf-8'))
+            except (OSError, ValueError):
+                continue
+            entries.append((mtime, size, path, entry))
+
+        # 从最近使用的记录开始保留，共享的内容只计算一次
+        entries.sort(key=lambda item: item[0], reverse=True)
+        kept_blobs = set()
+        used = 0
+        for index, (_, size, path, entry) in enumerate(entries):
+            blobs = {entry.get('body'), entry.get('content')} - {None} - kept_blobs
+            size += sum(blob_sizes.get(blob_id, (0, 0))[0] for blob_id in blobs)
+            if used + size > target:
+                for _, _, evicted_path, _ in entries[index:]:
+                    try:
+                        os.unlink(evicted_path)
+                    except OSError:
+                        pass
+                break
+            used += size
+            kept_blobs |= blobs
+
+        for blob_id in blob_sizes:
+            if blob_id not in kept_blobs and not blob_id.startswith('.tmp-'):
+                try:
+                    os.unlink(os.path.join(self.blobs_dir, blob_id))
+                except OSError:
+                    pass
+        with self.total_lock:
+            self.total = used
+
+
+_default_cache = None
+
+
+def default_cache() -> Optional[HttpCache]:
+    """按环境变量配置的缓存，禁用或无法创建缓存目录时为 None"""
+    global _default_cache
+    if os.environ.get('GITHUB_NO_CACHE') == '1':
+        return None
+    if _default_cache is None:
+        try:
+            _default_cache = HttpCache()
+        except OSError:
+            return None
+    return _default_cache
+
+
+def fetch_json(
+    url: str,
+    headers: Dict[str, str],
+    timeout: Optional[float] = None,
+    cache: Optional[HttpCache] = None,
+    revalidate: bool = True,
+    client: Optional[GitHubClient] = None
+) -> Any:
+    """
+    GET 请求并解析 JSON 响应，有缓存时用条件请求重新验证
+
+    Args:
+        url: 请求 URL
+        headers: 请求头
+        timeout: 超时时间（秒），None 使用客户端的默认值（GITHUB_TIMEOUT）
+        cache: 使用的缓存，None 使用 default_cache()
+        revalidate: 为 False 时不带条件请求，总是重新下载
+        client: 使用的 HTTP 客户端，None 使用进程内共享的连接池
+
+    Returns:
+        解析后的 JSON
+
+    Raises:
+        urllib.error.HTTPError: API 请求失败（与 urlopen 相同）
+        urllib.error.URLError: 网络错误
+    """
+    if cache is None:
+        cache = default_cache()
+    if client is None:
+        client = default_client()
+    scope = auth_scope(headers)
+    entry = cache.load(url, scope) if cache and revalidate else None
+
+    request_headers = dict(headers)
+    if entry:
+        if entry.get('etag'):
+            request_headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            request_headers['If-Modified-Since'] = entry['last_modified']
+
+    response = client.request('GET', url, request_headers, timeout)
+    if response.status == 304:
+        data = cache.read(entry) if entry else None
+        if data is not None:
+            return data
+        if not entry:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+        # 内容已被其他进程淘汰：不带条件重新请求
+        return fetch_json(url, headers, timeout, cache, revalidate=False, client=client)
+
+    data = json.loads(response.body.decode('utf-8'))
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if cache and (etag or last_modified):
+        cache.store(url, scope, data, etag, last_modified)
+    return data
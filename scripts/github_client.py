@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+GitHub HTTP Client
+
+github_*.py 脚本共享的 HTTP 客户端
+
+- 每个主机维护一个 keep-alive 连接池（http.client），同一进程内的请求复用已建立的 TCP/TLS 连接
+- 请求 gzip 压缩的响应并自动解压
+- 跟随 301/302/303/307/308 重定向（GitHub 对改名和转移的仓库返回 301），跨主机时不转发 Authorization
+- 5xx、连接被重置和二级限流（403/429 带 Retry-After）按退避时间重试
+- 根据 X-RateLimit-Remaining / X-RateLimit-Reset 在额度将尽时放慢请求
+- 错误以 urllib.error.HTTPError / URLError 抛出，与 urlopen 一致
+
+Environment:
+    GITHUB_TIMEOUT: 请求超时（秒），默认 15
+
+Example:
+    from github_client import default_client
+    response = default_client().request("GET", "https://api.github.com/rate_limit", headers)
+"""
+
+import gzip
+import http.client
+import io
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+from typing import Dict, Optional, Tuple
+
+DEFAULT_TIMEOUT = float(os.environ.get('GITHUB_TIMEOUT', 15))
+
+# 每个主机保留的空闲连接数
+MAX_IDLE_CONNECTIONS = 8
+
+# 重试次数和首次重试前的等待时间（秒），之后每次翻倍
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+# 限流时最多等待的时间（秒），需要等待更久时直接返回错误
+MAX_RETRY_WAIT = 60
+
+# 剩余额度低于该值时，把剩余的请求均匀分布到额度重置之前
+RATE_LIMIT_RESERVE = 5
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+# 跟随的重定向状态码和最多跟随的次数
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+
+class Response:
+    """完整读取（并已解压）的响应"""
+
+    def __init__(self, status: int, reason: str, headers: http.client.HTTPMessage, body: bytes):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+
+def rate_limit_resource(path: str) -> str:
+    """请求路径对应的限额类别（搜索 API 的限额独立计算）"""
+    return 'search' if path.startswith('/search/') else 'core'
+
+
+class GitHubClient:
+    """带连接池、重试和限流控制的 HTTP 客户端（线程安全）"""
+
+    def __init__(self, max_idle: int = MAX_IDLE_CONNECTIONS, timeout: float = DEFAULT_TIMEOUT):
+        """
+        Args:
+            max_idle: 每个主机保留的空闲连接数
+            timeout: 默认的请求超时（秒）
+        """
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # (scheme, host, port) -> 空闲连接
+        self.idle = {}
+        # (Authorization, 限额类别) -> (剩余额度, 重置时间)
+        self.limits = {}
+        self.connections_opened = 0
+
+    def acquire(self, key: Tuple[str, str, Optional[int]], timeout: float, fresh: bool = False):
+        """
+        取出一个空闲连接，没有时新建
+
+        Returns:
+            (连接, 是否为复用的连接)
+        """
+        if not fresh:
+            with self.lock:
+                pool = self.idle.get(key)
+                if pool:
+                    conn = pool.pop()
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    return conn, True
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        with self.lock:
+            self.connections_opened += 1
+        return connection_class(host, port, timeout=timeout), False
+
+    def release(self, key: Tuple[str, str, Optional[int]], conn):
+        """归还连接，空闲连接已满时关闭"""
+        with self.lock:
+            pool = self.idle.setdefault(key, [])
+            if len(pool) < self.max_idle:
+                pool.append(conn)
+                return
+        conn.close()
+
+    def send(self, key, method: str, target: str, headers: Dict[str, str], timeout: float) -> Response:
+        """
+        发送一次请求并读取完整响应
+
+        复用的连接可能已被服务器关闭，此时立即换一个新连接重发一次。
+        """
+        for fresh in (False, True):
+            conn, reused = self.acquire(key, timeout, fresh)
+            try:
+                conn.request(method, target, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (ConnectionError, http.client.BadStatusLine):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self.release(key, conn)
+            if (resp.getheader('Content-Encoding') or '').lower() == 'gzip':
+                body = gzip.decompress(body)
+            return Response(resp.status, resp.reason, resp.msg, body)
+
+    def throttle_delay(self, limit_key: Tuple[Optional[str], str]) -> float:
+        """剩余额度不足时，下一次请求前应等待的时间（秒）"""
+        state = self.limits.get(limit_key)
+        if state is None:
+            return 0.0
+        remaining, reset = state
+        wait = reset - time.time()
+        if wait <= 0 or remaining >= RATE_LIMIT_RESERVE:
+            return 0.0
+        delay = wait / (remaining + 1)
+        return delay if delay <= MAX_RETRY_WAIT else 0.0
+
+    def record_limits(self, limit_key: Tuple[Optional[str], str], headers: http.client.HTTPMessage):
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        try:
+            self.limits[limit_key] = (int(remaining), int(reset))
+        except ValueError:
+            pass
+
+    def retry_wait(self, response: Response, attempt: int) -> Optional[float]:
+        """
+        失败的响应在重试前应等待的时间
+
+        Returns:
+            不应重试（或需要等待超过 MAX_RETRY_WAIT）时为 None
+        """
+        if attempt >= MAX_RETRIES:
+            return None
+        if response.status in RETRY_STATUSES:
+            return RETRY_BACKOFF * 2 ** attempt
+        if response.status not in (403, 429):
+            return None
+        retry_after = response.headers.get('Retry-After')
+        try:
+            if retry_after is not None:
+                # 二级限流
+                wait = float(retry_after)
+            elif response.headers.get('X-RateLimit-Remaining') == '0':
+                # 额度用尽，等到重置
+                wait = int(response.headers.get('X-RateLimit-Reset', 0)) - time.time()
+            else:
+                # 没有权限等普通的 403
+                return None
+        except ValueError:
+            return None
+        return max(wait, 0.0) if wait <= MAX_RETRY_WAIT else None
+
+    def request(self, method: str, url: str, headers: Dict[str, str] = None, timeout: float = None) -> Response:
+        """
+        发送请求
+
+        Args:
+            method: HTTP 方法
+            url: 完整 URL
+            headers: 请求头
+            timeout: 超时（秒），None 使用默认值
+
+        Returns:
+            跟随重定向后的 2xx 或 304 响应
+
+        Raises:
+            urllib.error.HTTPError: 重试后仍失败的响应、无法跟随的 3xx 响应或重定向次数过多
+            urllib.error.URLError: 网络错误
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+        limit_key = (headers.get('Authorization'), rate_limit_resource(parts.path))
+        timeout = self.timeout if timeout is None else timeout
+
+        attempt = 0
+        redirects = 0
+        while True:
+            delay = self.throttle_delay(limit_key)
+            if delay:
+                time.sleep(delay)
+            try:
+                response = self.send(key, method, target, headers, timeout)
+            except ConnectionError as e:
+                if attempt >= MAX_RETRIES:
+                    raise urllib.error.URLError(e) from e
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+                attempt += 1
+                continue
+            except (OSError, http.client.HTTPException) as e:
+                raise urllib.error.URLError(e) from e
+
+            self.record_limits(limit_key, response.headers)
+            location = response.headers.get('Location')
+            if response.status in REDIRECT_STATUSES and location and redirects < MAX_REDIRECTS:
+                redirects += 1
+                url = urllib.parse.urljoin(url, location)
+                parts = urllib.parse.urlsplit(url)
+                if (parts.scheme, parts.hostname, parts.port) != key:
+                    # 不把 token 发送给其他主机
+                    headers.pop('Authorization', None)
+                key = (parts.scheme, parts.hostname, parts.port)
+                target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+                continue
+            if response.status < 300 or response.status == 304:
+                return response
+            wait = self.retry_wait(response, attempt)
+            if wait is None:
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.headers, io.BytesIO(response.body)
+                )
+            time.sleep(wait)
+            attempt += 1
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self.lock:
+            pools, self.idle = self.idle, {}
+        for pool in pools.values():
+            for conn in pool:
+                conn.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_client() -> GitHubClient:
+    """进程内共享的客户端"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = GitHubClient()
+        return _default_client
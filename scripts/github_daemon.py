@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+GitHub Analyzer Daemon
+
+常驻进程模式：在一个长期运行的进程中执行 get_repo_info、get_repo_structure、read_file 和 search_code，
+进程内的连接池（已建立的 TLS 连接）和内存缓存在多次调用之间保持有效。
+
+- serve：在本地 Unix socket 上提供服务，每行一个 JSON 请求 {"tool": 工具名, "args": {参数}}，
+  每行一个 JSON 响应 {"result": 结果} 或 {"error": 错误信息}；socket 文件仅当前用户可访问
+- mcp：作为 MCP stdio 服务器运行（需要安装 mcp 包）
+- call：瘦客户端，参数与对应脚本的命令行参数相同；常驻进程运行时只导入 socket 和 json，
+  启动开销最小，没有常驻进程时在当前进程中执行
+- stats：查看正在运行的常驻进程的状态
+
+常驻进程运行时，github_*.py 脚本也会自动把调用转发给它（命令行参数和输出不变），
+连接失败时回退为在当前进程中执行。请求中带有客户端的 SETTINGS 环境变量，与常驻进程启动时的值
+不一致时（例如另一个 GITHUB_API_URL）常驻进程不执行，客户端在当前进程中执行。
+--batch 模式的批量读取总是在当前进程中执行。
+
+Usage:
+    python github_daemon.py serve [--socket PATH]
+    python github_daemon.py mcp
+    python github_daemon.py call <tool> <脚本的命令行参数...> [--socket PATH]
+    python github_daemon.py stats [--socket PATH]
+
+Environment:
+    GITHUB_DAEMON_SOCKET: socket 路径，默认 ~/.cache/github-code-analyzer/daemon.sock
+    GITHUB_NO_DAEMON: 设为 1 时脚本不转发给常驻进程
+
+Example:
+    python github_daemon.py serve &
+    python github_read_file.py vitejs/vite README.md   # 由常驻进程执行
+    python github_daemon.py call read_file vitejs/vite README.md main
+"""
+
+import sys
+import os
+import json
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+DAEMON_SOCKET = os.environ.get('GITHUB_DAEMON_SOCKET') or os.path.join(
+    os.path.expanduser('~'), '.cache', 'github-code-analyzer', 'daemon.sock'
+)
+
+# 客户端等待响应的最长时间（秒），递归目录树和重试可能较慢
+CLIENT_TIMEOUT = 300
+
+# 影响工具结果的环境变量：客户端与常驻进程的值不一致时不转发
+SETTINGS = (
+    'GITHUB_API_URL', 'GITHUB_TIMEOUT', 'GITHUB_NO_CACHE',
+    'GITHUB_CACHE_DIR', 'GITHUB_CACHE_MAX_BYTES', 'GITHUB_CACHE_MEMORY_BYTES',
+)
+
+# call 子命令中各工具的位置参数（与脚本的命令行参数顺序一致）：(参数名, 转换函数, 是否必填)
+CLI_ARGS = {
+    "get_repo_info": [("repo", str, True), ("token", str, False)],
+    "get_repo_structure": [("repo", str, True), ("path", str, False), ("ref", str, False), ("token", str, False)],
+    "read_file": [("repo", str, True), ("path", str, True), ("ref", str, False), ("max_size", int, False),
+                  ("token", str, False)],
+    "search_code": [("repo", str, True), ("query", str, True), ("ref", str, False), ("language", str, False),
+                    ("token", str, False)],
+}
+
+
+def load_tools() -> Dict[str, Callable[..., Any]]:
+    """工具名到实现函数（在常驻进程中导入，脚本作为客户端时不需要）"""
+    from github_get_repo_info import get_repo_info
+    from github_get_repo_structure import get_repo_structure
+    from github_read_file import read_file
+    from github_search_code import search_code
+    return {
+        "get_repo_info": get_repo_info,
+        "get_repo_structure": get_repo_structure,
+        "read_file": read_file,
+        "search_code": search_code,
+    }
+
+
+def current_settings() -> Dict[str, Optional[str]]:
+    """当前进程的 SETTINGS 环境变量（未设置和空值都为 None）"""
+    return {name: os.environ.get(name) or None for name in SETTINGS}
+
+
+def connect(path: str = None) -> Optional[socket.socket]:
+    """
+    连接常驻进程
+
+    Returns:
+        没有运行的常驻进程（或已禁用、平台不支持 Unix socket）时为 None
+    """
+    path = path or DAEMON_SOCKET
+    if os.environ.get('GITHUB_NO_DAEMON') == '1' or not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CLIENT_TIMEOUT)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(sock: socket.socket, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    发送一个请求并读取响应
+
+    Raises:
+        OSError: 连接中断
+        ValueError: 响应不完整
+    """
+    message = {"tool": tool, "args": args, "settings": current_settings()}
+    sock.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8'))
+    with sock.makefile('rb') as f:
+        line = f.readline()
+    if not line:
+        raise ValueError("daemon closed the connection")
+    return json.loads(line.decode('utf-8'))
+
+
+def forward(tool: str, args: Dict[str, Any], path: str = None) -> Optional[Dict[str, Any]]:
+    """
+    把调用转发给常驻进程
+
+    Args:
+        tool: 工具名
+        args: 工具参数
+        path: socket 路径，默认为 DAEMON_SOCKET
+
+    Returns:
+        常驻进程的响应；没有常驻进程、连接中断或环境变量不一致时为 None（应在当前进程中执行）
+    """
+    sock = connect(path)
+    if sock is None:
+        return None
+    try:
+        with sock:
+            response = request(sock, tool, args)
+    except (OSError, ValueError):
+        # 常驻进程已退出或中途断开：工具都是只读的，直接在当前进程中重做
+        return None
+    if "fallback" in response:
+        return None
+    return response
+
+
+def run_tool(tool: str, fn: Callable[..., Any], **kwargs) -> Any:
+    """
+    常驻进程运行时由它执行工具，否则在当前进程中执行 fn(**kwargs)
+
+    Args:
+        tool: 工具名
+        fn: 当前进程中的实现
+        kwargs: 工具参数（需可 JSON 序列化）
+
+    Raises:
+        Exception: 工具执行失败（常驻进程返回的错误信息保持不变）
+    """
+    response = forward(tool, kwargs)
+    if response is None:
+        return fn(**kwargs)
+    if "error" in response:
+        raise Exception(response["error"])
+    return response["result"]
+
+
+def parse_cli(tool: str, argv: list) -> Dict[str, Any]:
+    """
+    按脚本的命令行约定解析 call 子命令的参数
+
+    Raises:
+        ValueError: 未知的工具或缺少必填参数
+    """
+    spec = CLI_ARGS.get(tool)
+    if spec is None:
+        raise ValueError(f"Unknown tool: {tool}. Expected one of: {', '.join(CLI_ARGS)}")
+    argv = list(argv)
+    kwargs = {}
+    if tool == "get_repo_structure":
+        if "--recursive" in argv:
+            argv.remove("--recursive")
+            kwargs["recursive"] = True
+        if "--max-depth" in argv:
+            index = argv.index("--max-depth")
+            kwargs["max_depth"] = int(argv[index + 1]) if index + 1 < len(argv) else None
+            del argv[index:index + 2]
+    for index, (name, convert, required) in enumerate(spec):
+        if index < len(argv):
+            kwargs[name] = convert(argv[index])
+        elif required:
+            raise ValueError(f"Missing argument: {name}")
+    return kwargs
+
+
+def call_cli(tool: str, argv: list, path: str = None):
+    """call 子命令：由 path（默认 DAEMON_SOCKET）上的常驻进程执行，没有常驻进程时在当前进程中执行，输出与脚本相同"""
+    kwargs = parse_cli(tool, argv)
+    response = forward(tool, kwargs, path)
+    if response is None:
+        result = load_tools()[tool](**kwargs)
+    elif "error" in response:
+        raise Exception(response["error"])
+    else:
+        result = response["result"]
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """处理一个客户端连接，连接上可以依次发送多个请求"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                message = json.loads(line.decode('utf-8'))
+                differs = self.server.differing_settings(message.get("settings"))
+                if differs and message["tool"] != "stats":
+                    with self.server.lock:
+                        self.server.fallbacks += 1
+                    response = {"fallback": f"Environment differs from the daemon: {', '.join(differs)}"}
+                else:
+                    response = {"result": self.server.call(message["tool"], message.get("args") or {})}
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """常驻进程的 Unix socket 服务器"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        self.path = path
+        # 工具模块在导入时读取这些环境变量
+        self.settings = current_settings()
+        self.tools = load_tools()
+        self.started = time.time()
+        self.calls = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 仅当前用户可访问（请求中可能带有 token）
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, DaemonHandler)
+        finally:
+            os.umask(umask)
+
+    def differing_settings(self, settings: Optional[Dict[str, Optional[str]]]) -> list:
+        """客户端与常驻进程取值不同的环境变量（旧客户端不发送 settings 时视为一致）"""
+        if settings is None:
+            return []
+        return [name for name in SETTINGS if settings.get(name) != self.settings[name]]
+
+    def call(self, tool: str, args: Dict[str, Any]) -> Any:
+        if tool == "stats":
+            return self.stats()
+        fn = self.tools.get(tool)
+        if fn is None:
+            raise ValueError(f"Unknown tool: {tool}")
+        with self.lock:
+            self.calls += 1
+        try:
+            return fn(**args)
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        from github_client import default_client
+        client = default_client()
+        return {
+            "pid": os.getpid(),
+            "socket": self.path,
+            "uptime": round(time.time() - self.started, 1),
+            "calls": self.calls,
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+            "connections_opened": client.connections_opened,
+            "idle_connections": sum(len(pool) for pool in client.idle.values()),
+        }
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def start_server(path: str = None) -> DaemonServer:
+    """
+    创建常驻进程的服务器
+
+    Raises:
+        Exception: 已有常驻进程在该 socket 上运行
+    """
+    path = path or DAEMON_SOCKET
+    if os.path.exists(path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except OSError:
+            # 上次运行遗留的 socket 文件
+            os.unlink(path)
+        else:
+            raise Exception(f"Daemon already running on {path}")
+        finally:
+            sock.close()
+    return DaemonServer(path)
+
+
+def serve(path: str = None):
+    """在 Unix socket 上运行常驻进程，直到收到 SIGINT/SIGTERM"""
+    import signal
+    server = start_server(path)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(json.dumps({"socket": server.path, "pid": os.getpid()}), file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# MCP 模式下各工具的参数（与脚本的命令行参数一致）
+MCP_TOOLS = {
+    "get_repo_info": ("获取 GitHub 仓库的基本信息（描述、语言、星标数等）", {
+        "repo": {"type": "string", "description": '仓库标识，格式 "owner/repo"'},
+        "token": {"type": "string", "description": "GitHub Personal Access Token"},
+    }, ["repo"]),
+    "get_repo_structure": ("获取 GitHub 仓库的目录结构，recursive 为 true 时一次获取整个目录树", {
+        "repo": {"type": "string", "description": '仓库标识，格式 "owner/repo"'},
+        "path": {"type": "string", "description": "目录路径，默认为根目录"},
+        "ref": {"type": "string", "description": "分支/tag/commit SHA"},
+        "token": {"type": "string", "description": "GitHub Personal Access Token"},
+        "recursive": {"type": "boolean", "description": "通过 Git Trees API 获取 path 下的整个目录树"},
+        "max_depth": {"type": "number", "description": "递归模式下相对于 path 的最大深度"},
+    }, ["repo"]),
+    "read_file": ("读取 GitHub 仓库中单个文件的完整内容", {
+        "repo": {"type": "string", "description": '仓库标识，格式 "owner/repo"'},
+        "path": {"type": "string", "description": "文件路径"},
+        "ref": {"type": "string", "description": "分支/tag/commit SHA"},
+        "max_size": {"type": "number", "description": "最大读取字节数，默认 102400"},
+        "token": {"type": "string", "description": "GitHub Personal Access Token"},
+    }, ["repo", "path"]),
+    "search_code": ("在 GitHub 仓库中搜索匹配关键词的代码", {
+        "repo": {"type": "string", "description": '仓库标识，格式 "owner/repo"'},
+        "query": {"type": "string", "description": "搜索关键词"},
+        "ref": {"type": "string", "description": "限定分支"},
+        "language": {"type": "string", "description": '语言过滤，如 "Python"'},
+        "token": {"type": "string", "description": "GitHub Personal Access Token"},
+    }, ["repo", "query"]),
+}
+
+
+def serve_mcp():
+    """作为 MCP stdio 服务器运行（工具调用在线程中执行，不阻塞事件循环）"""
+    try:
+        import asyncio
+        from mcp.server import Server
+        from mcp.server.stdio import stdio_server
+        from mcp.types import Tool, TextContent
+    except ImportError:
+        raise Exception("MCP mode requires the mcp package: pip install mcp")
+
+    tools = load_tools()
+    server = Server("github-code-analyzer")
+
+    @server.list_tools()
+    async def list_tools():
+        return [
+            Tool(name=name, description=description,
+                 inputSchema={"type": "object", "properties": properties, "required": required})
+            for name, (description, properties, required) in MCP_TOOLS.items()
+        ]
+
+    @server.call_tool()
+    async def call_tool(name: str, arguments: dict):
+        fn = tools.get(name)
+        if fn is None:
+            raise ValueError(f"Unknown tool: {name}")
+        if "max_depth" in arguments:
+            arguments["max_depth"] = int(arguments["max_depth"])
+        if "max_size" in arguments:
+            arguments["max_size"] = int(arguments["max_size"])
+        result = await asyncio.to_thread(fn, **arguments)
+        return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
+
+    async def main():
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, server.create_initialization_options())
+
+    asyncio.run(main())
+
+
+def main():
+    """命令行入口"""
+    args = sys.argv[1:]
+    path = None
+    if "--socket" in args:
+        index = args.index("--socket")
+        path = args[index + 1] if index + 1 < len(args) else None
+        del args[index:index + 2]
+
+    if not args or args[0] not in ("serve", "mcp", "call", "stats") or (args[0] == "call" and len(args) < 2):
+        print("Usage: python github_daemon.py serve [--socket PATH]", file=sys.stderr)
+        print("       python github_daemon.py mcp", file=sys.stderr)
+        print("       python github_daemon.py call <tool> <args...> [--socket PATH]", file=sys.stderr)
+        print("       python github_daemon.py stats [--socket PATH]", file=sys.stderr)
+        print("Example: python github_daemon.py call read_file vitejs/vite README.md main", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args[0] == "serve":
+            serve(path)
+        elif args[0] == "mcp":
+            serve_mcp()
+        elif args[0] == "call":
+            call_cli(args[1], args[2:], path)
+        else:
+            sock = connect(path)
+            if sock is None:
+                raise Exception(f"Daemon not running on {path or DAEMON_SOCKET}")
+            with sock:
+                response = request(sock, "stats", {})
+            print(json.dumps(response.get("result", response), ensure_ascii=False, indent=2))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,10 +18,12 @@ Example:
 
 import sys
 import json
-import urllib.request
 import urllib.error
 from typing import Dict, Any
 
+from github_cache import API_URL, fetch_json
+from github_daemon import run_tool
+
 
 def get_repo_info(repo: str, token: str = None) -> Dict[str, Any]:
     """
@@ -42,7 +44,7 @@ def get_repo_info(repo: str, token: str = None) -> Dict[str, Any]:
         raise ValueError(f"Invalid repo format: {repo}. Expected 'owner/repo'")
 
     # 构建请求 URL
-    url = f"https://api.github.com/repos/{repo}"
+    url = f"{API_URL}/repos/{repo}"
 
     # 设置请求头
     headers = {
@@ -53,33 +55,30 @@ def get_repo_info(repo: str, token: str = None) -> Dict[str, Any]:
     if token:
         headers["Authorization"] = f"token {token}"
 
-    # 创建请求
-    req = urllib.request.Request(url, headers=headers)
-
     try:
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-
-            # 提取关键信息
-            result = {
-                "name": data.get("name"),
-                "full_name": data.get("full_name"),
-                "description": data.get("description"),
-                "language": data.get("language"),
-                "languages_url": data.get("languages_url"),
-                "default_branch": data.get("default_branch"),
-                "stargazers_count": data.get("stargazers_count"),
-                "forks_count": data.get("forks_count"),
-                "open_issues_count": data.get("open_issues_count"),
-                "homepage": data.get("homepage"),
-                "topics": data.get("topics", []),
-                "created_at": data.get("created_at"),
-                "updated_at": data.get("updated_at"),
-                "size": data.get("size"),
-                "license": data.get("license", {}).get("name") if data.get("license") else None
-            }
-
-            return result
+        # 带缓存的条件请求，未变化的响应不计入 API 限额
+        data = fetch_json(url, headers)
+
+        # 提取关键信息
+        result = {
+            "name": data.get("name"),
+            "full_name": data.get("full_name"),
+            "description": data.get("description"),
+            "language": data.get("language"),
+            "languages_url": data.get("languages_url"),
+            "default_branch": data.get("default_branch"),
+            "stargazers_count": data.get("stargazers_count"),
+            "forks_count": data.get("forks_count"),
+            "open_issues_count": data.get("open_issues_count"),
+            "homepage": data.get("homepage"),
+            "topics": data.get("topics", []),
+            "created_at": data.get("created_at"),
+            "updated_at": data.get("updated_at"),
+            "size": data.get("size"),
+            "license": data.get("license", {}).get("name") if data.get("license") else None
+        }
+
+        return result
 
     except urllib.error.HTTPError as e:
         if e.code == 404:
@@ -104,7 +103,7 @@ def main():
     token = sys.argv[2] if len(sys.argv) > 2 else None
 
     try:
-        result = get_repo_info(repo, token)
+        result = run_tool("get_repo_info", get_repo_info, repo=repo, token=token)
         print(json.dumps(result, ensure_ascii=False, indent=2))
     except Exception as e:
         print(json.dumps({"error": str(e)}, ensure_ascii=False), file=sys.stderr)
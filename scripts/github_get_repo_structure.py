@@ -5,27 +5,58 @@ GitHub Repository Structure Fetcher
 获取 GitHub 仓库的目录树结构
 
 Usage:
-    python github_get_repo_structure.py <repo> [path] [ref] [token]
+    python github_get_repo_structure.py <repo> [path] [ref] [token] [--recursive] [--max-depth N]
 
 Args:
     repo: 仓库标识，格式 "owner/repo"
     path: 目录路径，默认为 "/"
     ref: 分支/tag/commit SHA，默认为默认分支
     token: GitHub Personal Access Token (可选)
+    --recursive: 通过 Git Trees API 一次获取 path 下的整个目录树
+    --max-depth: 递归模式下相对于 path 的最大深度（隐含 --recursive）
 
 Example:
     python github_get_repo_structure.py vitejs/vite
     python github_get_repo_structure.py vitejs/vite /src/core main
+    python github_get_repo_structure.py vitejs/vite packages main --max-depth 2
 """
 
 import sys
 import json
-import urllib.request
 import urllib.error
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict, Any, List
 
+from github_cache import API_URL, fetch_json
+from github_daemon import run_tool
 
-def get_repo_structure(repo: str, path: str = "", ref: str = None, token: str = None) -> Dict[str, Any]:
+# 递归响应被截断时，逐个子树获取的并发数
+CRAWL_WORKERS = 8
+
+# Git Trees API 的条目类型
+TREE_ENTRY_TYPES = {"blob": "file", "tree": "dir", "commit": "submodule"}
+
+
+def request_headers(token: str = None) -> Dict[str, str]:
+    """GitHub API 请求头"""
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+        "User-Agent": "github-code-analyzer"
+    }
+
+    if token:
+        headers["Authorization"] = f"token {token}"
+    return headers
+
+
+def get_repo_structure(
+    repo: str,
+    path: str = "",
+    ref: str = None,
+    token: str = None,
+    recursive: bool = False,
+    max_depth: int = None
+) -> Dict[str, Any]:
     """
     获取 GitHub 仓库的目录结构
 
@@ -34,6 +65,8 @@ def get_repo_structure(repo: str, path: str = "", ref: str = None, token: str =
         path: 目录路径，空字符串表示根目录
         ref: 分支/tag/commit SHA
         token: GitHub PAT (可选)
+        recursive: 为 True 时通过 Git Trees API 获取 path 下的整个目录树
+        max_depth: 递归模式下相对于 path 的最大深度，1 表示只列出直接子项
 
     Returns:
         包含目录结构的字典
@@ -42,14 +75,17 @@ def get_repo_structure(repo: str, path: str = "", ref: str = None, token: str =
     if '/' not in repo:
         raise ValueError(f"Invalid repo format: {repo}. Expected 'owner/repo'")
 
+    if recursive or max_depth is not None:
+        return get_repo_tree(repo, path, ref, token, max_depth)
+
     # 规范化路径
     if path == "/":
         path = ""
 
     # 构建 API URL
-    url = f"https://api.github.com/repos/{repo}/contents/{path}"
+    url = f"{API_URL}/repos/{repo}/contents/{path}"
     if path:
-        url = f"https://api.github.com/repos/{repo}/contents/{path}"
+        url = f"{API_URL}/repos/{repo}/contents/{path}"
 
     # 添加查询参数
     query_params = []
@@ -60,57 +96,170 @@ def get_repo_structure(repo: str, path: str = "", ref: str = None, token: str =
         url += "?" + "&".join(query_params)
 
     # 设置请求头
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "User-Agent": "github-code-analyzer"
-    }
+    headers = request_headers(token)
 
-    if token:
-        headers["Authorization"] = f"token {token}"
+    try:
+        # 带缓存的条件请求，未变化的响应不计入 API 限额
+        data = fetch_json(url, headers)
 
-    # 创建请求
-    req = urllib.request.Request(url, headers=headers)
+        # 处理响应
+        if isinstance(data, dict) and data.get("type") == "file":
+            # 单个文件
+            return {
+                "type": "file",
+                "name": data.get("name"),
+                "path": data.get("path"),
+                "size": data.get("size"),
+                "sha": data.get("sha")
+            }
 
-    try:
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-
-            # 处理响应
-            if isinstance(data, dict) and data.get("type") == "file":
-                # 单个文件
-                return {
-                    "type": "file",
-                    "name": data.get("name"),
-                    "path": data.get("path"),
-                    "size": data.get("size"),
-                    "sha": data.get("sha")
+        elif isinstance(data, list):
+            # 目录内容
+            entries = []
+            for item in data:
+                entry = {
+                    "name": item.get("name"),
+                    "type": item.get("type"),  # "file" or "dir"
+                    "path": item.get("path"),
+                    "size": item.get("size", 0)
                 }
+                entries.append(entry)
+
+            return {
+                "type": "dir",
+                "path": path or "/",
+                "entries": entries,
+                "total_count": len(entries)
+            }
 
-            elif isinstance(data, list):
-                # 目录内容
-                entries = []
-                for item in data:
-                    entry = {
-                        "name": item.get("name"),
-                        "type": item.get("type"),  # "file" or "dir"
-                        "path": item.get("path"),
-                        "size": item.get("size", 0)
-                    }
+        else:
+            raise Exception(f"Unexpected response format: {type(data)}")
+
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            error_msg = f"Path not found: {repo}/{path or '/'}"
+        elif e.code == 403:
+            error_msg = f"API rate limit exceeded or access forbidden"
+        else:
+            error_msg = f"HTTP Error {e.code}: {e.reason}"
+        raise Exception(error_msg) from e
+    except urllib.error.URLError as e:
+        raise Exception(f"Network error: {e.reason}") from e
+
+
+def tree_entry(item: Dict[str, Any], base: str = "") -> Dict[str, Any]:
+    """
+    把 Git Trees API 的条目转换为与 contents API 相同的结构
+
+    Args:
+        item: tree 条目（path 相对于所在的 tree）
+        base: 所在 tree 在仓库中的路径
+
+    Returns:
+        {name, type, path, size, sha}
+    """
+    path = f"{base}/{item['path']}" if base else item["path"]
+    return {
+        "name": path.rsplit("/", 1)[-1],
+        "type": TREE_ENTRY_TYPES.get(item.get("type"), item.get("type")),
+        "path": path,
+        "size": item.get("size", 0),
+        "sha": item.get("sha")
+    }
+
+
+def crawl_tree(base_url: str, root_sha: str, prefix: str, max_depth: int, headers: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    并发地逐个子树获取目录树（recursive=1 的响应被截断时使用）
+
+    prefix 下的子树先尝试递归获取，仍被截断时只列出直接子项，再把子目录加入队列；
+    只进入 prefix 的祖先目录和 prefix 下未超过 max_depth 的目录。
+
+    Args:
+        base_url: 仓库的 API 地址
+        root_sha: 根 tree 的 SHA
+        prefix: 路径前缀，空字符串表示根目录
+        max_depth: 相对于 prefix 的最大深度，None 不限制
+        headers: 请求头
+
+    Returns:
+        按路径排序的 tree_entry 列表
+    """
+    # 条目的深度为路径中的层数，保留深度不超过 limit 的条目
+    prefix_depth = prefix.count("/") + 1 if prefix else 0
+    limit = None if max_depth is None else prefix_depth + max_depth
+
+    def related(path: str) -> bool:
+        return not prefix or path == prefix or prefix.startswith(path + "/") or path.startswith(prefix + "/")
+
+    def fetch(sha: str, dir_path: str, recursive: bool):
+        url = f"{base_url}/git/trees/{sha}" + ("?recursive=1" if recursive else "")
+        return sha, dir_path, recursive, fetch_json(url, headers, timeout=30)
+
+    entries = []
+    with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as pool:
+        pending = {pool.submit(fetch, root_sha, "", False)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                sha, dir_path, recursive, data = future.result()
+                if recursive and data.get("truncated"):
+                    pending.add(pool.submit(fetch, sha, dir_path, False))
+                    continue
+                for item in data.get("tree", []):
+                    entry = tree_entry(item, dir_path)
                     entries.append(entry)
+                    path = entry["path"]
+                    depth = path.count("/") + 1
+                    if recursive or item.get("type") != "tree" or not related(path):
+                        continue
+                    if limit is not None and depth >= limit:
+                        continue
+                    # prefix 下的子树不限深度时整体递归获取
+                    whole = limit is None and (not prefix or path == prefix or path.startswith(prefix + "/"))
+                    pending.add(pool.submit(fetch, item["sha"], path, whole))
 
-                return {
-                    "type": "dir",
-                    "path": path or "/",
-                    "entries": entries,
-                    "total_count": len(entries)
-                }
+    entries.sort(key=lambda entry: entry["path"])
+    return entries
+
+
+def get_repo_tree(repo: str, path: str = "", ref: str = None, token: str = None, max_depth: int = None) -> Dict[str, Any]:
+    """
+    通过 Git Trees API 获取整个目录树
+
+    先把 ref 解析为根 tree 的 SHA，再用一次 git/trees/{sha}?recursive=1 请求获取全部条目；
+    响应被截断时回退为并发的逐子树获取（crawl_tree）。path 和 max_depth 在本地过滤。
+
+    Args:
+        repo: 仓库标识 (owner/repo)
+        path: 目录路径，空字符串表示根目录
+        ref: 分支/tag/commit SHA，默认为默认分支
+        token: GitHub PAT (可选)
+        max_depth: 相对于 path 的最大深度，None 不限制
 
-            else:
-                raise Exception(f"Unexpected response format: {type(data)}")
+    Returns:
+        与 get_repo_structure 相同结构的字典，entries 包含所有层级；
+        crawled 表示是否回退为逐子树获取
+    """
+    prefix = path.strip("/")
+    headers = request_headers(token)
+    base_url = f"{API_URL}/repos/{repo}"
+
+    try:
+        # 解析 ref（默认分支为 HEAD）对应的根 tree
+        commit = fetch_json(f"{base_url}/commits/{ref or 'HEAD'}", headers)
+        tree_sha = commit["commit"]["tree"]["sha"]
+
+        data = fetch_json(f"{base_url}/git/trees/{tree_sha}?recursive=1", headers, timeout=30)
+        crawled = bool(data.get("truncated"))
+        if crawled:
+            entries = crawl_tree(base_url, tree_sha, prefix, max_depth, headers)
+        else:
+            entries = sorted((tree_entry(item) for item in data.get("tree", [])), key=lambda entry: entry["path"])
 
     except urllib.error.HTTPError as e:
         if e.code == 404:
-            error_msg = f"Path not found: {repo}/{path or '/'}"
+            error_msg = f"Ref not found: {repo}@{ref or 'HEAD'}"
         elif e.code == 403:
             error_msg = f"API rate limit exceeded or access forbidden"
         else:
@@ -119,22 +268,67 @@ def get_repo_structure(repo: str, path: str = "", ref: str = None, token: str =
     except urllib.error.URLError as e:
         raise Exception(f"Network error: {e.reason}") from e
 
+    if prefix:
+        match = next((entry for entry in entries if entry["path"] == prefix), None)
+        if match is None:
+            raise Exception(f"Path not found: {repo}/{prefix}")
+        if match["type"] != "dir":
+            return {
+                "type": "file",
+                "name": match["name"],
+                "path": match["path"],
+                "size": match["size"],
+                "sha": match["sha"]
+            }
+
+    # 本地过滤：只保留 prefix 下、不超过 max_depth 的条目
+    start = len(prefix) + 1 if prefix else 0
+    selected = []
+    for entry in entries:
+        if prefix and not entry["path"].startswith(prefix + "/"):
+            continue
+        if max_depth is not None and entry["path"][start:].count("/") >= max_depth:
+            continue
+        selected.append({key: value for key, value in entry.items() if key != "sha"})
+
+    return {
+        "type": "dir",
+        "path": prefix or "/",
+        "entries": selected,
+        "total_count": len(selected),
+        "recursive": True,
+        "crawled": crawled
+    }
+
 
 def main():
     """命令行入口"""
-    if len(sys.argv) < 2:
-        print("Usage: python github_get_repo_structure.py <repo> [path] [ref] [token]", file=sys.stderr)
+    args = sys.argv[1:]
+    recursive = "--recursive" in args
+    args = [arg for arg in args if arg != "--recursive"]
+    max_depth = None
+    if "--max-depth" in args:
+        index = args.index("--max-depth")
+        max_depth = int(args[index + 1]) if index + 1 < len(args) else None
+        del args[index:index + 2]
+
+    if len(args) < 1:
+        print("Usage: python github_get_repo_structure.py <repo> [path] [ref] [token] [--recursive] [--max-depth N]", file=sys.stderr)
         print("Example: python github_get_repo_structure.py vitejs/vite", file=sys.stderr)
         print("Example: python github_get_repo_structure.py vitejs/vite /src/core main", file=sys.stderr)
+        print("Example: python github_get_repo_structure.py vitejs/vite packages main --max-depth 2", file=sys.stderr)
         sys.exit(1)
 
-    repo = sys.argv[1]
-    path = sys.argv[2] if len(sys.argv) > 2 else ""
-    ref = sys.argv[3] if len(sys.argv) > 3 else None
-    token = sys.argv[4] if len(sys.argv) > 4 else None
+    repo = args[0]
+    path = args[1] if len(args) > 1 else ""
+    ref = args[2] if len(args) > 2 else None
+    token = args[3] if len(args) > 3 else None
 
     try:
-        result = get_repo_structure(repo, path, ref, token)
+        result = run_tool(
+            "get_repo_structure", get_repo_structure,
+            repo=repo, path=path, ref=ref, token=token, recursive=recursive, max_depth=max_depth
+        )
         print(json.dumps(result, ensure_ascii=False, indent=2))
     except Exception as e:
         print(json.dumps({"error": str(e)}, ensure_ascii=False), file=sys.stderr)
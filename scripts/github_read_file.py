@@ -6,6 +6,8 @@ GitHub File Content Reader
 
 Usage:
     python github_read_file.py <repo> <path> [ref] [max_size] [token]
+    python github_read_file.py --batch <repo> [path ...] [--paths-from FILE] [--ref REF]
+                               [--max-size N] [--token TOKEN] [--workers N]
 
 Args:
     repo: 仓库标识，格式 "owner/repo"
@@ -14,18 +16,33 @@ Args:
     max_size: 最大读取字节数，默认 100KB (可选)
     token: GitHub Personal Access Token (可选)
 
+Batch:
+    --batch 模式并发读取多个文件，每读完一个文件输出一行 JSON（NDJSON，按完成顺序），
+    失败的文件输出 {"path": ..., "error": ...}，不影响其他文件。
+    路径来自命令行参数，或 --paths-from 指定的文件（每行一个，"-" 表示标准输入）；
+    两者都没有时从标准输入读取。
+
 Example:
     python github_read_file.py vitejs/vite README.md
     python github_read_file.py vitejs/vite package.json main
     python github_read_file.py vuejs/vue-router src/router.ts main 50000
+    python github_read_file.py --batch vitejs/vite README.md package.json --ref main
+    git ls-files | python github_read_file.py --batch vitejs/vite --workers 16
 """
 
 import sys
 import json
-import urllib.request
+import argparse
 import urllib.error
 import base64
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterable, Iterator
+
+from github_cache import API_URL, fetch_json
+from github_daemon import run_tool
+
+# 批量读取的默认并发数
+BATCH_WORKERS = 8
 
 
 def read_file(repo: str, path: str, ref: str = None, max_size: int = 102400, token: str = None) -> Dict[str, Any]:
@@ -50,7 +67,7 @@ def read_file(repo: str, path: str, ref: str = None, max_size: int = 102400, tok
         raise ValueError("File path is required")
 
     # 构建 API URL
-    url = f"https://api.github.com/repos/{repo}/contents/{path}"
+    url = f"{API_URL}/repos/{repo}/contents/{path}"
 
     # 添加查询参数
     if ref:
@@ -65,40 +82,37 @@ def read_file(repo: str, path: str, ref: str = None, max_size: int = 102400, tok
     if token:
         headers["Authorization"] = f"token {token}"
 
-    # 创建请求
-    req = urllib.request.Request(url, headers=headers)
-
     try:
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-
-            # 检查是否为文件
-            if data.get("type") != "file":
-                raise Exception(f"Path is not a file: {path} (type: {data.get('type')})")
-
-            # 解码 base64 内容
-            content_base64 = data.get("content")
-            content = base64.b64decode(content_base64).decode('utf-8', errors='replace')
-
-            file_size = len(content.encode('utf-8'))
-            truncated = False
-
-            # 检查文件大小并截断
-            if file_size > max_size:
-                # 按字符截断，保留约 max_size 字节
-                content = content[:max_size]
-                truncated = True
-
-            return {
-                "path": data.get("path"),
-                "name": data.get("name"),
-                "content": content,
-                "size": file_size,
-                "sha": data.get("sha"),
-                "encoding": "utf-8",
-                "truncated": truncated,
-                "max_size": max_size if truncated else None
-            }
+        # 带缓存的条件请求，未变化的响应不计入 API 限额
+        data = fetch_json(url, headers)
+
+        # 检查是否为文件
+        if data.get("type") != "file":
+            raise Exception(f"Path is not a file: {path} (type: {data.get('type')})")
+
+        # 解码 base64 内容
+        content_base64 = data.get("content")
+        content = base64.b64decode(content_base64).decode('utf-8', errors='replace')
+
+        file_size = len(content.encode('utf-8'))
+        truncated = False
+
+        # 检查文件大小并截断
+        if file_size > max_size:
+            # 按字符截断，保留约 max_size 字节
+            content = content[:max_size]
+            truncated = True
+
+        return {
+            "path": data.get("path"),
+            "name": data.get("name"),
+            "content": content,
+            "size": file_size,
+            "sha": data.get("sha"),
+            "encoding": "utf-8",
+            "truncated": truncated,
+            "max_size": max_size if truncated else None
+        }
 
     except urllib.error.HTTPError as e:
         if e.code == 404:
@@ -112,12 +126,83 @@ def read_file(repo: str, path: str, ref: str = None, max_size: int = 102400, tok
         raise Exception(f"Network error: {e.reason}") from e
 
 
+def read_files(
+    repo: str,
+    paths: Iterable[str],
+    ref: str = None,
+    max_size: int = 102400,
+    token: str = None,
+    workers: int = BATCH_WORKERS
+) -> Iterator[Dict[str, Any]]:
+    """
+    并发读取多个文件，按完成顺序产出结果
+
+    Args:
+        repo: 仓库标识 (owner/repo)
+        paths: 文件路径（重复的路径只读取一次）
+        ref: 分支/tag/commit SHA
+        max_size: 单个文件的最大读取字节数
+        token: GitHub PAT (可选)
+        workers: 并发数
+
+    Yields:
+        read_file 的结果；读取失败时为 {"path": 路径, "error": 错误信息}
+    """
+    paths = list(dict.fromkeys(paths))
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths) or 1))) as pool:
+        futures = {pool.submit(read_file, repo, path, ref, max_size, token): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {"path": futures[future], "error": str(e)}
+
+
+def read_paths(lines: Iterable[str]) -> Iterator[str]:
+    """从文件列表中读取路径（忽略空行和 # 开头的注释）"""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def batch_main(argv):
+    """--batch 模式的命令行入口"""
+    parser = argparse.ArgumentParser(
+        prog="github_read_file.py --batch",
+        description="并发读取 GitHub 仓库中的多个文件，按完成顺序输出 NDJSON"
+    )
+    parser.add_argument("repo", help='仓库标识，格式 "owner/repo"')
+    parser.add_argument("paths", nargs="*", help="文件路径")
+    parser.add_argument("--paths-from", help='包含文件路径的文件，每行一个，"-" 表示标准输入')
+    parser.add_argument("--ref", help="分支/tag/commit SHA")
+    parser.add_argument("--max-size", type=int, default=102400, help="单个文件的最大读取字节数")
+    parser.add_argument("--token", help="GitHub Personal Access Token")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="并发数")
+    args = parser.parse_args(argv)
+
+    paths = list(args.paths)
+    if args.paths_from == "-" or (args.paths_from is None and not paths):
+        paths.extend(read_paths(sys.stdin))
+    elif args.paths_from:
+        with open(args.paths_from, encoding="utf-8") as f:
+            paths.extend(read_paths(f))
+
+    for result in read_files(args.repo, paths, args.ref, args.max_size, args.token, args.workers):
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+
 def main():
     """命令行入口"""
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        batch_main(sys.argv[2:])
+        return
+
     if len(sys.argv) < 3:
         print("Usage: python github_read_file.py <repo> <path> [ref] [max_size] [token]", file=sys.stderr)
         print("Example: python github_read_file.py vitejs/vite README.md", file=sys.stderr)
         print("Example: python github_read_file.py vitejs/vite package.json main", file=sys.stderr)
+        print("Example: python github_read_file.py --batch vitejs/vite README.md package.json", file=sys.stderr)
         sys.exit(1)
 
     repo = sys.argv[1]
@@ -127,7 +212,7 @@ def main():
     token = sys.argv[5] if len(sys.argv) > 5 else None
 
     try:
-        result = read_file(repo, path, ref, max_size, token)
+        result = run_tool("read_file", read_file, repo=repo, path=path, ref=ref, max_size=max_size, token=token)
         print(json.dumps(result, ensure_ascii=False, indent=2))
     except Exception as e:
         print(json.dumps({"error": str(e)}, ensure_ascii=False), file=sys.stderr)
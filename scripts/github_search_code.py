@@ -21,11 +21,13 @@ Example:
 
 import sys
 import json
-import urllib.request
 import urllib.error
 from typing import Dict, Any, List
 from urllib.parse import quote
 
+from github_cache import API_URL, fetch_json
+from github_daemon import run_tool
+
 
 def search_code(repo: str, query: str, ref: str = None, language: str = None, token: str = None) -> Dict[str, Any]:
     """
@@ -62,7 +64,7 @@ def search_code(repo: str, query: str, ref: str = None, language: str = None, to
     search_query = "+".join(query_parts)
 
     # 构建 API URL
-    url = f"https://api.github.com/search/code?q={search_query}&per_page=10"
+    url = f"{API_URL}/search/code?q={search_query}&per_page=10"
 
     # 设置请求头
     headers = {
@@ -73,46 +75,43 @@ def search_code(repo: str, query: str, ref: str = None, language: str = None, to
     if token:
         headers["Authorization"] = f"token {token}"
 
-    # 创建请求
-    req = urllib.request.Request(url, headers=headers)
-
     try:
-        with urllib.request.urlopen(req, timeout=15) as response:
-            data = json.loads(response.read().decode('utf-8'))
-
-            # 处理搜索结果
-            total_count = data.get("total_count", 0)
-            items = data.get("items", [])
-
-            results = []
-            for item in items:
-                # 提取文本匹配信息（如果 API 返回）
-                text_matches = item.get("text_matches", [])
-
-                matches = []
-                if text_matches:
-                    for match in text_matches:
-                        matches.append({
-                            "line_number": match.get("matches", [{}])[0].get("start", 0),
-                            "fragment": match.get("fragment", "")
-                        })
-
-                result = {
-                    "name": item.get("name"),
-                    "path": item.get("path"),
-                    "sha": item.get("sha"),
-                    "html_url": item.get("html_url"),
-                    "score": item.get("score"),
-                    "matches": matches[:3] if matches else []  # 只保留前3个匹配
-                }
-                results.append(result)
-
-            return {
-                "total_count": total_count,
-                "count": len(results),
-                "query": query,
-                "results": results
+        # 带缓存的条件请求，未变化的响应不计入 API 限额
+        data = fetch_json(url, headers)
+
+        # 处理搜索结果
+        total_count = data.get("total_count", 0)
+        items = data.get("items", [])
+
+        results = []
+        for item in items:
+            # 提取文本匹配信息（如果 API 返回）
+            text_matches = item.get("text_matches", [])
+
+            matches = []
+            if text_matches:
+                for match in text_matches:
+                    matches.append({
+                        "line_number": match.get("matches", [{}])[0].get("start", 0),
+                        "fragment": match.get("fragment", "")
+                    })
+
+            result = {
+                "name": item.get("name"),
+                "path": item.get("path"),
+                "sha": item.get("sha"),
+                "html_url": item.get("html_url"),
+                "score": item.get("score"),
+                "matches": matches[:3] if matches else []  # 只保留前3个匹配
             }
+            results.append(result)
+
+        return {
+            "total_count": total_count,
+            "count": len(results),
+            "query": query,
+            "results": results
+        }
 
     except urllib.error.HTTPError as e:
         if e.code == 403:
@@ -141,7 +140,7 @@ def main():
     token = sys.argv[5] if len(sys.argv) > 5 else None
 
     try:
-        result = search_code(repo, query, ref, language, token)
+        result = run_tool("search_code", search_code, repo=repo, query=query, ref=ref, language=language, token=token)
         print(json.dumps(result, ensure_ascii=False, indent=2))
     except Exception as e:
         print(json.dumps({"error": str(e)}, ensure_ascii=False), file=sys.stderr)
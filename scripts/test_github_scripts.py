@@ -0,0 +1,734 @@
+#!/usr/bin/env python3
+"""
+GitHub 脚本测试
+
+在本地启动模拟的 GitHub API 服务器，不访问网络。
+
+Usage:
+    python3 scripts/test_github_scripts.py
+    python3 scripts/test_github_scripts.py --bench   # 连接池基准测试
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 脚本默认使用的缓存放在临时目录中，不转发给已在运行的常驻进程
+os.environ['GITHUB_CACHE_DIR'] = tempfile.mkdtemp(prefix='github-cache-')
+os.environ['GITHUB_NO_DAEMON'] = '1'
+
+import github_client
+import github_daemon
+import github_get_repo_info
+import github_get_repo_structure
+import github_read_file
+import github_search_code
+from github_cache import HttpCache, fetch_json
+from github_client import GitHubClient
+from github_get_repo_structure import get_repo_structure
+from github_read_file import read_files
+
+
+# 颜色输出
+class Colors:
+    RESET = '\033[0m'
+    GREEN = '\033[32m'
+    RED = '\033[31m'
+    BLUE = '\033[36m'
+
+
+def log(name: str, status: str, message: str = ''):
+    status_color = Colors.GREEN if status == 'PASS' else Colors.RED
+    print(f"{Colors.BLUE}[TEST]{Colors.RESET} {name}: {status_color}{status}{Colors.RESET} {message}")
+
+
+class MockGitHub(ThreadingMixIn, HTTPServer):
+    """
+    模拟的 GitHub API（HTTP/1.1 keep-alive）
+
+    routes: {路径: (响应数据, ETag, Last-Modified)}，请求带上匹配的 If-None-Match 或
+    If-Modified-Since 时返回 304。requests 按路径记录 (状态码, Authorization)。
+    failures: {路径: [(状态码, 响应头)]}，在正常响应之前依次返回的错误响应
+    drop: 响应后直接关闭连接（不发送 Connection: close）的路径
+    clients: 每个请求的客户端端口，用于统计建立的连接数
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), MockHandler)
+        self.routes = {}
+        self.requests = []
+        self.failures = {}
+        self.drop = set()
+        self.clients = []
+        self.gzipped = 0
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def count(self, path: str, status: int = None) -> int:
+        return sum(1 for p, s, _ in self.requests if p == path and (status is None or s == status))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分开写入，keep-alive 连接上需要关闭 Nagle 算法，否则每次响应都会被延迟确认拖慢
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.clients.append(self.client_address[1])
+        failures = self.server.failures.get(self.path)
+        if failures:
+            status, headers = failures.pop(0)
+            self.server.requests.append((self.path, status, self.headers.get('Authorization')))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        route = self.server.routes.get(self.path)
+        if route is None:
+            status = 404
+        else:
+            data, etag, last_modified = route
+            not_modified = (etag and self.headers.get('If-None-Match') == etag) or \
+                (not etag and last_modified and self.headers.get('If-Modified-Since') == last_modified)
+            status = 304 if not_modified else 200
+        self.server.requests.append((self.path, status, self.headers.get('Authorization')))
+
+        self.send_response(status)
+        if route is not None and route[1]:
+            self.send_header('ETag', route[1])
+        if route is not None and route[2]:
+            self.send_header('Last-Modified', route[2])
+        if status == 200:
+            body = json.dumps(route[0]).encode('utf-8')
+            if len(body) > 1024 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body)
+                self.server.gzipped += 1
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        if self.path in self.server.drop:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def file_response(path: str, text: str) -> dict:
+    """contents API 的 file 响应"""
+    data = text.encode('utf-8')
+    sha = hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+    return {
+        'type': 'file',
+        'name': path.rsplit('/', 1)[-1],
+        'path': path,
+        'sha': sha,
+        'size': len(data),
+        'content': base64.b64encode(data).decode('ascii'),
+    }
+
+
+def add_repo(server: MockGitHub, repo: str, files: dict, truncate_over: int = None) -> set:
+    """
+    把 {路径: 内容} 注册为模拟仓库的 commits/HEAD 和 git/trees 路由
+
+    Args:
+        truncate_over: 递归响应超过该条目数时截断（truncated 为 true）
+
+    Returns:
+        仓库中所有文件和目录的路径
+    """
+    trees = {'': {}}
+    for path, text in files.items():
+        parts = path.split('/')
+        for i in range(1, len(parts)):
+            trees.setdefault('/'.join(parts[:i]), {})
+            trees['/'.join(parts[:i - 1])][parts[i - 1]] = ('tree', '/'.join(parts[:i]))
+        trees['/'.join(parts[:-1])][parts[-1]] = ('blob', text)
+
+    def tree_sha(dir_path):
+        return hashlib.sha1(('tree:' + dir_path).encode('utf-8')).hexdigest()
+
+    def listing(dir_path, recursive):
+        items = []
+        for name, (kind, value) in sorted(trees[dir_path].items()):
+            if kind == 'tree':
+                items.append({'path': name, 'type': 'tree', 'sha': tree_sha(value)})
+                if recursive:
+                    items += [dict(item, path=f'{name}/{item["path"]}') for item in listing(value, True)]
+            else:
+                sha = hashlib.sha1(value.encode('utf-8')).hexdigest()
+                items.append({'path': name, 'type': 'blob', 'sha': sha, 'size': len(value)})
+        return items
+
+    for dir_path in trees:
+        sha = tree_sha(dir_path)
+        server.routes[f'/repos/{repo}/git/trees/{sha}'] = (
+            {'sha': sha, 'tree': listing(dir_path, False), 'truncated': False}, f'"{sha}"', None
+        )
+        full = listing(dir_path, True)
+        truncated = truncate_over is not None and len(full) > truncate_over
+        server.routes[f'/repos/{repo}/git/trees/{sha}?recursive=1'] = (
+            {'sha': sha, 'tree': full[:truncate_over] if truncated else full, 'truncated': truncated},
+            f'"{sha}-r"', None
+        )
+    server.routes[f'/repos/{repo}/commits/HEAD'] = (
+        {'sha': 'c0', 'commit': {'tree': {'sha': tree_sha('')}}}, f'"{repo}-c0"', None
+    )
+    return {path for path in trees if path} | set(files)
+
+
+def run_tests():
+    print('\n=== GitHub 脚本测试 ===\n')
+
+    passed = 0
+    failed = 0
+
+    server = MockGitHub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    for module in (github_get_repo_info, github_get_repo_structure, github_read_file, github_search_code):
+        module.API_URL = server.url
+    headers = {"Accept": "application/vnd.github.v3+json", "User-Agent": "github-code-analyzer"}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = HttpCache(os.path.join(tmpdir, 'cache'))
+
+        # ETag 重新验证：第二次请求得到 304，返回缓存内容
+        try:
+            server.routes['/repos/o/r'] = ({'name': 'r', 'stargazers_count': 1}, '"v1"', None)
+            first = fetch_json(server.url + '/repos/o/r', headers, cache=cache)
+            second = fetch_json(server.url + '/repos/o/r', headers, cache=cache)
+            if first != second or server.count('/repos/o/r', 304) != 1:
+                raise ValueError(f'重新验证不正确: {server.requests}')
+            # 内容变化后 ETag 不同，重新下载
+            server.routes['/repos/o/r'] = ({'name': 'r', 'stargazers_count': 2}, '"v2"', None)
+            third = fetch_json(server.url + '/repos/o/r', headers, cache=cache)
+            if third['stargazers_count'] != 2:
+                raise ValueError(f'内容变化后仍返回旧数据: {third}')
+            log('ETag 重新验证', 'PASS', f'{server.count("/repos/o/r", 304)} 次 304')
+            passed += 1
+        except Exception as e:
+            log('ETag 重新验证', 'FAIL', str(e))
+            failed += 1
+
+        # Last-Modified 重新验证
+        try:
+            date = 'Wed, 21 Oct 2015 07:28:00 GMT'
+            server.routes['/search/code?q=x'] = ({'total_count': 0, 'items': []}, None, date)
+            fetch_json(server.url + '/search/code?q=x', headers, cache=cache)
+            data = fetch_json(server.url + '/search/code?q=x', headers, cache=cache)
+            if data != {'total_count': 0, 'items': []} or server.count('/search/code?q=x', 304) != 1:
+                raise ValueError(f'重新验证不正确: {server.requests}')
+            log('Last-Modified 重新验证', 'PASS')
+            passed += 1
+        except Exception as e:
+            log('Last-Modified 重新验证', 'FAIL', str(e))
+            failed += 1
+
+        # 认证范围：不同 token 的响应不共享，磁盘上不保存 token
+        try:
+            server.routes['/repos/o/private'] = ({'name': 'private'}, '"p1"', None)
+            url = server.url + '/repos/o/private'
+            fetch_json(url, dict(headers, Authorization='token secret-a'), cache=cache)
+            fetch_json(url, dict(headers, Authorization='token secret-b'), cache=cache)
+            fetch_json(url, dict(headers, Authorization='token secret-a'), cache=cache)
+            if server.count('/repos/o/private', 200) != 2 or server.count('/repos/o/private', 304) != 1:
+                raise ValueError(f'认证范围不正确: {server.requests}')
+            for root, _, names in os.walk(cache.directory):
+                for name in names:
+                    with open(os.path.join(root, name), 'rb') as f:
+                        if b'secret-a' in f.read():
+                            raise ValueError(f'token 被写入缓存: {name}')
+            log('认证范围隔离', 'PASS')
+            passed += 1
+        except Exception as e:
+            log('认证范围隔离', 'FAIL', str(e))
+            failed += 1
+
+        # 文件内容按 git blob sha 去重：同一文件在两个分支下只存一份内容
+        try:
+            text = 'same content\n' * 1000
+            server.routes['/repos/o/r/contents/a.txt?ref=main'] = (file_response('a.txt', text), '"a1"', None)
+            server.routes['/repos/o/r/contents/a.txt?ref=dev'] = (file_response('a.txt', text), '"a2"', None)
+            server.routes['/repos/o/r/contents/b.txt'] = (file_response('b.txt', text), '"b1"', None)
+            results = [
+                fetch_json(server.url + path, headers, cache=cache)
+                for path in ('/repos/o/r/contents/a.txt?ref=main', '/repos/o/r/contents/a.txt?ref=dev',
+                             '/repos/o/r/contents/b.txt')
+            ]
+            cached = fetch_json(server.url + '/repos/o/r/contents/b.txt', headers, cache=cache)
+            content_blobs = [name for name in os.listdir(cache.blobs_dir) if name.startswith('git-')]
+            if len(content_blobs) != 1 or cached != results[2]:
+                raise ValueError(f'内容未去重: {content_blobs}')
+            if base64.b64decode(cached['content']).decode('utf-8') != text or cached['path'] != 'b.txt':
+                raise ValueError('还原的文件响应不正确')
+            log('内容去重', 'PASS', f'3 个响应共享 {len(content_blobs)} 份内容')
+            passed += 1
+        except Exception as e:
+            log('内容去重', 'FAIL', str(e))
+            failed += 1
+
+        # LRU 淘汰：超出上限时淘汰最久未使用的记录，最近读取过的记录保留
+        try:
+            small = HttpCache(os.path.join(tmpdir, 'small'), max_bytes=6000)
+            for i in range(5):
+                server.routes[f'/lru/{i}'] = ({'i': i, 'padding': str(i) * 1000}, f'"l{i}"', None)
+                fetch_json(server.url + f'/lru/{i}', headers, cache=small)
+                time.sleep(0.02)
+                # 每次都重新验证第 0 个，使其保持最近使用
+                fetch_json(server.url + '/lru/0', headers, cache=small)
+                time.sleep(0.02)
+            kept = [i for i in range(5) if small.load(server.url + f'/lru/{i}', 'anonymous')]
+            size = sum(os.path.getsize(os.path.join(root, name))
+                       for root, _, names in os.walk(small.directory) for name in names)
+            if 0 not in kept or 1 in kept or size > small.max_bytes:
+                raise ValueError(f'淘汰不正确: 保留 {kept}，大小 {size}')
+            blobs = len(os.listdir(small.blobs_dir))
+            if blobs != len(kept):
+                raise ValueError(f'未删除不再引用的内容: {blobs} 个内容，{len(kept)} 条记录')
+            log('LRU 淘汰', 'PASS', f'保留 {kept}，{size} 字节')
+            passed += 1
+        except Exception as e:
+            log('LRU 淘汰', 'FAIL', str(e))
+            failed += 1
+
+        # 写入只累计大小：未超过上限时不重复扫描缓存目录，累计值与磁盘上的大小一致
+        try:
+            counted = HttpCache(os.path.join(tmpdir, 'counted'), max_bytes=20000)
+            scans = []
+
+            def on_disk():
+                return sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, names in os.walk(counted.directory) for name in names)
+
+            counted.file_stats = lambda directory: scans.append(directory) or HttpCache.file_stats(directory)
+            for i in range(10):
+                server.routes[f'/sized/{i}'] = ({'i': i, 'padding': 'x' * 500}, f'"s{i}"', None)
+                fetch_json(server.url + f'/sized/{i}', headers, cache=counted)
+            # 内容变化后重新写入同一条记录
+            server.routes['/sized/0'] = ({'i': 0, 'padding': 'y' * 600}, '"s0-2"', None)
+            fetch_json(server.url + '/sized/0', headers, cache=counted)
+            if len(scans) != 2:
+                raise ValueError(f'写入时扫描了缓存目录 {len(scans)} 次')
+            if counted.total != on_disk():
+                raise ValueError(f'累计大小不正确: {counted.total} != {on_disk()}')
+            for i in range(10, 40):
+                server.routes[f'/sized/{i}'] = ({'i': i, 'padding': 'x' * 500}, f'"s{i}"', None)
+                fetch_json(server.url + f'/sized/{i}', headers, cache=counted)
+            if on_disk() > counted.max_bytes or counted.total != on_disk():
+                raise ValueError(f'淘汰后大小不正确: {counted.total}, {on_disk()}')
+            log('增量大小统计', 'PASS', f'40 次写入扫描目录 {len(scans) // 2} 次')
+            passed += 1
+        except Exception as e:
+            log('增量大小统计', 'FAIL', str(e))
+            failed += 1
+
+        # 内容被淘汰后收到 304：不带条件重新下载
+        try:
+            server.routes['/repos/o/gone'] = ({'name': 'gone'}, '"g1"', None)
+            url = server.url + '/repos/o/gone'
+            fetch_json(url, headers, cache=cache)
+            entry = cache.load(url, 'anonymous')
+            os.unlink(os.path.join(cache.blobs_dir, entry['body']))
+            # 当前进程的内存中仍有该内容，换一个进程（新的 HttpCache）读取时才需要重新下载
+            if fetch_json(url, headers, cache=cache) != {'name': 'gone'}:
+                raise ValueError('内存中的内容未被使用')
+            data = fetch_json(url, headers, cache=HttpCache(cache.directory))
+            if data != {'name': 'gone'} or server.count('/repos/o/gone', 200) != 2:
+                raise ValueError(f'未重新下载: {server.requests}')
+            log('缺失内容恢复', 'PASS')
+            passed += 1
+        except Exception as e:
+            log('缺失内容恢复', 'FAIL', str(e))
+            failed += 1
+
+        # 错误响应不缓存，仍以 HTTPError 抛出
+        try:
+            try:
+                fetch_json(server.url + '/missing', headers, cache=cache)
+                raise ValueError('未抛出 HTTPError')
+            except urllib.error.HTTPError as e:
+                if e.code != 404:
+                    raise ValueError(f'状态码不正确: {e.code}')
+            log('错误响应', 'PASS')
+            passed += 1
+        except Exception as e:
+            log('错误响应', 'FAIL', str(e))
+            failed += 1
+
+    # 连接池：顺序请求复用同一个 keep-alive 连接，较大的响应以 gzip 传输
+    try:
+        client = GitHubClient()
+        server.routes['/repos/o/pool'] = ({'name': 'pool', 'padding': 'x' * 4096}, None, None)
+        first_client = len(server.clients)
+        for _ in range(20):
+            data = json.loads(client.request('GET', server.url + '/repos/o/pool', headers).body)
+        ports = set(server.clients[first_client:])
+        if client.connections_opened != 1 or len(ports) != 1:
+            raise ValueError(f'连接未复用: 新建 {client.connections_opened} 个，端口 {ports}')
+        if data['padding'] != 'x' * 4096 or server.gzipped < 20:
+            raise ValueError(f'gzip 响应不正确: {server.gzipped}')
+        # 服务器关闭了空闲连接：透明地换新连接重发
+        # （使用单独的路径，服务器线程可能还没处理完上一个请求的关闭检查）
+        server.routes['/repos/o/pool-drop'] = ({'name': 'pool-drop'}, None, None)
+        server.drop.add('/repos/o/pool-drop')
+        client.request('GET', server.url + '/repos/o/pool-drop', headers)
+        data = json.loads(client.request('GET', server.url + '/repos/o/pool', headers).body)
+        if data['name'] != 'pool' or client.connections_opened != 2:
+            raise ValueError(f'未处理被关闭的连接: 新建 {client.connections_opened} 个')
+        client.close()
+        log('连接池与 gzip', 'PASS', f'22 次请求建立 {client.connections_opened} 个连接')
+        passed += 1
+    except Exception as e:
+        log('连接池与 gzip', 'FAIL', str(e))
+        failed += 1
+
+    # 重试：5xx 和二级限流按退避重试，普通的 403 不重试
+    backoff = github_client.RETRY_BACKOFF
+    github_client.RETRY_BACKOFF = 0.01
+    try:
+        client = GitHubClient()
+        server.routes['/repos/o/flaky'] = ({'name': 'flaky'}, None, None)
+        server.failures['/repos/o/flaky'] = [(502, {}), (503, {}), (403, {'Retry-After': '0'})]
+        data = json.loads(client.request('GET', server.url + '/repos/o/flaky', headers).body)
+        if data != {'name': 'flaky'} or server.count('/repos/o/flaky') != 4:
+            raise ValueError(f'重试不正确: {server.count("/repos/o/flaky")} 次请求')
+        server.failures['/repos/o/flaky'] = [(403, {})]
+        try:
+            client.request('GET', server.url + '/repos/o/flaky', headers)
+            raise ValueError('403 未抛出 HTTPError')
+        except urllib.error.HTTPError as e:
+            if e.code != 403 or server.count('/repos/o/flaky') != 5:
+                raise ValueError(f'403 不应重试: {e.code}')
+        server.failures['/repos/o/flaky'] = [(500, {})] * 10
+        try:
+            client.request('GET', server.url + '/repos/o/flaky', headers)
+            raise ValueError('持续的 500 未抛出 HTTPError')
+        except urllib.error.HTTPError as e:
+            if e.code != 500 or server.count('/repos/o/flaky') != 5 + 1 + github_client.MAX_RETRIES:
+                raise ValueError(f'重试次数不正确: {server.count("/repos/o/flaky")}')
+        server.failures.pop('/repos/o/flaky')
+        client.close()
+        log('重试与退避', 'PASS')
+        passed += 1
+    except Exception as e:
+        log('重试与退避', 'FAIL', str(e))
+        failed += 1
+    finally:
+        github_client.RETRY_BACKOFF = backoff
+
+    # 重定向：改名或转移的仓库返回 301，跟随 Location 得到真正的响应
+    try:
+        client = GitHubClient()
+        server.routes['/repositories/42'] = ({'name': 'new-name', 'full_name': 'o/new-name'}, None, None)
+        server.failures['/repos/o/old-name'] = [(301, {'Location': server.url + '/repositories/42'})]
+        data = github_get_repo_info.get_repo_info('o/old-name')
+        if data['name'] != 'new-name':
+            raise ValueError(f'未跟随 301: {data}')
+        # 相对路径的 Location；跨主机时不转发 token
+        server.failures['/repos/o/moved'] = [(307, {'Location': '/repositories/42'})]
+        other_host = server.url.replace('127.0.0.1', 'localhost')
+        server.failures['/repos/o/elsewhere'] = [(302, {'Location': other_host + '/repositories/42'})]
+        for path in ('/repos/o/moved', '/repos/o/elsewhere'):
+            body = json.loads(client.request('GET', server.url + path, dict(headers, Authorization='token t')).body)
+            if body['name'] != 'new-name':
+                raise ValueError(f'{path} 未跟随重定向: {body}')
+        authorizations = [auth for path, status, auth in server.requests if path == '/repositories/42']
+        if authorizations[-2:] != ['token t', None]:
+            raise ValueError(f'重定向时的认证头不正确: {authorizations}')
+        # 重定向循环和没有 Location 的 3xx 抛出 HTTPError
+        server.failures['/repos/o/loop'] = [(301, {'Location': '/repos/o/loop'})] * 10
+        server.failures['/repos/o/nowhere'] = [(302, {})]
+        for path in ('/repos/o/loop', '/repos/o/nowhere'):
+            try:
+                client.request('GET', server.url + path, headers)
+                raise ValueError(f'{path} 未抛出 HTTPError')
+            except urllib.error.HTTPError as e:
+                if e.code not in (301, 302):
+                    raise ValueError(f'{path} 状态码不正确: {e.code}')
+        if server.count('/repos/o/loop') != github_client.MAX_REDIRECTS + 1:
+            raise ValueError(f'重定向次数不正确: {server.count("/repos/o/loop")}')
+        server.failures.pop('/repos/o/loop')
+        client.close()
+        log('重定向', 'PASS', f'最多跟随 {github_client.MAX_REDIRECTS} 次')
+        passed += 1
+    except Exception as e:
+        log('重定向', 'FAIL', str(e))
+        failed += 1
+
+    # 限流：剩余额度不足时把请求均匀分布到额度重置之前，搜索 API 的额度单独计算
+    try:
+        client = GitHubClient()
+        server.failures['/repos/o/limited'] = [
+            (200, {'X-RateLimit-Remaining': '2', 'X-RateLimit-Reset': str(int(time.time()) + 30)})
+        ]
+        client.request('GET', server.url + '/repos/o/limited', headers)
+        delay = client.throttle_delay((None, 'core'))
+        if not 5 < delay <= 10 or client.throttle_delay((None, 'search')) != 0:
+            raise ValueError(f'限流等待时间不正确: {delay}')
+        client.limits[(None, 'core')] = (100, int(time.time()) + 30)
+        if client.throttle_delay((None, 'core')) != 0:
+            raise ValueError('额度充足时不应等待')
+        log('限流', 'PASS', f'剩余 2 次、30 秒后重置时每次等待 {delay:.1f} 秒')
+        passed += 1
+    except Exception as e:
+        log('限流', 'FAIL', str(e))
+        failed += 1
+
+    # 递归目录树：一次 commits 请求和一次 git/trees 请求获取整个仓库
+    files = {
+        'README.md': '# demo\n',
+        'docs/guide.md': 'guide\n',
+        'src/main.py': 'print(1)\n',
+        'src/core/engine.py': 'x = 1\n',
+        'src/core/deep/util.py': 'y = 2\n',
+    }
+    files.update({f'packages/p{i}/index.js': f'// {i}\n' for i in range(5)})
+    try:
+        expected = add_repo(server, 'o/tree', files)
+        before = len(server.requests)
+        result = get_repo_structure('o/tree', recursive=True)
+        if {entry['path'] for entry in result['entries']} != expected or result['crawled']:
+            raise ValueError(f'条目不正确: {result}')
+        if len(server.requests) - before != 2:
+            raise ValueError(f'请求次数不正确: {server.requests[before:]}')
+        engine = next(entry for entry in result['entries'] if entry['path'] == 'src/core/engine.py')
+        if engine != {'name': 'engine.py', 'type': 'file', 'path': 'src/core/engine.py', 'size': 6}:
+            raise ValueError(f'条目结构不正确: {engine}')
+        log('递归目录树', 'PASS', f'{result["total_count"]} 个条目，{len(server.requests) - before} 次请求')
+        passed += 1
+    except Exception as e:
+        log('递归目录树', 'FAIL', str(e))
+        failed += 1
+
+    # 路径前缀和深度在本地过滤
+    try:
+        src = get_repo_structure('o/tree', '/src', recursive=True, max_depth=2)
+        paths = [entry['path'] for entry in src['entries']]
+        if paths != ['src/core', 'src/core/deep', 'src/core/engine.py', 'src/main.py'] or src['path'] != 'src':
+            raise ValueError(f'过滤结果不正确: {paths}')
+        single = get_repo_structure('o/tree', 'src/main.py', recursive=True)
+        if single['type'] != 'file' or single['size'] != 9:
+            raise ValueError(f'文件路径结果不正确: {single}')
+        try:
+            get_repo_structure('o/tree', 'missing', recursive=True)
+            raise ValueError('不存在的路径未报错')
+        except Exception as e:
+            if 'Path not found' not in str(e):
+                raise
+        log('前缀与深度过滤', 'PASS', f'src 下 2 层共 {len(paths)} 个条目')
+        passed += 1
+    except Exception as e:
+        log('前缀与深度过滤', 'FAIL', str(e))
+        failed += 1
+
+    # 递归响应被截断时回退为并发的逐子树获取，结果与完整响应一致
+    try:
+        expected = add_repo(server, 'o/big', files, truncate_over=6)
+        result = get_repo_structure('o/big', recursive=True)
+        if not result['crawled'] or {entry['path'] for entry in result['entries']} != expected:
+            raise ValueError(f'回退结果不正确: {sorted(entry["path"] for entry in result["entries"])}')
+        limited = get_repo_structure('o/big', 'packages', max_depth=1)
+        if [entry['path'] for entry in limited['entries']] != [f'packages/p{i}' for i in range(5)]:
+            raise ValueError(f'回退时的过滤不正确: {limited["entries"]}')
+        log('截断回退', 'PASS', f'{result["total_count"]} 个条目')
+        passed += 1
+    except Exception as e:
+        log('截断回退', 'FAIL', str(e))
+        failed += 1
+
+    # 批量读取：按完成顺序产出结果，单个文件失败不影响其他文件
+    try:
+        for i in range(6):
+            server.routes[f'/repos/o/batch/contents/src/f{i}.py'] = (
+                file_response(f'src/f{i}.py', f'value = {i}\n'), f'"f{i}"', None
+            )
+        paths = [f'src/f{i}.py' for i in range(6)] + ['src/missing.py', 'src/f0.py']
+        results = list(read_files('o/batch', paths, workers=4))
+        by_path = {result['path']: result for result in results}
+        if len(results) != 7 or 'File not found' not in by_path['src/missing.py'].get('error', ''):
+            raise ValueError(f'批量结果不正确: {results}')
+        if any(by_path[f'src/f{i}.py']['content'] != f'value = {i}\n' for i in range(6)):
+            raise ValueError('文件内容不正确')
+        log('批量读取', 'PASS', f'{len(results)} 个结果，1 个错误')
+        passed += 1
+    except Exception as e:
+        log('批量读取', 'FAIL', str(e))
+        failed += 1
+
+    # 批量模式的命令行：路径来自参数和标准输入，输出 NDJSON
+    try:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'github_read_file.py')
+        env = dict(os.environ, GITHUB_API_URL=server.url)
+        output = subprocess.run(
+            [sys.executable, script, '--batch', 'o/batch', '--paths-from', '-', '--workers', '3'],
+            input='src/f1.py\n# 注释\n\nsrc/f2.py\nsrc/missing.py\n', env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True,
+        ).stdout
+        lines = [json.loads(line) for line in output.splitlines()]
+        if sorted(line['path'] for line in lines) != ['src/f1.py', 'src/f2.py', 'src/missing.py']:
+            raise ValueError(f'NDJSON 输出不正确: {output}')
+        log('批量命令行', 'PASS', f'{len(lines)} 行 NDJSON')
+        passed += 1
+    except Exception as e:
+        log('批量命令行', 'FAIL', str(e))
+        failed += 1
+
+    # 常驻进程：脚本的命令行不变，调用转发给常驻进程执行
+    try:
+        socket_path = os.path.join(tempfile.mkdtemp(prefix='github-daemon-'), 'daemon.sock')
+        # 常驻进程记录启动时的环境变量，与客户端一致时才执行转发的调用
+        os.environ['GITHUB_API_URL'] = server.url
+        try:
+            daemon = github_daemon.start_server(socket_path)
+        finally:
+            os.environ.pop('GITHUB_API_URL')
+        threading.Thread(target=daemon.serve_forever, daemon=True).start()
+        if os.stat(socket_path).st_mode & 0o077:
+            raise ValueError('socket 文件权限过宽')
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        env = dict(os.environ, GITHUB_DAEMON_SOCKET=socket_path, GITHUB_API_URL=server.url)
+        env.pop('GITHUB_NO_DAEMON')
+
+        def run_script(*args):
+            return subprocess.run(
+                [sys.executable, os.path.join(script_dir, args[0])] + list(args[1:]), env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+            )
+
+        info = run_script('github_get_repo_info.py', 'o/r')
+        if info.returncode != 0 or json.loads(info.stdout)['stargazers_count'] != 2:
+            raise ValueError(f'转发结果不正确: {info.stdout} {info.stderr}')
+        missing = run_script('github_read_file.py', 'o/batch', 'src/missing.py')
+        if missing.returncode != 1 or 'File not found' not in json.loads(missing.stderr)['error']:
+            raise ValueError(f'错误未原样返回: {missing.stderr}')
+        called = run_script('github_daemon.py', 'call', 'get_repo_info', 'o/r')
+        if called.returncode != 0 or called.stdout != info.stdout:
+            raise ValueError(f'call 子命令的输出与脚本不同: {called.stdout} {called.stderr}')
+        # --socket 指定的路径优先于 GITHUB_DAEMON_SOCKET
+        env['GITHUB_DAEMON_SOCKET'] = socket_path + '.missing'
+        explicit = run_script('github_daemon.py', 'call', 'get_repo_info', 'o/r', '--socket', socket_path)
+        env['GITHUB_DAEMON_SOCKET'] = socket_path
+        if explicit.returncode != 0 or explicit.stdout != info.stdout:
+            raise ValueError(f'--socket 的 call 输出不正确: {explicit.stdout} {explicit.stderr}')
+        # API 地址与常驻进程不同：不转发，在脚本进程中执行（该地址不可达）
+        env['GITHUB_API_URL'] = 'http://127.0.0.1:9'
+        other = run_script('github_get_repo_info.py', 'o/r')
+        if other.returncode != 1 or 'Network error' not in json.loads(other.stderr)['error']:
+            raise ValueError(f'环境变量不一致时仍被转发: {other.stdout} {other.stderr}')
+        stats = json.loads(run_script('github_daemon.py', 'stats', '--socket', socket_path).stdout)
+        env['GITHUB_API_URL'] = server.url
+        if stats['calls'] != 4 or stats['errors'] != 1 or stats['fallbacks'] != 1:
+            raise ValueError(f'常驻进程状态不正确: {stats}')
+        try:
+            github_daemon.start_server(socket_path)
+            raise ValueError('同一 socket 上启动了第二个常驻进程')
+        except Exception as e:
+            if 'already running' not in str(e):
+                raise
+        daemon.shutdown()
+        daemon.server_close()
+        # 常驻进程退出后回退为在当前进程中执行
+        local = run_script('github_get_repo_info.py', 'o/r')
+        if local.returncode != 0 or json.loads(local.stdout)['name'] != 'r':
+            raise ValueError(f'未回退为本地执行: {local.stderr}')
+        log('常驻进程', 'PASS', f'{stats["calls"]} 次转发调用')
+        passed += 1
+    except Exception as e:
+        log('常驻进程', 'FAIL', str(e))
+        failed += 1
+
+    server.shutdown()
+
+    print(f'\n=== 测试结果: {passed} 通过, {failed} 失败 ===\n')
+
+    sys.exit(0 if failed == 0 else 1)
+
+
+def run_benchmarks():
+    print('\n=== 连接池基准测试（本地模拟服务器）===\n')
+
+    server = MockGitHub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    headers = {"Accept": "application/vnd.github.v3+json", "User-Agent": "github-code-analyzer"}
+    server.routes['/repos/o/r'] = ({'name': 'r', 'description': 'x' * 2048}, None, None)
+    url = server.url + '/repos/o/r'
+    calls = 300
+
+    def per_call_connection():
+        # 原来的做法：每次调用新建连接
+        for _ in range(calls):
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=10) as response:
+                json.loads(response.read().decode('utf-8'))
+
+    def pooled():
+        client = GitHubClient()
+        for _ in range(calls):
+            json.loads(client.request('GET', url, headers).body)
+        client.close()
+
+    for label, fn in (('urlopen，每次新建连接', per_call_connection), ('连接池 + gzip', pooled)):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        print(f'  {label:<16} {calls} 次请求: {elapsed * 1000:7.1f} ms（{elapsed / calls * 1000:.2f} ms/次）')
+
+    print('\n=== 常驻进程基准测试（每次调用启动一个脚本进程）===\n')
+
+    for module in (github_get_repo_info, github_get_repo_structure, github_read_file, github_search_code):
+        module.API_URL = server.url
+    socket_path = os.path.join(tempfile.mkdtemp(prefix='github-daemon-'), 'daemon.sock')
+    os.environ['GITHUB_API_URL'] = server.url
+    daemon = github_daemon.start_server(socket_path)
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    script = [sys.executable, os.path.join(script_dir, 'github_get_repo_info.py'), 'o/r']
+    thin_client = [sys.executable, os.path.join(script_dir, 'github_daemon.py'), 'call', 'get_repo_info', 'o/r']
+    env = dict(os.environ, GITHUB_API_URL=server.url, GITHUB_DAEMON_SOCKET=socket_path)
+    runs = 20
+    for label, command, no_daemon in (
+        ('在脚本进程中执行', script, '1'),
+        ('脚本转发给常驻进程', script, '0'),
+        ('call 子命令', thin_client, '0'),
+    ):
+        env['GITHUB_NO_DAEMON'] = no_daemon
+        start = time.perf_counter()
+        for _ in range(runs):
+            subprocess.run(command, env=env, stdout=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - start
+        print(f'  {label:<12} {runs} 次调用: {elapsed * 1000:7.1f} ms（{elapsed / runs * 1000:.1f} ms/次）')
+    daemon.shutdown()
+    daemon.server_close()
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    if '--bench' in sys.argv:
+        run_benchmarks()
+    else:
+        run_tests()